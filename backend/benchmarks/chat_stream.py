@@ -0,0 +1,205 @@
+"""Chat latency and prompt size per turn, blocking vs streamed, with and without context caching.
+
+Uploads one synthetic contract through the app (backend/benchmarks/fakes.py).
+Then it holds several multi-turn conversations about it in three modes:
+
+- blocking: POST /api/chat with no conversation id (how chat worked before streaming)
+- stream:   POST /api/chat/stream with the conversation id carried forward, local prompt prefix
+- cached:   the same, with the document held in a (fake) Gemini context cache
+
+Time to first token (TTFT) is measured on the client. For the blocking mode it
+is the whole response. The calls are driven through the ASGI interface
+directly, because httpx's ASGI transport buffers streamed bodies.
+
+    python -m backend.benchmarks.chat_stream
+    python -m backend.benchmarks.chat_stream --clauses 800 --turns 6 --output-tokens-per-second 40
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import io
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+import httpx
+
+from backend.benchmarks import fakes
+from backend.benchmarks.load_test import synthetic_contract, percentile
+from backend.services.batch_planner import estimate_tokens
+
+_QUESTIONS = (
+    "What is the payment deadline?",
+    "Can the customer terminate early?",
+    "Who is liable for delays?",
+    "What notice is required?",
+    "How long does confidentiality last?",
+    "Can the supplier assign the contract?",
+)
+
+
+async def asgi_post(app, path: str, payload: dict) -> tuple[int, list[tuple[float, bytes]]]:
+    """POSTs JSON straight to the ASGI app; returns the status and (arrival time, body chunk) pairs."""
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    received = False
+    disconnected = asyncio.Event()
+    status, chunks = 0, []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            if message.get("body"):
+                chunks.append((time.perf_counter(), message["body"]))
+            if not message.get("more_body"):
+                disconnected.set()
+
+    await app(scope, receive, send)
+    return status, chunks
+
+
+async def one_turn(app, mode: str, doc_id: str, question: str, conversation_id: str | None) -> dict:
+    started = time.perf_counter()
+    if mode == "blocking":
+        status, chunks = await asgi_post(app, "/api/chat", {"document_id": doc_id, "question": question})
+        if status != 200:
+            raise RuntimeError(f"/api/chat returned {status}")
+        done = chunks[-1][0]
+        return {"ttft": done - started, "total": done - started, "conversation_id": None}
+
+    payload = {"document_id": doc_id, "question": question, "conversation_id": conversation_id, "format": "ndjson"}
+    status, chunks = await asgi_post(app, "/api/chat/stream", payload)
+    if status != 200:
+        raise RuntimeError(f"/api/chat/stream returned {status}")
+    first_token, buffered = None, b""
+    for arrived, chunk in chunks:
+        buffered += chunk
+        *lines, buffered = buffered.split(b"\n")
+        for line in lines:
+            event = json.loads(line)
+            if event["event"] == "start":
+                conversation_id = event["conversation_id"]
+            elif event["event"] == "token" and first_token is None:
+                first_token = arrived
+            elif event["event"] == "error":
+                raise RuntimeError(event["detail"])
+    return {"ttft": (first_token or chunks[-1][0]) - started, "total": chunks[-1][0] - started,
+            "conversation_id": conversation_id}
+
+
+async def run_mode(app, mode: str, doc_id: str, args, installed: fakes.Fakes) -> dict:
+    from backend import main
+    from backend.services import chat_session
+
+    chat_session.CHAT_CONTEXT_CACHE = "auto" if mode == "cached" else "off"
+    main.chat_contexts.invalidate(doc_id)
+    before = dict(installed.model.counters)
+
+    async def conversation(n: int) -> list[dict]:
+        conversation_id, results = None, []
+        for turn in range(args.turns):
+            result = await one_turn(app, mode, doc_id, _QUESTIONS[(n + turn) % len(_QUESTIONS)], conversation_id)
+            conversation_id = result["conversation_id"]
+            results.append(result)
+        return results
+
+    results = [r for rs in await asyncio.gather(*[conversation(n) for n in range(args.conversations)]) for r in rs]
+    turns = len(results)
+    sent = installed.model.counters["input_tokens"] - before["input_tokens"]
+    cached = installed.model.counters["cached_tokens"] - before["cached_tokens"]
+    return {
+        "mode": mode,
+        "turns": turns,
+        "ttft_p50_ms": round(percentile([r["ttft"] for r in results], 0.50) * 1000, 1),
+        "ttft_p95_ms": round(percentile([r["ttft"] for r in results], 0.95) * 1000, 1),
+        "total_p50_ms": round(percentile([r["total"] for r in results], 0.50) * 1000, 1),
+        "tokens_sent_per_turn": round(sent / turns),
+        "cached_tokens_per_turn": round(cached / turns),
+        "context_caches": installed.model.counters["context_caches"] - before["context_caches"],
+    }
+
+
+async def run(args, installed: fakes.Fakes) -> dict:
+    from backend import main
+
+    # Analysis of the upload is not what is measured here
+    latency, installed.model.latency = installed.model.latency, 0.0
+    text = synthetic_contract(0, args.clauses, random.Random(args.seed))
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post("/api/upload", params={"userId": "bench", "analysisType": "risk"},
+                                     files={"file": ("contract.txt", text.encode("utf-8"), "text/plain")})
+        response.raise_for_status()
+    doc_id = response.json()["document_id"]
+    installed.model.latency = latency
+
+    modes = [await run_mode(main.app, mode, doc_id, args, installed) for mode in ("blocking", "stream", "cached")]
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "document_tokens": estimate_tokens(text),
+        "modes": modes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clauses", type=int, default=700, help="Clauses in the synthetic contract")
+    parser.add_argument("--conversations", type=int, default=4, help="Concurrent conversations per mode")
+    parser.add_argument("--turns", type=int, default=4, help="Questions per conversation")
+    parser.add_argument("--model-latency", type=float, default=0.4, help="Seconds to the fake model's first token")
+    parser.add_argument("--output-tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--cache-min-tokens", type=int, default=32768,
+                        help="Smallest document put in a context cache (CHAT_CONTEXT_CACHE_MIN_TOKENS)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own log output")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    os.environ["CHAT_CONTEXT_CACHE_MIN_TOKENS"] = str(args.cache_min_tokens)
+    state_dir = tempfile.mkdtemp(prefix="lawlytics_chat_")
+    installed = fakes.install(
+        fakes.FakeGeminiModel(args.model_latency, 0.0, output_tokens_per_second=args.output_tokens_per_second,
+                              seed=args.seed),
+        fakes.FakeFirestore(0.01),
+        fakes.FakeBlob(0.0),
+        state_dir,
+    )
+
+    log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with log:
+        report = asyncio.run(run(args, installed))
+
+    print(f"document {report['document_tokens']} tokens, {args.conversations} conversations x {args.turns} turns, "
+          f"model first token {args.model_latency}s, {args.output_tokens_per_second} tokens/s")
+    print(f"{'mode':<10}{'TTFT p50':>10}{'TTFT p95':>10}{'total p50':>11}{'sent/turn':>11}{'cached/turn':>13}")
+    for row in report["modes"]:
+        print(f"{row['mode']:<10}{row['ttft_p50_ms']:>10}{row['ttft_p95_ms']:>10}{row['total_p50_ms']:>11}"
+              f"{row['tokens_sent_per_turn']:>11}{row['cached_tokens_per_turn']:>13}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Cross-document clause search: scanning every fullAnalysis vs. the clause index.
+
+Builds one user's history of synthetic risk analyses, indexes it with
+clause_index.ClauseIndex, then times free-text searches and faceted
+analytics. The baseline scans each document's fullAnalysis in Python, which
+is what answering the same question from /api/documents would take.
+
+    python -m backend.benchmarks.clause_search
+    python -m backend.benchmarks.clause_search --documents 1000 --clauses 40 --queries 200
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timezone
+
+from backend.services import clause_index
+
+_CLAUSES = (
+    ("Red", "The Customer shall indemnify and hold harmless the Supplier against all losses without limit.",
+     "You cover all of the supplier's losses, with no cap."),
+    ("Orange", "Either party may terminate this Agreement on thirty days written notice.",
+     "Either side can end the contract with a month's notice."),
+    ("Green", "This Agreement may be executed in counterparts, each of which is an original.",
+     "The contract can be signed in separate copies."),
+    ("Orange", "The Supplier's liability shall not exceed the fees paid in the preceding twelve months.",
+     "The supplier's liability is capped at a year of fees."),
+    ("Red", "Invoices are payable within seven days and late payments accrue interest at 4% per month.",
+     "You must pay quickly or face steep interest."),
+    ("Green", "All notices shall be in writing and delivered to the addresses set out above.",
+     "Notices have to be written and sent to the listed addresses."),
+    ("Orange", "The Receiving Party shall keep all Confidential Information secret for five years.",
+     "You must keep their information confidential for five years."),
+    ("Red", "The Customer may not solicit or compete with the Supplier for three years after termination.",
+     "You cannot compete with the supplier for three years."),
+)
+_QUERIES = ("uncapped indemnity", "indemnify losses", "terminate notice", "late payment interest",
+            "confidential information", "liability fees", "compete solicit", "counterparts")
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def synthetic_history(documents: int, clauses: int, rng: random.Random) -> list[tuple[str, dict]]:
+    history = []
+    for number in range(documents):
+        analysis = []
+        for index in range(clauses):
+            risk_level, text, plain = rng.choice(_CLAUSES)
+            analysis.append({
+                "risk_level": risk_level,
+                "original_text": f"{index + 1}. {text} (Schedule {number}-{index})",
+                "plain_english": plain,
+                "clause_id": f"c{index}",
+                "page": 1 + index // 10,
+            })
+        history.append((f"doc{number:05d}", {
+            "userId": "bench-user",
+            "fileName": f"contract_{number}.pdf",
+            "analysisType": "risk",
+            "createdAt": datetime(2024 + number % 2, 1 + number % 12, 1, tzinfo=timezone.utc),
+            "fullAnalysis": analysis,
+        }))
+    return history
+
+
+def scan_search(history: list[tuple[str, dict]], query: str) -> list[tuple[str, int]]:
+    """Baseline: every term must appear in the clause or its summary."""
+    terms = query.lower().split()
+    matches = []
+    for doc_id, document in history:
+        for position, item in enumerate(document["fullAnalysis"]):
+            haystack = f"{item['original_text']} {item['plain_english']}".lower()
+            if all(term in haystack for term in terms):
+                matches.append((doc_id, position))
+    return matches
+
+
+def scan_analytics(history: list[tuple[str, dict]]) -> dict:
+    counts: dict[tuple[str, str], int] = {}
+    for _, document in history:
+        for item in document["fullAnalysis"]:
+            if item["risk_level"] in ("Red", "Orange"):
+                key = (clause_index.classify_clause(item["original_text"]), item["risk_level"])
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def timed(func, repeat: int) -> list[float]:
+    latencies = []
+    for n in range(repeat):
+        started = time.perf_counter()
+        func(n)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def row(name: str, latencies: list[float]) -> str:
+    return (f"{name:<22}{percentile(latencies, 0.50) * 1000:>10.2f}{percentile(latencies, 0.95) * 1000:>10.2f}"
+            f"{max(latencies) * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--clauses", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    history = synthetic_history(args.documents, args.clauses, random.Random(args.seed))
+    with tempfile.TemporaryDirectory() as tmp:
+        index = clause_index.ClauseIndex(os.path.join(tmp, "clauses.sqlite3"))
+        started = time.perf_counter()
+        for doc_id, document in history:
+            index.index_document(doc_id, document)
+        build_seconds = time.perf_counter() - started
+        clauses = args.documents * args.clauses
+        print(f"indexed {clauses} clauses from {args.documents} documents in {build_seconds:.2f}s "
+              f"({build_seconds * 1000 / args.documents:.2f} ms per upload)")
+
+        print(f"{'query':<22}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+        scan_repeat = max(1, args.queries // 10)
+        print(row("scan search", timed(lambda n: scan_search(history, _QUERIES[n % len(_QUERIES)]), scan_repeat)))
+        print(row("index search", timed(
+            lambda n: index.search("bench-user", _QUERIES[n % len(_QUERIES)]), args.queries)))
+        print(row("index search Red", timed(
+            lambda n: index.search("bench-user", _QUERIES[n % len(_QUERIES)], risk_levels=["Red"]), args.queries)))
+        print(row("scan analytics", timed(lambda n: scan_analytics(history), scan_repeat)))
+        print(row("index analytics", timed(lambda n: index.analytics("bench-user"), args.queries)))
+
+
+if __name__ == "__main__":
+    main()
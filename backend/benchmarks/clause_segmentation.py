@@ -0,0 +1,86 @@
+"""Clause segmentation: legacy newline splitter vs. clause_segmenter.
+
+Reports clause counts (each clause is model work) and segmentation time per
+page at growing document sizes to confirm linear scaling. Uses synthetic
+wrapped-paragraph PDFs by default, or every .pdf/.txt under --corpus.
+
+    python -m backend.benchmarks.clause_segmentation
+    python -m backend.benchmarks.clause_segmentation --corpus ./contracts
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import time
+import asyncio
+import argparse
+import tempfile
+
+from backend.benchmarks.pdf_extraction import build_pdf
+from backend.services import document_ai_service, clause_segmenter
+
+
+def load(path: str) -> document_ai_service.ExtractedDocument:
+    with open(path, "rb") as f:
+        contents = f.read()
+    content_type = "application/pdf" if path.lower().endswith(".pdf") else "text/plain"
+    return asyncio.run(document_ai_service.extract_document(contents, content_type))
+
+
+def measure(name: str, document: document_ai_service.ExtractedDocument, repeat: int = 3) -> dict:
+    full_text = document.text
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        legacy = clause_segmenter.legacy_split(full_text)
+    legacy_seconds = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        clauses = clause_segmenter.segment_document(document)
+    seconds = (time.perf_counter() - start) / repeat
+
+    pages = max(1, len(document.pages))
+    return {
+        "name": name,
+        "pages": pages,
+        "legacy_clauses": len(legacy),
+        "clauses": len(clauses),
+        "legacy_ms": legacy_seconds * 1000,
+        "ms": seconds * 1000,
+        "us_per_page": seconds * 1e6 / pages,
+    }
+
+
+def report(rows: list[dict]):
+    print(f"{'document':<24}{'pages':>7}{'legacy':>9}{'clauses':>9}{'legacy ms':>11}{'ms':>9}{'us/page':>10}")
+    for row in rows:
+        print(f"{row['name']:<24}{row['pages']:>7}{row['legacy_clauses']:>9}{row['clauses']:>9}"
+              f"{row['legacy_ms']:>11.1f}{row['ms']:>9.1f}{row['us_per_page']:>10.0f}")
+    legacy_total = sum(row["legacy_clauses"] for row in rows)
+    total = sum(row["clauses"] for row in rows)
+    if legacy_total:
+        print(f"clauses sent to the model: {total} vs {legacy_total} legacy ({total / legacy_total:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="directory of .pdf/.txt documents")
+    parser.add_argument("--sizes", default="25,50,100,200,400", help="synthetic page counts")
+    args = parser.parse_args()
+
+    rows = []
+    if args.corpus:
+        for name in sorted(os.listdir(args.corpus)):
+            if name.lower().endswith((".pdf", ".txt")):
+                rows.append(measure(name, load(os.path.join(args.corpus, name))))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            for pages in (int(size) for size in args.sizes.split(",")):
+                path = os.path.join(tmp, f"synthetic_{pages}.pdf")
+                build_pdf(path, pages)
+                rows.append(measure(f"synthetic {pages}p", load(path)))
+    report(rows)
+
+
+if __name__ == "__main__":
+    main()
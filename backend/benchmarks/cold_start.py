@@ -0,0 +1,160 @@
+"""Cold-start cost of the serverless entry point: import time and first-request latency.
+
+Every run is a fresh interpreter. Each one times ``import backend.main``,
+then the first GET /api/documents, the same request again (warm), and
+GET /health. By default nothing is configured, so Firebase falls back to
+local storage and only import and initialization costs show up.
+``--firestore-latency`` swaps firebase_admin for a stub client that sleeps
+on every read. That shows where the connectivity probe's round trip is paid,
+but the stub also hides firebase_admin's own import cost. ``--baseline REF``
+measures a git ref in a temporary worktree as well, for before/after numbers.
+
+    python -m backend.benchmarks.cold_start
+    python -m backend.benchmarks.cold_start --baseline HEAD~1 --runs 7
+    python -m backend.benchmarks.cold_start --baseline HEAD~1 --firestore-latency 0.3
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Runs inside each fresh interpreter; argv: tree, firestore latency (or "")
+_PROBE = r'''
+import sys, os, time, json, types, base64
+tree, latency = sys.argv[1], sys.argv[2]
+sys.path.insert(0, tree)
+
+if latency:
+    delay = float(latency)
+
+    class _Snapshot:
+        exists = False
+        def to_dict(self):
+            return None
+
+    class _StubFirestore:
+        """Answers every query with nothing, after one simulated round trip."""
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: self
+        def get(self, *args, **kwargs):
+            time.sleep(delay)
+            return _Snapshot() if kwargs.get("field_paths") is not None else []
+        def stream(self, *args, **kwargs):
+            time.sleep(delay)
+            return iter([])
+
+    client = _StubFirestore()
+    firebase_admin = types.ModuleType("firebase_admin")
+    firebase_admin._apps = {}
+    firebase_admin.initialize_app = lambda cred: firebase_admin._apps.setdefault("[DEFAULT]", cred)
+    firebase_admin.credentials = types.ModuleType("firebase_admin.credentials")
+    firebase_admin.credentials.Certificate = lambda value: value
+    firebase_admin.firestore = types.ModuleType("firebase_admin.firestore")
+    firebase_admin.firestore.client = lambda *args, **kwargs: client
+    sys.modules.update({"firebase_admin": firebase_admin,
+                        "firebase_admin.credentials": firebase_admin.credentials,
+                        "firebase_admin.firestore": firebase_admin.firestore})
+    os.environ["FIREBASE_SERVICE_ACCOUNT_BASE64"] = base64.b64encode(b"{}").decode()
+
+import asyncio
+
+started = time.perf_counter()
+from backend import main
+import_ms = (time.perf_counter() - started) * 1000
+
+import httpx
+
+async def timed(client, path):
+    started = time.perf_counter()
+    response = await client.get(path)
+    return (time.perf_counter() - started) * 1000, response.status_code
+
+async def requests():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        first = await timed(client, "/api/documents?userId=bench")
+        warm = await timed(client, "/api/documents?userId=bench")
+        health = await timed(client, "/health")
+    return first, warm, health
+
+sys.stdout = open(os.devnull, "w")
+first, warm, health = asyncio.run(requests())
+sys.stdout = sys.__stdout__
+print(json.dumps({"import_ms": import_ms, "first_request_ms": first[0], "warm_request_ms": warm[0],
+                  "health_ms": health[0], "statuses": [first[1], warm[1], health[1]]}))
+'''
+
+METRICS = ("import_ms", "first_request_ms", "warm_request_ms", "health_ms")
+
+
+def measure(tree: str, runs: int, firestore_latency: float | None) -> dict:
+    """Median of each metric over ``runs`` fresh interpreters."""
+    samples = {metric: [] for metric in METRICS}
+    for _ in range(runs):
+        # Empty working directory and state paths: no service account file is found
+        with tempfile.TemporaryDirectory(prefix="lawlytics_cold_") as workdir:
+            env = dict(os.environ)
+            for name in ("FIREBASE_SERVICE_ACCOUNT_BASE64", "BLOB_READ_WRITE_TOKEN"):
+                env.pop(name, None)
+            env.update({
+                "LOCAL_STORE_PATH": os.path.join(workdir, "documents.sqlite3"),
+                "CLAUSE_CACHE_PATH": os.path.join(workdir, "clause_cache.sqlite3"),
+                "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+                "VECTOR_INDEX_DIR": os.path.join(workdir, "vectors"),
+                "TEXT_STORE_DIR": os.path.join(workdir, "texts"),
+                "PYTHONDONTWRITEBYTECODE": "1",
+            })
+            result = subprocess.run(
+                [sys.executable, "-c", _PROBE, tree, "" if firestore_latency is None else str(firestore_latency)],
+                cwd=workdir, env=env, capture_output=True, text=True, timeout=300,
+            )
+        if result.returncode != 0:
+            raise RuntimeError(f"probe failed in {tree}:\n{result.stderr[-2000:]}")
+        row = json.loads(result.stdout.strip().splitlines()[-1])
+        for metric in METRICS:
+            samples[metric].append(row[metric])
+    return {metric: statistics.median(values) for metric, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per tree")
+    parser.add_argument("--baseline", help="Git ref to measure too, checked out into a temporary worktree")
+    parser.add_argument("--firestore-latency", type=float, help="Simulate a configured Firestore with this round trip (seconds)")
+    args = parser.parse_args()
+
+    trees = [("current", REPO_ROOT)]
+    worktree = None
+    if args.baseline:
+        worktree = tempfile.mkdtemp(prefix="lawlytics_baseline_")
+        subprocess.run(["git", "-C", REPO_ROOT, "worktree", "add", "--detach", worktree, args.baseline],
+                       check=True, capture_output=True)
+        trees.insert(0, (args.baseline, worktree))
+
+    try:
+        # Compile once up front so no run pays for bytecode generation
+        for _, tree in trees:
+            subprocess.run([sys.executable, "-m", "compileall", "-q", os.path.join(tree, "backend")], check=True)
+        results = [(name, measure(tree, args.runs, args.firestore_latency)) for name, tree in trees]
+    finally:
+        if worktree:
+            subprocess.run(["git", "-C", REPO_ROOT, "worktree", "remove", "--force", worktree], capture_output=True)
+            shutil.rmtree(worktree, ignore_errors=True)
+
+    mode = f"stub Firestore, {args.firestore_latency}s round trip" if args.firestore_latency is not None else "unconfigured"
+    print(f"median of {args.runs} cold starts ({mode})")
+    print(f"{'tree':<14}{'import ms':>11}{'first req ms':>14}{'warm req ms':>13}{'/health ms':>12}")
+    for name, row in results:
+        print(f"{name:<14}{row['import_ms']:>11.0f}{row['first_request_ms']:>14.0f}"
+              f"{row['warm_request_ms']:>13.1f}{row['health_ms']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Chat latency while a timeline job is in flight.
+
+Runs the FastAPI app in-process with a fake Gemini model and fires a batch of
+concurrent /api/chat requests while one /api/generate-timeline request is
+running. ``--mode blocking`` reproduces the old synchronous
+``model.generate_content`` behaviour; ``--mode async`` uses the current
+service layer.
+
+    python -m backend.benchmarks.event_loop_latency --mode blocking
+    python -m backend.benchmarks.event_loop_latency --mode async
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+from backend import main
+from backend.services import gemini_service
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def install_fake_model(mode: str, timeline_latency: float, chat_latency: float):
+    """Replaces gemini_service.generate with a fake that sleeps like the real API."""
+
+    async def fake_generate(prompt, priority=gemini_service.PRIORITY_BULK, **kwargs):
+        is_timeline = "case timeline" in str(prompt)
+        latency = timeline_latency if is_timeline else chat_latency
+        if mode == "blocking":
+            time.sleep(latency)  # what a sync SDK call inside an async endpoint does
+        else:
+            await asyncio.sleep(latency)
+        if is_timeline:
+            return _Response('[{"date": "2024-01-01", "event": "Signed", "parties": "A, B"}]')
+        return _Response("The document does not seem to provide that information.")
+
+    gemini_service.generate = fake_generate
+
+
+async def run(mode: str, chats: int, timeline_latency: float, chat_latency: float):
+    install_fake_model(mode, timeline_latency, chat_latency)
+    doc_id = "doc_bench"
+    main.local_store.put(doc_id, {
+        "userId": "bench",
+        "fileName": "bench.txt",
+        "fullText": "This Agreement is entered into on 1 January 2024 between A and B.",
+        "fullAnalysis": [{"original_text": "This Agreement is entered into on 1 January 2024 between A and B."}],
+    })
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def timed(coro, sent_at: float):
+            # Measured from when the request was issued, so time spent waiting
+            # for a blocked event loop counts against it
+            response = await coro
+            response.raise_for_status()
+            return time.perf_counter() - sent_at
+
+        timeline = asyncio.create_task(timed(
+            client.post("/api/generate-timeline", json={"document_id": doc_id}), time.perf_counter()
+        ))
+        await asyncio.sleep(0.05)  # let the timeline request reach the model first
+        sent_at = time.perf_counter()
+        chat_latencies = await asyncio.gather(*[
+            timed(client.post("/api/chat", json={"document_id": doc_id, "question": f"Question {n}?"}), sent_at)
+            for n in range(chats)
+        ])
+        timeline_latency_observed = await timeline
+
+    chat_latencies.sort()
+    print(f"mode={mode} chats={chats} timeline_latency={timeline_latency}s chat_latency={chat_latency}s")
+    print(f"  timeline request: {timeline_latency_observed * 1000:.0f} ms")
+    print(f"  chat p50: {statistics.median(chat_latencies) * 1000:.0f} ms")
+    print(f"  chat p95: {chat_latencies[int(0.95 * (len(chat_latencies) - 1))] * 1000:.0f} ms")
+    print(f"  chat max: {chat_latencies[-1] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["blocking", "async"], default="async")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--timeline-latency", type=float, default=2.0)
+    parser.add_argument("--chat-latency", type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(run(args.mode, args.chats, args.timeline_latency, args.chat_latency))
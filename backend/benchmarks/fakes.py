@@ -0,0 +1,427 @@
+"""In-process fakes for Gemini, Firestore and Vercel Blob used by the benchmarks.
+
+Each fake has configurable latency and keeps counters. FakeGeminiModel also
+injects 429/transient errors and accounts for tokens. ``install`` has to run
+before ``backend.main`` is imported, so app startup never touches the network.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import types
+import asyncio
+import itertools
+import threading
+
+from backend.services.batch_planner import estimate_tokens
+
+_COUNT_RE = re.compile(r"EXACTLY (\d+) objects")
+_SECTION_RE = re.compile(r"\*\*Document Section:\*\*\s*---(.*?)---", re.DOTALL)
+_DATE_RE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+_RISK_LEVELS = ("Green", "Green", "Orange", "Red")
+
+
+_CHAT_ANSWER = (
+    "Under the agreement the Supplier must meet each obligation by the date set in its clause. "
+    "The Customer may rely on those clauses for the duration of the agreement, and termination "
+    "for a missed deadline requires written notice. The schedules referenced in each clause set "
+    "out the detail, so check the relevant schedule before acting on a specific deadline."
+)
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StreamedResponse:
+    """Async-iterable chunks, paced like a model emitting output tokens."""
+
+    def __init__(self, text: str, seconds: float, words_per_chunk: int = 4):
+        self.text = text
+        words = text.split(" ")
+        self._chunks = [" ".join(words[i:i + words_per_chunk]) + (" " if i + words_per_chunk < len(words) else "")
+                        for i in range(0, len(words), words_per_chunk)]
+        self._seconds_per_chunk = seconds / len(self._chunks)
+
+    async def __aiter__(self):
+        for index, chunk in enumerate(self._chunks):
+            if index:
+                await asyncio.sleep(self._seconds_per_chunk)
+            yield _Response(chunk)
+
+
+class _FakeCachedModel:
+    """A FakeGeminiModel bound to a context cache: the cached prefix is not sent again."""
+
+    def __init__(self, model: "FakeGeminiModel", cached_tokens: int):
+        self._model = model
+        self.cached_tokens = cached_tokens
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self._model.counters["cached_tokens"] += self.cached_tokens
+        return await self._model.generate_content_async(prompt, **kwargs)
+
+
+class FakeGeminiModel:
+    """Stands in for ``genai.GenerativeModel`` and answers each prompt type in the expected shape."""
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.2, quota_error_rate: float = 0.0,
+                 transient_error_rate: float = 0.0, output_tokens_per_second: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_error_rate = quota_error_rate
+        self.transient_error_rate = transient_error_rate
+        self.output_tokens_per_second = output_tokens_per_second
+        self.random = random.Random(seed)
+        self.counters = {"calls": 0, "quota_errors": 0, "transient_errors": 0, "input_tokens": 0, "output_tokens": 0,
+                         "cached_tokens": 0, "context_caches": 0, "context_caches_deleted": 0}
+
+    def _answer(self, prompt: str) -> str:
+        count = _COUNT_RE.search(prompt)
+        if count and '"summary"' in prompt:
+            return json.dumps([
+                {"index": i + 1, "summary": "A standard services agreement with moderate termination risk."}
+                for i in range(int(count.group(1)))
+            ])
+        if count:
+            return json.dumps([
+                {"index": i + 1, "risk_level": self.random.choice(_RISK_LEVELS),
+                 "plain_english": "This clause sets out a standard obligation.", "emoji_summary": "📄"}
+                for i in range(int(count.group(1)))
+            ])
+        section = _SECTION_RE.search(prompt)
+        if section:
+            return json.dumps([
+                {"date": date, "event": "Obligation falls due", "parties": "Supplier, Customer"}
+                for date in sorted(set(_DATE_RE.findall(section.group(1))))
+            ])
+        if "**User's Question:**" in prompt:
+            return _CHAT_ANSWER
+        return "The agreement is a standard services contract with moderate termination risk."
+
+    async def generate_content_async(self, prompt, stream: bool = False, **kwargs):
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        self.counters["calls"] += 1
+        self.counters["input_tokens"] += estimate_tokens(prompt)
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter) * self.latency))
+
+        roll = self.random.random()
+        if roll < self.quota_error_rate:
+            self.counters["quota_errors"] += 1
+            raise RuntimeError("429 Resource has been exhausted (fake quota)")
+        if roll < self.quota_error_rate + self.transient_error_rate:
+            self.counters["transient_errors"] += 1
+            raise ConnectionError("503 fake transient failure")
+
+        text = self._answer(prompt)
+        tokens = estimate_tokens(text)
+        self.counters["output_tokens"] += tokens
+        generation = tokens / self.output_tokens_per_second if self.output_tokens_per_second else 0.0
+        if stream:
+            # The base latency is time to first token; generation time is spread over the chunks
+            return _StreamedResponse(text, generation)
+        await asyncio.sleep(generation)
+        return _Response(text)
+
+    def generate_content(self, prompt, **kwargs):
+        return asyncio.run(self.generate_content_async(prompt, **kwargs))
+
+    def create_cached_model(self, system_instruction: str, contents: str,
+                            ttl_seconds: float) -> tuple[_FakeCachedModel, str]:
+        """Stands in for ``gemini_service.create_cached_model`` (runs on the blocking pool)."""
+        time.sleep(self.latency)
+        self.counters["context_caches"] += 1
+        name = f"cachedContents/fake-{self.counters['context_caches']}"
+        return _FakeCachedModel(self, estimate_tokens(system_instruction) + estimate_tokens(contents)), name
+
+    def delete_cached_content(self, name: str):
+        """Stands in for ``gemini_service.delete_cached_content``."""
+        time.sleep(self.latency)
+        self.counters["context_caches_deleted"] += 1
+
+
+# --- Firestore ---
+
+class _Snapshot:
+    def __init__(self, reference, data: dict | None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> dict | None:
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        return (self._data or {}).get(field)
+
+
+class _DocumentReference:
+    def __init__(self, db: "FakeFirestore", path: str):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str) -> "_Query":
+        return _Query(self._db, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None, **kwargs) -> _Snapshot:
+        self._db._op("reads")
+        data = self._db._docs.get(self.path)
+        if data is not None and field_paths:
+            data = {k: v for k, v in data.items() if k in field_paths}
+        return _Snapshot(self, data)
+
+    def set(self, data: dict, merge: bool = False):
+        self._db._op("writes")
+        with self._db._lock:
+            self._db._set(self.path, data, merge)
+
+    def update(self, data: dict):
+        self._db._op("writes")
+        with self._db._lock:
+            if self.path not in self._db._docs:
+                raise KeyError(f"No document to update: {self.path}")
+            self._db._set(self.path, data, merge=True)
+
+    def delete(self):
+        self._db._op("writes")
+        with self._db._lock:
+            self._db._docs.pop(self.path, None)
+
+
+class _Query:
+    """Collection reference and query in one; supports what the services use."""
+
+    def __init__(self, db: "FakeFirestore", path: str, filters=(), orders=(), fields=None, limit_to=None, after=None):
+        self._db = db
+        self._path = path
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._fields = fields
+        self._limit = limit_to
+        self._after = after
+
+    def _copy(self, **changes) -> "_Query":
+        state = dict(filters=self._filters, orders=self._orders, fields=self._fields,
+                     limit_to=self._limit, after=self._after)
+        state.update(changes)
+        return _Query(self._db, self._path, **state)
+
+    def document(self, doc_id: str | None = None) -> _DocumentReference:
+        return _DocumentReference(self._db, f"{self._path}/{doc_id or self._db._new_id()}")
+
+    def add(self, data: dict):
+        reference = self.document()
+        reference.set(data)
+        return time.time(), reference
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None) -> "_Query":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "_Query":
+        return self._copy(orders=self._orders + [(field_path, direction == "DESCENDING")])
+
+    def select(self, field_paths) -> "_Query":
+        return self._copy(fields=list(field_paths))
+
+    def limit(self, count: int) -> "_Query":
+        return self._copy(limit_to=count)
+
+    def start_after(self, values: dict) -> "_Query":
+        return self._copy(after=values)
+
+    def _value(self, snapshot_id: str, data: dict, field: str):
+        return snapshot_id if field == "__name__" else data.get(field)
+
+    def stream(self, transaction=None):
+        self._db._op("queries")
+        prefix = self._path + "/"
+        with self._db._lock:
+            rows = [
+                (path.rsplit("/", 1)[-1], dict(data)) for path, data in self._db._docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            ]
+        for field, op, value in self._filters:
+            if op != "==":
+                raise NotImplementedError(f"FakeFirestore supports '==' filters only, got {op!r}")
+            rows = [row for row in rows if row[1].get(field) == value]
+        for field, descending in reversed(self._orders):
+            rows = [row for row in rows if field == "__name__" or field in row[1]]
+            rows.sort(key=lambda row: self._value(row[0], row[1], field), reverse=descending)
+        if self._after is not None:
+            key = [self._after[field] if field != "__name__" else getattr(self._after[field], "id", self._after[field])
+                   for field, _ in self._orders]
+            rows = [row for row in rows if self._is_after(row, key)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        for doc_id, data in rows:
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            yield _Snapshot(self.document(doc_id), data)
+
+    def _is_after(self, row, key) -> bool:
+        for (field, descending), bound in zip(self._orders, key):
+            value = self._value(row[0], row[1], field)
+            if value == bound:
+                continue
+            return value < bound if descending else value > bound
+        return False
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+
+class _Batch:
+    def __init__(self, db: "FakeFirestore"):
+        self._db = db
+        self._ops = []
+
+    def set(self, reference, data, merge: bool = False):
+        self._ops.append(("set", reference, data, merge))
+
+    def update(self, reference, data):
+        self._ops.append(("update", reference, data, True))
+
+    def delete(self, reference):
+        self._ops.append(("delete", reference, None, False))
+
+    def commit(self):
+        self._db._op("commits")
+        with self._db._lock:
+            for kind, reference, data, merge in self._ops:
+                if kind == "delete":
+                    self._db._docs.pop(reference.path, None)
+                else:
+                    self._db._set(reference.path, data, merge)
+        self._db.counters["writes"] += len(self._ops)
+        return []
+
+
+class FakeFirestore:
+    """Dict-backed Firestore client; every operation sleeps ``latency`` like a network round trip."""
+
+    def __init__(self, latency: float = 0.01):
+        self.latency = latency
+        self._docs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self.counters = {"reads": 0, "writes": 0, "queries": 0, "commits": 0}
+
+    def _op(self, kind: str):
+        self.counters[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _new_id(self) -> str:
+        return f"fake{next(self._ids):016d}"
+
+    def _set(self, path: str, data: dict, merge: bool):
+        if merge and path in self._docs:
+            self._docs[path] = {**self._docs[path], **data}
+        else:
+            self._docs[path] = dict(data)
+
+    def collection(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def batch(self) -> _Batch:
+        return _Batch(self)
+
+    def get_all(self, references):
+        return [reference.get() for reference in references]
+
+
+# --- Vercel Blob ---
+
+class FakeBlob:
+    """Blob store with ``put`` matching vercel_blob.put and a text-store backend on top."""
+
+    name = "blob"
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.objects: dict[str, bytes] = {}
+        self.counters = {"puts": 0, "gets": 0, "bytes_stored": 0}
+
+    def put(self, path: str, data: bytes, options: dict | None = None) -> dict:
+        time.sleep(self.latency)
+        self.counters["puts"] += 1
+        self.counters["bytes_stored"] += len(data)
+        self.objects[path] = data
+        return {"url": f"https://fake.blob.local/{path}", "pathname": path}
+
+    # TextStore backend interface
+    def put_text(self, key: str, data: bytes, codec: str) -> dict:
+        result = self.put(f"texts/{key}.{codec}", data)
+        return {"store": self.name, "key": key, "codec": codec, "url": result["url"]}
+
+    def get(self, ref: dict) -> bytes | None:
+        time.sleep(self.latency)
+        self.counters["gets"] += 1
+        return self.objects.get(f"texts/{ref['key']}.{ref['codec']}")
+
+
+class _BlobTextBackend:
+    name = "blob"
+
+    def __init__(self, blob: FakeBlob):
+        self.blob = blob
+
+    def put(self, key: str, data: bytes, codec: str) -> dict:
+        return self.blob.put_text(key, data, codec)
+
+    def get(self, ref: dict) -> bytes | None:
+        return self.blob.get(ref)
+
+
+class Fakes:
+    def __init__(self, model: FakeGeminiModel, firestore: FakeFirestore, blob: FakeBlob):
+        self.model = model
+        self.firestore = firestore
+        self.blob = blob
+
+    def counters(self) -> dict:
+        return {"gemini": dict(self.model.counters), "firestore": dict(self.firestore.counters),
+                "blob": dict(self.blob.counters)}
+
+
+def install(model: FakeGeminiModel, firestore: FakeFirestore, blob: FakeBlob, state_dir: str) -> Fakes:
+    """Points every external dependency at the fakes; call before importing backend.main."""
+    os.environ.update({
+        "CLAUSE_CACHE_BACKEND": "memory",
+        "JOB_QUEUE_BACKEND": "memory",
+        "VECTOR_EMBEDDER": "hashing",
+        "BLOB_READ_WRITE_TOKEN": "fake",
+        "LOCAL_STORE_PATH": os.path.join(state_dir, "documents.sqlite3"),
+        "VECTOR_INDEX_DIR": os.path.join(state_dir, "vectors"),
+        "CLAUSE_INDEX_PATH": os.path.join(state_dir, "clauses.sqlite3"),
+        "TEXT_STORE_DIR": os.path.join(state_dir, "texts"),
+    })
+
+    import firebase_admin
+    from firebase_admin import firestore as firebase_firestore
+
+    # initialize_firebase() takes its "already initialized" branch and gets the fake client
+    firebase_admin._apps.setdefault("[DEFAULT]", object())
+    firebase_firestore.client = lambda *args, **kwargs: firestore
+
+    from backend.services import gemini_service
+    gemini_service.model = model
+    gemini_service.create_cached_model = model.create_cached_model
+    gemini_service.delete_cached_content = model.delete_cached_content
+
+    from backend import main
+    from backend.services.text_store import TextStore
+    main.VERCEL_BLOB_AVAILABLE = True
+    sys.modules["vercel_blob"] = types.SimpleNamespace(put=blob.put)
+    main.text_store = TextStore(_BlobTextBackend(blob))
+    return Fakes(model, firestore, blob)
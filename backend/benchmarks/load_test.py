@@ -0,0 +1,247 @@
+"""Offline load test of the whole API against fake Gemini, Firestore and Blob.
+
+Runs the FastAPI app in-process (backend/benchmarks/fakes.py). Three phases
+run one after another: uploads of synthetic contracts, chat questions about
+the uploaded documents, and history listings. Each phase reports p50/p95/p99
+latency and requests/sec. The run also reports model calls and tokens per
+uploaded document, plus peak memory. The threshold flags make the exit
+status non-zero, so the run can gate a CI job.
+
+    python -m backend.benchmarks.load_test
+    python -m backend.benchmarks.load_test --documents 40 --clauses 120 --concurrency 8 --quota-error-rate 0.05
+    python -m backend.benchmarks.load_test --documents 100 --clauses 8 --batch-size 25
+    python -m backend.benchmarks.load_test --max-upload-p95-ms 3000 --max-calls-per-doc 6 --json report.json
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import io
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import contextlib
+import tracemalloc
+
+import httpx
+
+from backend.benchmarks import fakes
+
+_TOPICS = ("payment", "termination", "liability", "confidentiality", "indemnity", "warranty", "notice", "assignment")
+
+
+def synthetic_contract(number: int, clauses: int, rng: random.Random) -> str:
+    """A plain-text contract with numbered, dated clauses unique to ``number``."""
+    parts = [f"MASTER SERVICES AGREEMENT No. {number}\n\nThis Agreement is made between Supplier Ltd and Customer {number} Inc."]
+    for index in range(1, clauses + 1):
+        topic = rng.choice(_TOPICS)
+        day = f"20{rng.randint(20, 29)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        parts.append(
+            f"{index}. {topic.title()}. The Supplier shall comply with its {topic} obligations under "
+            f"schedule {number}-{index} no later than {day}, and the Customer may rely on this clause "
+            f"for the duration of the agreement."
+        )
+    return "\n\n".join(parts)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_phase(name: str, requests: list, concurrency: int) -> dict:
+    """Sends ``requests`` (zero-argument coroutine factories) with at most ``concurrency`` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors, results = [], 0, []
+
+    async def one(send):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await send()
+                response.raise_for_status()
+                results.append(response)
+            except Exception:
+                errors += 1
+            finally:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(send) for send in requests])
+    elapsed = time.perf_counter() - started
+    return {
+        "phase": name,
+        "requests": len(requests),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(requests) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "_responses": results,
+    }
+
+
+async def run(args, installed: fakes.Fakes) -> dict:
+    from backend import main
+
+    rng = random.Random(args.seed)
+    users = [f"user{n}" for n in range(args.users)]
+    documents = [
+        (users[n % len(users)], "timeline" if rng.random() < args.timeline_share else "risk",
+         synthetic_contract(n, args.clauses, rng).encode("utf-8"))
+        for n in range(args.documents)
+    ]
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        def upload(user, analysis_type, body, n):
+            return lambda: client.post(
+                "/api/upload", params={"userId": user, "analysisType": analysis_type},
+                files={"file": (f"contract-{n}.txt", body, "text/plain")},
+            )
+
+        def chat(doc_id, n):
+            return lambda: client.post("/api/chat", json={"document_id": doc_id, "question": f"What is the {_TOPICS[n % len(_TOPICS)]} deadline?"})
+
+        def history(user):
+            return lambda: client.get("/api/documents", params={"userId": user, "limit": args.page_size})
+
+        def upload_batch(group):
+            user, analysis_type = documents[group[0]][0], documents[group[0]][1]
+            return lambda: client.post(
+                "/api/upload/batch", params={"userId": user, "analysisType": analysis_type},
+                files=[("files", (f"contract-{n}.txt", documents[n][2], "text/plain")) for n in group],
+            )
+
+        if args.batch_size:
+            # Group by (user, analysis type), since a batch belongs to one user and one type
+            groups: dict[tuple, list[int]] = {}
+            for n, (user, analysis_type, _) in enumerate(documents):
+                groups.setdefault((user, analysis_type), []).append(n)
+            batches = [members[i:i + args.batch_size] for members in groups.values()
+                       for i in range(0, len(members), args.batch_size)]
+            requests = [upload_batch(group) for group in batches]
+        else:
+            requests = [upload(*doc, n) for n, doc in enumerate(documents)]
+        before = dict(installed.model.counters)
+        phases = [await run_phase("upload", requests, args.concurrency)]
+        if main.background_tasks:
+            await asyncio.gather(*list(main.background_tasks), return_exceptions=True)
+        upload_calls = {key: installed.model.counters[key] - before[key] for key in before}
+
+        if args.batch_size:
+            doc_ids = [document["document_id"] for response in phases[0]["_responses"]
+                       for document in response.json()["documents"] if document["document_id"]]
+        else:
+            doc_ids = [response.json()["document_id"] for response in phases[0]["_responses"]]
+        if doc_ids:
+            phases.append(await run_phase("chat", [chat(doc_ids[n % len(doc_ids)], n) for n in range(args.chats)], args.concurrency))
+        phases.append(await run_phase("history", [history(users[n % len(users)]) for n in range(args.history)], args.concurrency))
+
+    for phase in phases:
+        phase.pop("_responses")
+    uploaded = max(1, len(doc_ids))
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "phases": phases,
+        "per_document": {
+            "model_calls": round(upload_calls["calls"] / uploaded, 2),
+            "input_tokens": round(upload_calls["input_tokens"] / uploaded),
+            "output_tokens": round(upload_calls["output_tokens"] / uploaded),
+            "quota_errors": round(upload_calls["quota_errors"] / uploaded, 2),
+        },
+        "fakes": installed.counters(),
+    }
+
+
+def check_thresholds(report: dict, args) -> list[str]:
+    phases = {phase["phase"]: phase for phase in report["phases"]}
+    failures = []
+    for name, limit in (("upload", args.max_upload_p95_ms), ("chat", args.max_chat_p95_ms)):
+        if limit is not None and name in phases and phases[name]["p95_ms"] > limit:
+            failures.append(f"{name} p95 {phases[name]['p95_ms']} ms > {limit} ms")
+    if args.max_calls_per_doc is not None and report["per_document"]["model_calls"] > args.max_calls_per_doc:
+        failures.append(f"model calls per document {report['per_document']['model_calls']} > {args.max_calls_per_doc}")
+    if args.max_error_rate is not None:
+        for phase in report["phases"]:
+            rate = phase["errors"] / phase["requests"] if phase["requests"] else 0.0
+            if rate > args.max_error_rate:
+                failures.append(f"{phase['phase']} error rate {rate:.1%} > {args.max_error_rate:.1%}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20, help="Uploads in the upload phase")
+    parser.add_argument("--clauses", type=int, default=60, help="Clauses per synthetic document")
+    parser.add_argument("--timeline-share", type=float, default=0.2, help="Fraction of uploads with analysisType=timeline")
+    parser.add_argument("--batch-size", type=int, default=0, help="Upload through /api/upload/batch, this many files per request")
+    parser.add_argument("--chats", type=int, default=40)
+    parser.add_argument("--history", type=int, default=40)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--model-latency", type=float, default=0.3, help="Seconds per fake Gemini call")
+    parser.add_argument("--model-jitter", type=float, default=0.3, help="Relative +/- jitter on model latency")
+    parser.add_argument("--quota-error-rate", type=float, default=0.0, help="Share of model calls failing with 429")
+    parser.add_argument("--transient-error-rate", type=float, default=0.0, help="Share of model calls failing with 503")
+    parser.add_argument("--firestore-latency", type=float, default=0.01)
+    parser.add_argument("--blob-latency", type=float, default=0.05)
+    parser.add_argument("--trace-memory", action="store_true", help="Also report the tracemalloc peak (slower)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own log output")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--max-upload-p95-ms", type=float)
+    parser.add_argument("--max-chat-p95-ms", type=float)
+    parser.add_argument("--max-calls-per-doc", type=float)
+    parser.add_argument("--max-error-rate", type=float)
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix="lawlytics_load_")
+    installed = fakes.install(
+        fakes.FakeGeminiModel(args.model_latency, args.model_jitter, args.quota_error_rate,
+                              args.transient_error_rate, seed=args.seed),
+        fakes.FakeFirestore(args.firestore_latency),
+        fakes.FakeBlob(args.blob_latency),
+        state_dir,
+    )
+
+    if args.trace_memory:
+        tracemalloc.start()
+    log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with log:
+        report = asyncio.run(run(args, installed))
+    report["memory"] = {"max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    if args.trace_memory:
+        report["memory"]["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+
+    print(f"documents={args.documents} clauses={args.clauses} concurrency={args.concurrency} "
+          f"model_latency={args.model_latency}s quota_error_rate={args.quota_error_rate}")
+    print(f"{'phase':<10}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for phase in report["phases"]:
+        print(f"{phase['phase']:<10}{phase['requests']:>9}{phase['errors']:>8}{phase['rps']:>9}"
+              f"{phase['p50_ms']:>10}{phase['p95_ms']:>10}{phase['p99_ms']:>10}")
+    per_document = report["per_document"]
+    print(f"\nper document: {per_document['model_calls']} model calls, "
+          f"{per_document['input_tokens']} input / {per_document['output_tokens']} output tokens")
+    print("memory: " + ", ".join(f"{key} {value}" for key, value in report["memory"].items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""PDF extraction throughput and peak memory: inline join vs. the page-streamed service.
+
+Generates a synthetic multi-page contract PDF, then runs each extraction mode in
+a fresh subprocess so peak RSS is measured independently per mode. The service
+modes run inside an event loop that is already up, as they do in the server.
+Each mode runs --repeat times and the median run is reported.
+
+    python -m backend.benchmarks.pdf_extraction --pages 400
+    python -m backend.benchmarks.pdf_extraction --pages 800 --repeat 7
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import json
+import time
+import statistics
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+
+MODES = ("inline", "streamed", "parallel")
+
+
+def build_pdf(path: str, pages: int):
+    import fitz
+
+    paragraph = (
+        "{n}.{m} The Supplier shall indemnify and hold harmless the Customer against all losses, "
+        "liabilities, damages and expenses arising out of any breach of this Agreement, save where "
+        "such losses arise from the negligence of the Customer or its personnel."
+    )
+    with fitz.open() as doc:
+        for n in range(pages):
+            page = doc.new_page()
+            text = "\n\n".join(paragraph.format(n=n + 1, m=m + 1) for m in range(8))
+            page.insert_textbox(fitz.Rect(50, 60, 545, 780), text, fontsize=9)
+            page.insert_text((50, 810), f"Master Services Agreement - Page {n + 1}", fontsize=8)
+        doc.save(path)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux; include worker processes for the parallel mode
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return (own + children) / 1024
+
+
+def run_mode(mode: str, path: str) -> dict:
+    from backend.services import document_ai_service
+
+    with open(path, "rb") as f:
+        contents = f.read()
+
+    if mode == "inline":
+        # The original upload handler
+        start = time.perf_counter()
+        import fitz
+        with fitz.open(stream=contents, filetype="pdf") as doc:
+            page_count = doc.page_count
+            full_text = "".join(page.get_text() for page in doc)
+        full_text.split('\n')
+        chars = len(full_text)
+        elapsed = time.perf_counter() - start
+        peak_rss = peak_rss_mb()
+    else:
+        if mode == "streamed":
+            document_ai_service.PARALLEL_PAGE_THRESHOLD = 10 ** 9
+
+        async def extract():
+            if mode == "parallel":
+                # The server's pool outlives uploads; start its workers outside the timing
+                await document_ai_service.extract_document(contents, "application/pdf")
+            start = time.perf_counter()
+            document = await document_ai_service.extract_document(contents, "application/pdf")
+            # Before the loop shuts down, whose teardown is not part of extraction
+            return document, time.perf_counter() - start, peak_rss_mb()
+
+        document, elapsed, peak_rss = asyncio.run(extract())
+        page_count, chars = len(document.pages), len(document.text)
+
+    return {
+        "mode": mode,
+        "pages": page_count,
+        "chars": chars,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(page_count / elapsed, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per mode")
+    parser.add_argument("--mode", choices=MODES, help="run a single mode in this process")
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.pdf)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pdf")
+        build_pdf(path, args.pages)
+        print(f"synthetic PDF: {args.pages} pages, {os.path.getsize(path) / 1024:.0f} KiB")
+        print(f"{'mode':<10}{'seconds':>10}{'pages/s':>10}{'peak RSS MB':>14}")
+        runs = {mode: [] for mode in MODES}
+        # Modes take turns so drift in machine load hits each of them alike
+        for _ in range(args.repeat):
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, "-m", "backend.benchmarks.pdf_extraction", "--mode", mode, "--pdf", path],
+                    capture_output=True, text=True, check=True,
+                    cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')),
+                ).stdout.strip().splitlines()[-1]
+                runs[mode].append(json.loads(output))
+        for mode, runs in runs.items():
+            seconds = statistics.median(run["seconds"] for run in runs)
+            rss = statistics.median(run["peak_rss_mb"] for run in runs)
+            print(f"{mode:<10}{seconds:>10.3f}{runs[0]['pages'] / seconds:>10.1f}{rss:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Local risk triage: agreement with Gemini labels and model calls avoided.
+
+Trains risk_triage.RiskClassifier on part of a labelled clause set and
+replays the rest through triage at several confidence thresholds. For each
+threshold it reports the share of clauses answered locally (model calls
+avoided), how often those local labels agree with the model's, and the
+costly flips (Red passed as Green and the reverse).
+
+Labels come from a clause index built by real uploads (--index, the file at
+CLAUSE_INDEX_PATH) or, by default, a synthetic corpus with label noise.
+
+    python -m backend.benchmarks.risk_triage
+    python -m backend.benchmarks.risk_triage --index /tmp/lawlytics_clause_index.sqlite3
+    python -m backend.benchmarks.risk_triage --thresholds 0.8,0.9,0.95,0.99 --noise 0.1
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import time
+import random
+import argparse
+
+from backend.services import clause_index, risk_triage
+
+_PARTIES = ("the Supplier", "the Customer", "the Licensee", "the Contractor", "the Tenant", "the Company")
+_PERIODS = ("thirty days", "sixty days", "ninety days", "one year", "five business days")
+_TEMPLATES = {
+    "Green": (
+        "This Agreement may be executed in any number of counterparts, each of which shall be an original.",
+        "Headings in this Agreement are for convenience only and do not affect its interpretation.",
+        "All notices under this Agreement shall be in writing and sent to the address of {party}.",
+        "If any provision of this Agreement is held invalid, the remaining provisions remain in full force.",
+        "This Agreement constitutes the entire agreement between the parties regarding its subject matter.",
+        "{party} shall provide the services with reasonable skill and care.",
+        "No failure to exercise any right under this Agreement operates as a waiver of that right.",
+    ),
+    "Orange": (
+        "{party} may terminate this Agreement on {period} written notice.",
+        "This Agreement renews automatically for successive one year terms unless cancelled {period} before renewal.",
+        "{party} may assign this Agreement to an affiliate without consent.",
+        "Fees may be increased by {party} once per year on {period} notice.",
+        "{party} shall keep the Confidential Information secret for {period} after termination.",
+        "Disputes shall be resolved by arbitration seated in the jurisdiction of {party}.",
+    ),
+    "Red": (
+        "{party} shall indemnify and hold harmless the other party against all losses without limitation.",
+        "{party} waives all rights to bring any claim after {period}, including for gross negligence.",
+        "{party} may not compete with or solicit customers of the other party for five years after termination.",
+        "Late payments accrue interest at five percent per month, compounded, payable by {party}.",
+        "{party} may terminate this Agreement immediately at its sole discretion without any refund.",
+        "{party} grants an irrevocable perpetual licence to all intellectual property created, without compensation.",
+    ),
+}
+
+
+def synthetic_examples(count: int, noise: float, rng: random.Random) -> list[tuple[str, str]]:
+    """Template clauses with varied parties, periods and numbering; ``noise`` of labels are flipped."""
+    labels = list(_TEMPLATES)
+    examples = []
+    for number in range(count):
+        # Boilerplate dominates real contracts
+        label = rng.choices(labels, weights=(0.55, 0.25, 0.20))[0]
+        text = rng.choice(_TEMPLATES[label]).format(party=rng.choice(_PARTIES), period=rng.choice(_PERIODS))
+        text = f"{rng.randint(1, 30)}.{rng.randint(1, 9)} {text}"
+        if rng.random() < noise:
+            label = rng.choice([other for other in labels if other != label])
+        examples.append((text, label))
+    return examples
+
+
+def report(rows: list[dict]):
+    print(f"{'threshold':>10}{'avoided':>10}{'agreement':>11}{'red->green':>12}{'green->red':>12}{'orange':>8}")
+    for row in rows:
+        agreement = f"{row['agreement']:.1%}" if row["agreement"] is not None else "-"
+        print(f"{row['threshold']:>10.2f}{row['calls_avoided']:>10.1%}{agreement:>11}"
+              f"{row['red_as_green']:>12}{row['green_as_red']:>12}{row['orange_assigned']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--index", help="clause index SQLite file with model-labelled clauses")
+    parser.add_argument("--examples", type=int, default=20000, help="synthetic clauses (without --index)")
+    parser.add_argument("--noise", type=float, default=0.05, help="share of synthetic labels flipped")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--thresholds", default="0.8,0.9,0.95,0.98,0.99")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.index:
+        examples = clause_index.ClauseIndex(args.index).labelled_clauses(risk_triage.RISK_TRIAGE_MAX_EXAMPLES)
+        examples = [tuple(example) for example in examples]
+        rng.shuffle(examples)
+    else:
+        examples = synthetic_examples(args.examples, args.noise, rng)
+    split = int(len(examples) * (1 - args.holdout))
+    train, test = examples[:split], examples[split:]
+    if not train or not test:
+        sys.exit(f"Need more labelled clauses than {len(examples)}.")
+
+    started = time.perf_counter()
+    classifier = risk_triage.RiskClassifier.train([text for text, _ in train], [label for _, label in train])
+    train_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    classifier.predict_proba([text for text, _ in test])
+    predict_seconds = time.perf_counter() - started
+    print(f"trained on {len(train)} clauses in {train_seconds:.2f}s; "
+          f"triaged {len(test)} in {predict_seconds * 1000:.0f} ms ({predict_seconds * 1e6 / len(test):.0f} us/clause)")
+
+    texts, labels = [text for text, _ in test], [label for _, label in test]
+    report([
+        risk_triage.evaluate(classifier, texts, labels, float(threshold))
+        for threshold in args.thresholds.split(",")
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Clause-analysis reply handling: all-or-nothing json.loads vs. the salvaging parser.
+
+Replays a fixture set of model replies through the legacy analyze_chunk logic
+and through the current one. Counts model calls, retries, tokens spent,
+tokens wasted on discarded output, and clauses that ended up as Gray
+fallbacks. The first attempt of each case gets its stored reply; retries are
+answered cleanly for exactly the clauses asked.
+
+    python -m backend.benchmarks.structured_output
+    python -m backend.benchmarks.structured_output --fixtures captured_replies.json
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import re
+import json
+import asyncio
+import argparse
+
+from backend import main as app
+from backend.services import gemini_service
+from backend.services.batch_planner import estimate_tokens
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "clause_replies.json")
+_COUNT_RE = re.compile(r"EXACTLY (\d+) objects")
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ReplayModel:
+    """Serves the stored reply first, then clean replies sized to each prompt."""
+
+    def __init__(self, first_reply: str):
+        self.replies = [first_reply]
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.log: list[tuple[int, int]] = []  # (asked clauses, tokens) per call
+
+    async def generate(self, prompt, priority=gemini_service.PRIORITY_BULK, **kwargs):
+        asked = int(_COUNT_RE.search(prompt).group(1))
+        if self.replies:
+            text = self.replies.pop(0)
+        else:
+            text = json.dumps([
+                {"index": i + 1, "risk_level": "Green", "plain_english": "Standard clause.", "emoji_summary": "✅"}
+                for i in range(asked)
+            ])
+        tokens = estimate_tokens(prompt) + estimate_tokens(text)
+        self.calls += 1
+        self.input_tokens += estimate_tokens(prompt)
+        self.output_tokens += estimate_tokens(text)
+        self.log.append((asked, tokens))
+        return _Response(text)
+
+
+async def legacy_analyze_chunk(chunk: list[str], max_retries: int = 2) -> list[dict]:
+    """The pre-salvage analyze_chunk: the whole reply parses with the right length, or it is retried."""
+    prompt = app.build_chunk_prompt(chunk)
+    for _ in range(max_retries):
+        try:
+            response = await gemini_service.generate(prompt, priority=gemini_service.PRIORITY_BULK)
+            analysis_list = json.loads(response.text.strip().replace("```json", "").replace("```", ""))
+            if isinstance(analysis_list, list) and len(analysis_list) == len(chunk):
+                return analysis_list
+        except Exception:
+            pass
+    return [app.create_fallback_analysis("AI processing error") for _ in chunk]
+
+
+def replay(case: dict, analyze) -> dict:
+    model = ReplayModel(case["reply"])
+    gemini_service.generate = model.generate
+    results = asyncio.run(analyze(case["clauses"]))
+    fallbacks = sum(1 for r in results if r.get("risk_level") == "Gray")
+
+    # Clauses a call left unsettled are asked again by the next call (or end as fallbacks);
+    # that share of the call's tokens bought nothing
+    wasted = 0.0
+    unsettled = [asked for asked, _ in model.log[1:]] + [fallbacks]
+    for (asked, tokens), left in zip(model.log, unsettled):
+        wasted += tokens * left / asked
+    return {
+        "calls": model.calls,
+        "retries": model.calls - 1,
+        "tokens": model.input_tokens + model.output_tokens,
+        "wasted_tokens": round(wasted),
+        "fallbacks": fallbacks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="JSON file with {cases: [{name, clauses, reply}]}")
+    args = parser.parse_args()
+    with open(args.fixtures, encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+
+    real_generate = gemini_service.generate
+    totals = {"legacy": {}, "salvage": {}}
+    print(f"{'case':<26}{'clauses':>8}{'legacy calls':>14}{'salvage calls':>15}{'legacy waste':>14}{'salvage waste':>15}")
+    try:
+        for case in cases:
+            legacy = replay(case, legacy_analyze_chunk)
+            salvage = replay(case, app.analyze_chunk)
+            for name, row in (("legacy", legacy), ("salvage", salvage)):
+                for key, value in row.items():
+                    totals[name][key] = totals[name].get(key, 0) + value
+            print(f"{case['name']:<26}{len(case['clauses']):>8}{legacy['calls']:>14}{salvage['calls']:>15}"
+                  f"{legacy['wasted_tokens']:>14}{salvage['wasted_tokens']:>15}")
+    finally:
+        gemini_service.generate = real_generate
+
+    print()
+    for key in ("calls", "retries", "tokens", "wasted_tokens", "fallbacks"):
+        legacy, salvage = totals["legacy"].get(key, 0), totals["salvage"].get(key, 0)
+        change = f"{(salvage - legacy) / legacy:+.0%}" if legacy else "n/a"
+        print(f"{key:<14} legacy {legacy:>7}   salvage {salvage:>7}   ({change})")
+
+
+if __name__ == "__main__":
+    main()
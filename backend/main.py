@@ -3,44 +3,61 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import json
-import fitz
+import time
 import asyncio
 import base64
-import firebase_admin
-from firebase_admin import credentials, firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+import functools
+import threading
+import importlib.util
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from backend.services import gemini_service
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from backend.services import (
+    gemini_service, analysis_cache, job_queue, batch_planner, vector_db_service, document_ai_service,
+    clause_segmenter, document_listing, document_cache, local_store as local_store_service, timeline_service,
+    versioning, structured_output, telemetry, upload_dedup, batch_upload, chat_session,
+    text_store as text_store_service, clause_index, risk_triage, stage_graph
+)
+from backend.services.executor import run_blocking
 from datetime import datetime, timezone
 
-# Fix for Vercel Blob import
-try:
-    from vercel_blob import put
-    VERCEL_BLOB_AVAILABLE = True
-except ImportError:
-    print("⚠️ Vercel Blob not available - file uploads will work without blob storage")
-    VERCEL_BLOB_AVAILABLE = False
+# Fix for Vercel Blob import: only probe for the package here, it is imported on first upload
+VERCEL_BLOB_AVAILABLE = importlib.util.find_spec("vercel_blob") is not None
+if not VERCEL_BLOB_AVAILABLE:
+    telemetry.log("⚠️ Vercel Blob not available - file uploads will work without blob storage", level="warning")
 
 # --- Enhanced Firebase Initialization ---
+def describe_firestore_error(error_msg: str) -> str:
+    """Operator-facing explanation of a Firestore setup failure."""
+    if "SERVICE_DISABLED" in error_msg or "has not been used" in error_msg:
+        return ("Firestore API is not enabled. Please enable it in Google Cloud Console: "
+                "https://console.developers.google.com/apis/api/firestore.googleapis.com/overview")
+    if "service account" in error_msg.lower():
+        return "Firebase service account file not found"
+    return f"Firebase initialization error: {error_msg}"
+
 def initialize_firebase():
     """Initialize Firebase with comprehensive error handling."""
     try:
+        # firebase_admin pulls in the whole Firestore/gRPC stack; only load it when first needed
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
         # Check if already initialized
         if firebase_admin._apps:
-            print("ℹ️ Firebase already initialized")
+            telemetry.log("ℹ️ Firebase already initialized")
             return firestore.client()
 
         # Check if the Base64 env var exists (for Vercel deployment)
         firebase_key_b64 = os.getenv('FIREBASE_SERVICE_ACCOUNT_BASE64')
         if firebase_key_b64:
-            print("🔑 Using Firebase credentials from environment variable")
+            telemetry.log("🔑 Using Firebase credentials from environment variable")
             key_json = base64.b64decode(firebase_key_b64).decode('utf-8')
             cred_dict = json.loads(key_json)
             cred = credentials.Certificate(cred_dict)
         else:
             # Fallback to local file for local development
-            print("🔑 Using Firebase credentials from local file")
+            telemetry.log("🔑 Using Firebase credentials from local file")
             local_files = ["serviceAccountKey.json", "lawlytics-firebase.json"]
             cred_file = None
             
@@ -55,27 +72,77 @@ def initialize_firebase():
             cred = credentials.Certificate(cred_file)
 
         firebase_admin.initialize_app(cred)
-        
-        # Test Firestore connection
-        db = firestore.client()
-        # Simple test query to verify API is enabled
-        db.collection('test').limit(1).get()
-        print("✅ Firebase and Firestore initialized successfully")
-        return db
+        # No round trip here: connectivity is checked by /health, not on every cold start
+        telemetry.log("✅ Firebase and Firestore initialized")
+        return firestore.client()
     
     except Exception as e:
-        error_msg = str(e)
-        if "SERVICE_DISABLED" in error_msg or "has not been used" in error_msg:
-            print("❌ Firestore API is not enabled. Please enable it in Google Cloud Console:")
-            print("   https://console.developers.google.com/apis/api/firestore.googleapis.com/overview")
-        elif "service account" in error_msg.lower():
-            print("❌ Firebase service account file not found")
-        else:
-            print(f"❌ Firebase initialization error: {error_msg}")
+        telemetry.log(f"❌ {describe_firestore_error(str(e))}", level="error")
         return None
 
-# Initialize Firebase and get Firestore client
-firestore_db = initialize_firebase()
+# Created on first use and reused by every warm invocation of the serverless function
+_firestore_db = None
+_firestore_initialized = False
+_firestore_lock = threading.Lock()
+
+def get_firestore_db():
+    """The shared Firestore client, or None when Firebase is not configured."""
+    global _firestore_db, _firestore_initialized
+    if not _firestore_initialized:
+        with _firestore_lock:
+            if not _firestore_initialized:
+                _firestore_db = initialize_firebase()
+                _firestore_initialized = True
+    return _firestore_db
+
+async def firestore_client():
+    """get_firestore_db() for async callers; the first call initializes off the event loop."""
+    if _firestore_initialized:
+        return _firestore_db
+    return await run_blocking(get_firestore_db)
+
+def probe_firestore(db) -> None:
+    """Simple query that fails when Firestore is unreachable or its API is disabled (blocking)."""
+    db.collection('test').limit(1).get()
+
+# Seconds /health waits for the Firestore probe
+FIRESTORE_PROBE_TIMEOUT = float(os.getenv("FIRESTORE_PROBE_TIMEOUT", "5"))
+
+# Bump whenever the analyze_chunk prompt changes so stale cached analyses are not reused.
+CLAUSE_PROMPT_VERSION = "clause-v2"
+
+@functools.cache
+def get_clause_cache() -> analysis_cache.ClauseAnalysisCache:
+    """Content-addressed cache of per-clause analyses shared across uploads."""
+    return analysis_cache.create_clause_cache(
+        get_firestore_db(), prompt_version=CLAUSE_PROMPT_VERSION, model_name=gemini_service.MODEL_NAME
+    )
+
+@functools.cache
+def get_timeline_cache() -> timeline_service.WindowCache:
+    """Per-window timeline extractions, so regenerating after an edit only re-runs changed windows."""
+    return analysis_cache.create_clause_cache(
+        get_firestore_db(), prompt_version=timeline_service.TIMELINE_PROMPT_VERSION,
+        model_name=gemini_service.MODEL_NAME, cache_class=timeline_service.WindowCache
+    )
+
+# Token-aware packing of clauses into analyze_chunk requests
+clause_batcher = batch_planner.BatchPlanner()
+
+# Per-document chunk embeddings used to retrieve chat context
+vector_index = vector_db_service.VectorIndex()
+
+# Read-through cache of stored documents and their raw text for repeat reads (chat turns)
+documents_cache = document_cache.DocumentCache()
+
+# Per-document chat prompt prefixes (or Gemini context caches) and per-conversation history
+chat_contexts = chat_session.ChatContexts()
+conversations = chat_session.Conversations()
+
+# Compressed raw document text, kept out of Firestore documents
+text_store = text_store_service.create_text_store(
+    VERCEL_BLOB_AVAILABLE and os.getenv('BLOB_READ_WRITE_TOKEN') is not None
+)
 
 app = FastAPI()
 
@@ -86,10 +153,61 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Trace-Id"],
+)
+
+# --- Request tracing ---
+http_requests = telemetry.registry.counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
 )
+http_request_seconds = telemetry.registry.histogram(
+    "http_request_seconds", "Time to response headers by route.", ("method", "route")
+)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Gives each request a trace id (echoed as X-Trace-Id) and logs its stage timings."""
+    trace_id = telemetry.trace_id_from_headers(request.headers)
+    with telemetry.trace(trace_id) as spans:
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Trace-Id"] = trace_id
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            route = request.scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            http_requests.inc(method=request.method, route=route_path, status=status)
+            http_request_seconds.observe(elapsed, method=request.method, route=route_path)
+            if route_path not in ("/health", "/metrics"):
+                telemetry.log("request", method=request.method, route=route_path, status=status,
+                              duration_ms=round(elapsed * 1000, 1), spans=telemetry.summarize_spans(spans))
+
+# --- Local storage fallback ---
+# Bounded on-disk store for documents written while Firestore is unavailable
+local_store = local_store_service.LocalDocumentStore()
+# Buffered local documents copied to Firestore per replay pass
+REPLAY_BATCH_SIZE = 50
+# In-progress stream uploads are left local until they finish or go stale
+REPLAY_PROCESSING_GRACE_SECONDS = 3600
+
+# Per-user search index over analyzed clauses (/api/search, /api/analytics)
+clause_search = clause_index.ClauseIndex()
+# Local Green/Red pre-classifier trained on the model's labels in that index
+clause_triage = risk_triage.RiskTriage(clause_search.labelled_clauses)
+
+# Fire-and-forget work (detached pipelines, indexing); hold references so tasks aren't collected
+background_tasks: set[asyncio.Task] = set()
 
-# --- In-memory storage fallback ---
-memory_db = {}
+def run_in_background(coro) -> asyncio.Task:
+    """Schedules a coroutine that outlives the current request."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
 
 # --- Helper Functions ---
 def create_fallback_analysis(reason: str) -> dict:
@@ -100,336 +218,1275 @@ def create_fallback_analysis(reason: str) -> dict:
         "emoji_summary": "⚠️"
     }
 
-async def analyze_chunk(chunk: list[str], max_retries: int = 2) -> list[dict]:
-    """Asynchronously analyzes a single chunk of clauses with retry logic."""
-    
-    formatted_clauses = "\n".join([f"{i+1}. {clause[:500]}" for i, clause in enumerate(chunk)])
-    prompt = f"""
+def build_chunk_prompt(chunk: list[str]) -> str:
+    formatted_clauses = "\n".join([f"{i+1}. {clause}" for i, clause in enumerate(chunk)])
+    return f"""
     Analyze EACH of the following {len(chunk)} legal clauses.
     **Clauses:**
     ---
     {formatted_clauses}
     ---
-    **CRITICAL:** Return a JSON array with EXACTLY {len(chunk)} objects.
-    Each object must have "risk_level" (Red/Orange/Green/Gray), "plain_english" (string), and "emoji_summary" (string).
+    **CRITICAL:** Return a JSON array with EXACTLY {len(chunk)} objects, one per clause.
+    Each object must have "index" (the clause number above), "risk_level" (Red/Orange/Green/Gray), "plain_english" (string), and "emoji_summary" (string).
     """
 
+analyze_chunk_seconds = telemetry.registry.histogram(
+    "analyze_chunk_seconds", "Wall time of analyze_chunk, re-asks included."
+)
+analyze_chunk_attempts = telemetry.registry.counter(
+    "analyze_chunk_attempts_total", "analyze_chunk model attempts by outcome.", ("outcome",)
+)
+analyze_chunk_retries = telemetry.registry.counter(
+    "analyze_chunk_retries_total", "analyze_chunk re-asks after a partial or failed reply."
+)
+clause_fallbacks = telemetry.registry.counter(
+    "clause_fallbacks_total", "Clauses stored with a Gray fallback analysis."
+)
+
+async def analyze_chunk(chunk: list[str], max_retries: int = 2) -> list[dict]:
+    """Asynchronously analyzes a single chunk of clauses, re-asking only for clauses missing from a reply."""
+    results: dict[int, dict] = {}
+    missing = list(range(len(chunk)))
+    started = time.perf_counter()
+
     for attempt in range(max_retries):
+        if attempt:
+            analyze_chunk_retries.inc()
+        asked = missing
         try:
-            response = await gemini_service.model.generate_content_async(prompt)
-            cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-            analysis_list = json.loads(cleaned_response)
+            # Rate limiting and 429 backoff are handled by the shared scheduler
+            response = await gemini_service.generate(
+                build_chunk_prompt([chunk[i] for i in asked]),
+                priority=gemini_service.PRIORITY_BULK,
+                **structured_output.clause_generation_config()
+            )
+            # Keep every valid object, even if others in the reply are malformed or absent
+            salvaged = structured_output.salvage_analyses(response.text, len(asked))
+            for position, analysis in salvaged.items():
+                results[asked[position]] = analysis
+            missing = [i for i in asked if i not in results]
 
-            if isinstance(analysis_list, list) and len(analysis_list) == len(chunk):
-                return analysis_list
-            else:
-                print(f"⚠️  Length mismatch in chunk. Got {len(analysis_list)}, expected {len(chunk)}. Retrying...")
-                await asyncio.sleep(1 + attempt)
-        
+            if not missing:
+                clause_batcher.record_attempt(gemini_service.MODEL_NAME, len(asked), "ok")
+                analyze_chunk_attempts.inc(outcome="ok")
+                break
+            clause_batcher.record_attempt(gemini_service.MODEL_NAME, len(asked), "mismatch")
+            analyze_chunk_attempts.inc(outcome="mismatch")
+            telemetry.log(f"⚠️  Partial reply for chunk. Got {len(salvaged)}/{len(asked)}; re-asking for {len(missing)}...", level="warning")
+
+        except gemini_service.GeminiUnavailableError as e:
+            analyze_chunk_attempts.inc(outcome="unavailable")
+            telemetry.log(f"⛔ {e}; skipping chunk.", level="warning")
+            break
         except Exception as e:
-            error_str = str(e)
-            print(f"❌ Attempt {attempt + 1}/{max_retries} failed for chunk: {error_str[:100]}...")
-            if "429" in error_str or "quota" in error_str:
-                await asyncio.sleep(5 + (2 ** attempt))
-            else:
-                await asyncio.sleep(1 + attempt)
-    
-    print(f"❌ Chunk analysis failed after {max_retries} retries.")
-    return [create_fallback_analysis("AI processing error") for _ in chunk]
+            clause_batcher.record_attempt(gemini_service.MODEL_NAME, len(asked), "error")
+            analyze_chunk_attempts.inc(outcome="error")
+            telemetry.log(f"❌ Attempt {attempt + 1}/{max_retries} failed for chunk: {str(e)[:100]}...", level="error")
+
+    analyze_chunk_seconds.observe(time.perf_counter() - started)
+    if missing:
+        clause_fallbacks.inc(len(missing))
+        telemetry.log(f"❌ {len(missing)}/{len(chunk)} clauses unanalyzed after {max_retries} attempts.", level="error")
+    return [results.get(i) or create_fallback_analysis("AI processing error") for i in range(len(chunk))]
 
 # --- Storage Helper Functions ---
-def save_document_to_firestore(document_data: dict) -> str | None:
-    """Save document to Firestore and return document ID."""
+# Firestore layout: documents/{id} holds slim listing metadata plus a textRef;
+# clause analyses live in documents/{id}/analysis/part_NNNNN (chunked to stay
+# well under the 1 MiB document limit) and the timeline in .../analysis/timeline.
+# Raw text is compressed into the content-addressed text store.
+ANALYSIS_ITEMS_PER_PART = 200
+# Fields that never go into the metadata record
+BULK_FIELDS = ('fullText', 'fullAnalysis', 'timeline')
+# Legacy inline-text fallback when the text store is unreachable
+INLINE_TEXT_LIMIT = 500_000
+
+def analysis_parts(full_analysis: list[dict]) -> list[list[dict]]:
+    return [
+        full_analysis[i:i + ANALYSIS_ITEMS_PER_PART]
+        for i in range(0, len(full_analysis), ANALYSIS_ITEMS_PER_PART)
+    ]
+
+async def store_document_text(full_text: str) -> dict:
+    """Moves raw text to the text store; returns the metadata fields that reference it."""
+    try:
+        with telemetry.span("text_store.put"):
+            return {"textRef": await text_store.put(full_text)}
+    except Exception as e:
+        telemetry.log(f"⚠️ Text store write failed: {e}", level="warning")
+        return {"fullText": full_text} if len(full_text) < INLINE_TEXT_LIMIT else {}
+
+def write_bulk_fields(batch, doc_ref, fields: dict, existing_parts: int = 0) -> dict:
+    """Adds analysis/timeline writes to a batch; returns metadata fields describing them."""
+    metadata = {}
+    if 'fullAnalysis' in fields:
+        parts = analysis_parts(fields['fullAnalysis'])
+        for n, items in enumerate(parts):
+            batch.set(doc_ref.collection('analysis').document(f"part_{n:05d}"), {"index": n, "items": items})
+        for n in range(len(parts), existing_parts):
+            batch.delete(doc_ref.collection('analysis').document(f"part_{n:05d}"))
+        metadata['analysisParts'] = len(parts)
+    if 'timeline' in fields:
+        batch.set(doc_ref.collection('analysis').document('timeline'), {"events": fields['timeline']})
+        metadata['timelineEvents'] = len(fields['timeline'])
+    return metadata
+
+async def save_document_to_firestore(document_data: dict, doc_id: str | None = None) -> str | None:
+    """Save document to Firestore (under ``doc_id`` if given) and return document ID."""
     try:
-        if firestore_db:
-            doc_ref = firestore_db.collection('documents').add(document_data)
-            doc_id = doc_ref[1].id
-            print(f"✅ Document {doc_id} saved to Firestore")
+        db = await firestore_client()
+        if db:
+            metadata = {k: v for k, v in document_data.items() if k not in BULK_FIELDS}
+            if 'fullText' in document_data:
+                metadata.update(await store_document_text(document_data['fullText']))
+
+            doc_ref = db.collection('documents').document(doc_id)
+            batch = db.batch()
+            metadata.update(write_bulk_fields(batch, doc_ref, document_data))
+            batch.set(doc_ref, metadata)
+            with telemetry.span("firestore.save"):
+                await run_blocking(batch.commit)
+            doc_id = doc_ref.id
+            telemetry.log(f"✅ Document {doc_id} saved to Firestore")
             return doc_id
         return None
     except Exception as e:
         error_msg = str(e)
         if "SERVICE_DISABLED" in error_msg:
-            print("⚠️ Firestore API not enabled - using memory storage")
+            telemetry.log("⚠️ Firestore API not enabled - using local storage", level="warning")
         else:
-            print(f"⚠️ Failed to save to Firestore: {e}")
+            telemetry.log(f"⚠️ Failed to save to Firestore: {e}", level="warning")
         return None
 
-def get_documents_from_firestore(user_id: str) -> list:
-    """Get user documents from Firestore."""
+async def get_documents_from_firestore(user_id: str, limit: int,
+                                      cursor: str | None = None) -> tuple[list, str | None] | None:
+    """Get one newest-first page of a user's listing fields from Firestore; None when it is unavailable."""
     try:
-        if firestore_db:
-            # Modern syntax using FieldFilter
-            docs_ref = (firestore_db.collection('documents')
-                       .where(filter=FieldFilter('userId', '==', user_id))
-                       .stream())
-            
-            documents = []
-            for doc in docs_ref:
-                doc_data = doc.to_dict()
-                doc_data['id'] = doc.id
-                documents.append(doc_data)
-            
-            # Reverse to get newest first
-            documents.reverse()
-            return documents
+        db = await firestore_client()
+        if db:
+            with telemetry.span("firestore.list"):
+                return await run_blocking(document_listing.query_firestore_page, db, user_id, limit, cursor)
+    except document_listing.InvalidCursorError:
+        raise
     except Exception as e:
         error_msg = str(e)
         if "SERVICE_DISABLED" in error_msg:
-            print("⚠️ Firestore API not enabled")
+            telemetry.log("⚠️ Firestore API not enabled", level="warning")
+        else:
+            telemetry.log(f"⚠️ Failed to fetch from Firestore: {e}", level="warning")
+    return None
+
+async def list_documents(user_id: str, limit: int, cursor: str | None = None) -> tuple[list, str | None] | None:
+    """One listing page from Firestore, or from the local store while Firestore is unavailable.
+
+    Cursors name the store that issued them, so a walk never switches stores
+    mid-way; None when the store a cursor belongs to has become unavailable.
+    """
+    if cursor is None or document_listing.cursor_source(cursor) == document_listing.FIRESTORE:
+        page = await get_documents_from_firestore(user_id, limit, cursor)
+        if page is not None or cursor is not None:
+            return page
+    return await run_blocking(local_store.page, user_id, limit, cursor)
+
+def read_analysis_parts(doc_ref) -> tuple[list[dict], list[dict] | None]:
+    """Reads and reassembles the analysis subcollection (blocking)."""
+    parts, timeline = [], None
+    for snapshot in doc_ref.collection('analysis').stream():
+        data = snapshot.to_dict()
+        if snapshot.id == 'timeline':
+            timeline = data.get('events', [])
         else:
-            print(f"⚠️ Failed to fetch from Firestore: {e}")
-    return []
+            parts.append((data.get('index', 0), data.get('items', [])))
+    parts.sort(key=lambda part: part[0])
+    return [item for _, items in parts for item in items], timeline
 
-def get_document_from_firestore(doc_id: str) -> dict | None:
-    """Get document from Firestore."""
+async def get_document_from_firestore(doc_id: str) -> dict | None:
+    """Get document metadata plus its analysis from Firestore (raw text is loaded separately)."""
     try:
-        if firestore_db:
-            doc_ref = firestore_db.collection('documents').document(doc_id)
-            doc = doc_ref.get()
+        db = await firestore_client()
+        if db:
+            doc_ref = db.collection('documents').document(doc_id)
+            with telemetry.span("firestore.get"):
+                doc = await run_blocking(doc_ref.get)
             if doc.exists:
-                return doc.to_dict()
+                document_data = doc.to_dict()
+                # Legacy documents carry fullAnalysis/timeline inline
+                if 'analysisParts' in document_data or 'timelineEvents' in document_data:
+                    with telemetry.span("firestore.get_analysis"):
+                        full_analysis, timeline = await run_blocking(read_analysis_parts, doc_ref)
+                    document_data['fullAnalysis'] = full_analysis
+                    if timeline is not None:
+                        document_data['timeline'] = timeline
+                return document_data
     except Exception as e:
-        print(f"⚠️ Failed to retrieve from Firestore: {e}")
+        telemetry.log(f"⚠️ Failed to retrieve from Firestore: {e}", level="warning")
     return None
 
-def upload_to_blob(file_name: str, contents: bytes) -> str | None:
+async def update_document_in_firestore(doc_id: str, updates: dict) -> bool:
+    """Apply a partial update to a Firestore document."""
+    try:
+        db = await firestore_client()
+        if db:
+            doc_ref = db.collection('documents').document(doc_id)
+            metadata = {k: v for k, v in updates.items() if k not in BULK_FIELDS}
+            if 'fullText' in updates:
+                metadata.update(await store_document_text(updates['fullText']))
+
+            existing_parts = 0
+            if 'fullAnalysis' in updates:
+                snapshot = await run_blocking(doc_ref.get, field_paths=['analysisParts'])
+                existing_parts = (snapshot.to_dict() or {}).get('analysisParts', 0) if snapshot.exists else 0
+
+            batch = db.batch()
+            metadata.update(write_bulk_fields(batch, doc_ref, updates, existing_parts))
+            if metadata:
+                batch.update(doc_ref, metadata)
+            with telemetry.span("firestore.update"):
+                await run_blocking(batch.commit)
+            return True
+    except Exception as e:
+        telemetry.log(f"⚠️ Failed to update Firestore document {doc_id}: {e}", level="warning")
+    return False
+
+async def get_document_text(document_data: dict) -> str:
+    """Loads a document's raw text, from the text store or legacy inline storage."""
+    if document_data.get('fullText'):
+        return document_data['fullText']
+    text_ref = document_data.get('textRef')
+    if not text_ref:
+        return ""
+
+    async def load_text():
+        try:
+            with telemetry.span("text_store.get"):
+                return await text_store.get(text_ref)
+        except Exception as e:
+            telemetry.log(f"⚠️ Text store read failed: {e}", level="warning")
+            return None
+
+    # Text refs are content-addressed, so cached text never goes stale
+    return await documents_cache.get(f"text:{text_ref['key']}", load_text) or ""
+
+async def load_document(doc_id: str) -> dict | None:
+    """Reads a document from local storage or, through the document cache, Firestore."""
+    if local_store.owns(doc_id):
+        document_data = await run_blocking(local_store.get, doc_id)
+        if document_data:
+            return document_data
+    return await documents_cache.get(f"doc:{doc_id}", lambda: get_document_from_firestore(doc_id))
+
+async def upload_to_blob(file_name: str, contents: bytes) -> str | None:
     """Upload file to Vercel Blob with proper error handling."""
     if not VERCEL_BLOB_AVAILABLE:
-        print("⚠️ Vercel Blob not available")
+        telemetry.log("⚠️ Vercel Blob not available", level="warning")
         return None
     
     try:
+        from vercel_blob import put
+
         # Upload with automatic random suffix handling
-        blob_result = put(file_name, contents) # type: ignore
+        blob_result = await run_blocking(put, file_name, contents)
         blob_url = blob_result['url']
-        print(f"✅ File uploaded to blob: {blob_url}")
+        telemetry.log(f"✅ File uploaded to blob: {blob_url}")
         return blob_url
     except Exception as e:
-        print(f"⚠️ Vercel Blob upload failed: {e}")
+        telemetry.log(f"⚠️ Vercel Blob upload failed: {e}", level="warning")
         return None
 
 # --- Endpoint to fetch document history ---
 @app.get("/api/documents")
-async def get_documents(userId: str = Query(..., description="User ID to fetch documents for")):
+async def get_documents(
+    response: Response,
+    userId: str = Query(..., description="User ID to fetch documents for"),
+    limit: int = Query(document_listing.DEFAULT_PAGE_SIZE, ge=1, le=document_listing.MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="Opaque cursor from a previous page's X-Next-Cursor header"),
+):
     try:
-        # Try Firestore first
-        documents = get_documents_from_firestore(userId)
-        
-        # If Firestore fails, return memory documents for this user
-        if not documents:
-            documents = [
-                {**doc_data, 'id': doc_id} 
-                for doc_id, doc_data in memory_db.items() 
-                if doc_data.get('userId') == userId
-            ]
-            # Sort by creation date
-            documents.sort(key=lambda x: x.get('createdAt', ''), reverse=True)
-        
+        page = await list_documents(userId, limit, cursor)
+        if page is None:
+            # Firestore went away mid-listing; its cursor means nothing to the local store
+            return []
+        documents, next_cursor = page
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return documents  # Return array directly to match frontend expectations
+    except document_listing.InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
     except Exception as e:
-        print(f"❌ Error in get_documents endpoint: {e}")
+        telemetry.log(f"❌ Error in get_documents endpoint: {e}", level="error")
         # Return empty list instead of error for better UX
         return []
 
 # --- Endpoint to fetch a single document's full analysis ---
 @app.get("/api/document/{doc_id}")
 async def get_document_details(doc_id: str):
-    # Try Firestore first
-    document_data = get_document_from_firestore(doc_id)
-    
-    # Fallback to memory if Firestore fails
-    if not document_data and doc_id in memory_db:
-        document_data = memory_db[doc_id]
-    
+    document_data = await load_document(doc_id)
     if not document_data:
         raise HTTPException(status_code=404, detail="Document not found.")
     
     return document_data
 
+# --- Upload pipeline helpers ---
+async def extract_document(contents: bytes, content_type: str | None) -> document_ai_service.ExtractedDocument:
+    """Extracts pages and layout blocks from an uploaded PDF or text file."""
+    try:
+        return await document_ai_service.extract_document(contents, content_type)
+    except document_ai_service.UnsupportedDocumentError:
+        raise HTTPException(status_code=415, detail="Unsupported file type.")
+
+def extract_clauses(document: document_ai_service.ExtractedDocument) -> list[clause_segmenter.Clause]:
+    """Segments the document into clauses, rebuilding paragraphs across line wraps."""
+    return clause_segmenter.segment_document(document)
+
+def build_risk_counts(analysis_results: list[dict]) -> dict:
+    """Counts clauses per risk level."""
+    return {
+        "red": sum(1 for r in analysis_results if r.get('risk_level') == 'Red'),
+        "orange": sum(1 for r in analysis_results if r.get('risk_level') == 'Orange'),
+        "green": sum(1 for r in analysis_results if r.get('risk_level') == 'Green'),
+        "total": len(analysis_results)
+    }
+
+async def generate_brief_summary(full_text: str, file_name: str) -> str:
+    """Generates a one-sentence summary of the document."""
+    try:
+        summary_prompt = f"Summarize the following legal document's purpose in one friendly sentence: {full_text[:2000]}"
+        response = await gemini_service.generate(summary_prompt, priority=gemini_service.PRIORITY_INTERACTIVE)
+        return response.text.strip()
+    except Exception as e:
+        telemetry.log(f"⚠️ Summary generation failed: {e}", level="warning")
+        return f"Legal document analysis for {file_name}"
+
+def build_summary_batch_prompt(items: list[tuple[str, str]]) -> str:
+    """One prompt that summarizes several documents (full_text, file_name)."""
+    sections = "\n\n".join(
+        f"Document {n} ({file_name}):\n---\n{full_text[:batch_upload.SUMMARY_CHARS]}\n---"
+        for n, (full_text, file_name) in enumerate(items, 1)
+    )
+    return f"""
+    Summarize each legal document below in one friendly sentence describing its purpose.
+    Return a JSON array with EXACTLY {len(items)} objects, one per document, each with
+    an "index" (the document number) and a "summary" string.
+
+    {sections}
+    """
+
+async def generate_brief_summaries(items: list[tuple[str, str]]) -> list[str]:
+    """generate_brief_summary for many documents, several per model call."""
+    summaries: list[str | None] = [None] * len(items)
+
+    async def summarize_group(group: range):
+        try:
+            batch_upload.metrics["summary_calls"] += 1
+            response = await gemini_service.generate(
+                build_summary_batch_prompt([items[i] for i in group]), priority=gemini_service.PRIORITY_BULK
+            )
+            for value in structured_output.iter_json_objects(response.text):
+                index, summary = value.get("index"), value.get("summary")
+                if isinstance(index, int) and 1 <= index <= len(group) and isinstance(summary, str) and summary.strip():
+                    summaries[group[index - 1]] = summary.strip()
+        except Exception as e:
+            telemetry.log(f"⚠️ Batched summary failed: {e}", level="warning")
+
+    await asyncio.gather(*[summarize_group(group) for group in batch_upload.summary_groups(len(items))])
+    # Anything the batched reply missed gets its own call
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    for i, summary in zip(missing, await asyncio.gather(*[generate_brief_summary(*items[i]) for i in missing])):
+        summaries[i] = summary
+    return summaries
+
+async def iter_clause_analyses(clauses: list[str], carried: dict[int, dict] | None = None):
+    """Yields (indices, analyses) batches as carried-over results, cache hits and model chunks complete."""
+    # Unchanged clauses of a new document version keep their parent's analysis
+    carried = carried or {}
+    if carried:
+        carried_indices = sorted(carried)
+        yield carried_indices, [dict(carried[i]) for i in carried_indices]
+    remaining = [i for i in range(len(clauses)) if i not in carried]
+
+    # Reuse cached analyses for clauses we've already seen (template boilerplate)
+    with telemetry.span("clause_cache.get_many"):
+        cached = await get_clause_cache().get_many([clauses[i] for i in remaining])
+    cached_results = {remaining[j]: analysis for j, analysis in cached.items()}
+    if cached_results:
+        hit_indices = sorted(cached_results)
+        yield hit_indices, [cached_results[i] for i in hit_indices]
+
+    # Only unique cache misses go to the model
+    miss_indices: dict[str, list[int]] = {}
+    for i in remaining:
+        if i not in cached_results:
+            miss_indices.setdefault(clauses[i], []).append(i)
+    clauses_to_send = list(miss_indices)
+
+    # Clauses the local classifier is confident about skip the model
+    with telemetry.span("risk_triage.classify"):
+        triaged = await clause_triage.classify(clauses_to_send)
+    if triaged:
+        indices, analyses = [], []
+        for j, analysis in triaged.items():
+            for i in miss_indices[clauses_to_send[j]]:
+                indices.append(i)
+                analyses.append(dict(analysis))
+        yield indices, analyses
+        clauses_to_send = [clause for j, clause in enumerate(clauses_to_send) if j not in triaged]
+    telemetry.log(f"🗃️ Clause cache: {len(cached_results)} hits, {len(triaged)} triaged locally, "
+                  f"{len(clauses_to_send)} unique misses for the model.")
+
+    # Pack clauses into token-budgeted requests; oversized clauses are split, not clipped
+    batches = clause_batcher.plan(clauses_to_send, gemini_service.MODEL_NAME)
+    telemetry.log(f"📦 Packed {len(clauses_to_send)} clauses into {len(batches)} token-budgeted batches.")
+
+    # Concurrency and rate limits are enforced process-wide by gemini_service.scheduler
+    async def process_batch(batch):
+        texts = [
+            f"[Part {s.part_index + 1}/{s.part_count}] {s.text}" if s.part_count > 1 else s.text
+            for s in batch
+        ]
+        return batch, await analyze_chunk(texts)
+
+    # Parts of a split clause may land in different batches; merge once all arrive
+    pending_parts: dict[int, dict[int, dict]] = {}
+
+    tasks = [asyncio.create_task(process_batch(batch)) for batch in batches]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            batch, batch_results = await next_done
+            clause_batcher.record_fallbacks(sum(1 for r in batch_results if r.get('risk_level') == 'Gray'))
+
+            completed = []
+            for segment, analysis in zip(batch, batch_results):
+                parts = pending_parts.setdefault(segment.clause_index, {})
+                parts[segment.part_index] = analysis
+                if len(parts) == segment.part_count:
+                    merged = batch_planner.merge_part_analyses([parts[n] for n in range(segment.part_count)])
+                    completed.append((clauses_to_send[segment.clause_index], merged))
+                    del pending_parts[segment.clause_index]
+
+            # Remember fresh results for future uploads
+            with telemetry.span("clause_cache.put_many"):
+                await get_clause_cache().put_many(completed)
+
+            indices, analyses = [], []
+            for clause_text, analysis in completed:
+                for i in miss_indices[clause_text]:
+                    indices.append(i)
+                    analyses.append(dict(analysis))
+            if indices:
+                yield indices, analyses
+    finally:
+        # Stop outstanding model calls if the consumer went away early
+        for task in tasks:
+            task.cancel()
+
+def clause_fields(clause: clause_segmenter.Clause) -> dict:
+    """Clause identity stored alongside each analysis."""
+    return {"original_text": clause.text, "clause_id": clause.id, "page": clause.page + 1}
+
+def assemble_analysis(clauses: list[clause_segmenter.Clause], results: dict[int, dict]) -> list[dict]:
+    """Combines per-index analyses with their original clauses."""
+    analysis_results = []
+    for i, clause in enumerate(clauses):
+        analysis = results.get(i) or create_fallback_analysis("Processing incomplete")
+        analysis.update(clause_fields(clause))
+        analysis_results.append(analysis)
+    return analysis_results
+
+TIMELINE_FAILED_SUMMARY = "Timeline generation failed"
+
+async def generate_timeline_data(full_text: str) -> dict:
+    """Builds the timeline fields stored on a timeline document."""
+    try:
+        timeline = await timeline_service.build_timeline(full_text, get_timeline_cache())
+        if timeline.partial:
+            telemetry.log(f"⚠️ Timeline is partial: {timeline.failed_windows} of {timeline.windows} windows failed",
+                          level="warning")
+        return {
+            "timeline": timeline.events,
+            "summary": f"Generated a timeline with {len(timeline.events)} key events.",
+            "riskCounts": {"red": 0, "orange": 0},  # Timelines don't have risk counts
+            "timelineFailedWindows": timeline.failed_windows
+        }
+    except Exception as e:
+        telemetry.log(f"⚠️ Timeline generation failed: {e}", level="warning")
+        return {
+            "timeline": [],
+            "summary": TIMELINE_FAILED_SUMMARY,
+            "riskCounts": {"red": 0, "orange": 0}
+        }
+
+async def save_document(document_data: dict) -> str:
+    """Saves a document to Firestore, falling back to the local store."""
+    doc_id = await save_document_to_firestore(document_data)
+    if not doc_id:
+        doc_id = local_store.new_id()
+        with telemetry.span("local_store.put"):
+            await run_blocking(local_store.put, doc_id, document_data)
+        telemetry.log(f"✅ Document {doc_id} saved to local store (fallback)")
+    elif local_store.stats()["pending"]:
+        # Firestore is reachable again; copy over what was buffered during the outage
+        schedule_replay()
+    if document_data.get('status', 'complete') == 'complete':
+        run_in_background(index_clauses(doc_id, document_data))
+    return doc_id
+
+async def update_document(doc_id: str, updates: dict):
+    """Applies a partial update to a stored document."""
+    if local_store.owns(doc_id) and await run_blocking(local_store.update, doc_id, updates):
+        return
+    documents_cache.invalidate(f"doc:{doc_id}")
+    chat_contexts.invalidate(doc_id)
+    await update_document_in_firestore(doc_id, updates)
+    # Drop anything read while the write was in flight
+    documents_cache.invalidate(f"doc:{doc_id}")
+    chat_contexts.invalidate(doc_id)
+
+replay_task: asyncio.Task | None = None
+
+async def replay_local_documents():
+    """Copies locally buffered documents into Firestore under the same ids."""
+    replayed = 0
+    for doc_id, version, updated_at, document_data in await run_blocking(local_store.pending, REPLAY_BATCH_SIZE):
+        if (document_data.get('status') == 'processing'
+                and time.time() - updated_at < REPLAY_PROCESSING_GRACE_SECONDS):
+            continue
+        if not await save_document_to_firestore(document_data, doc_id):
+            break  # Firestore is failing again; retry on a later save
+        if await run_blocking(local_store.mark_replayed, doc_id, version):
+            replayed += 1
+    if replayed:
+        telemetry.log(f"🔁 Replayed {replayed} locally stored documents to Firestore")
+
+def schedule_replay():
+    global replay_task
+    if get_firestore_db() and (replay_task is None or replay_task.done()):
+        replay_task = run_in_background(replay_local_documents())
+
+async def load_parent_document(parent_id: str, user_id: str, analysis_type: str) -> dict:
+    """Loads and checks the previous version a new upload revises."""
+    parent = await load_document(parent_id)
+    if not parent or parent.get('userId') != user_id:
+        raise HTTPException(status_code=404, detail="Parent document not found.")
+    if parent.get('analysisType') != analysis_type:
+        raise HTTPException(status_code=400, detail="Parent document has a different analysis type.")
+    return parent
+
+def version_fields(parent_id: str, parent: dict) -> dict:
+    """Lineage fields stored on a new version of a document."""
+    return {
+        "parentId": parent_id,
+        "rootId": parent.get('rootId') or parent_id,
+        "version": parent.get('version', 1) + 1
+    }
+
+async def index_clauses(doc_id: str, document_data: dict):
+    """Adds (or replaces) a document's clauses in the search index."""
+    try:
+        with telemetry.span("clause_index.put"):
+            await run_blocking(clause_search.index_document, doc_id, document_data)
+    except Exception as e:
+        # Search misses this document until it is saved again
+        telemetry.log(f"⚠️ Clause indexing failed for {doc_id}: {e}", level="warning")
+
+async def index_for_chat(doc_id: str, full_text: str):
+    """Builds the retrieval index used by /api/chat."""
+    try:
+        chunk_count = await vector_index.index_document(doc_id, full_text)
+        telemetry.log(f"🧭 Indexed {chunk_count} chunks of {doc_id} for chat retrieval")
+    except Exception as e:
+        # Chat builds the index lazily if this fails
+        telemetry.log(f"⚠️ Chat indexing failed for {doc_id}: {e}", level="warning")
+
+# --- Upload deduplication ---
+# Prompt version each analysis type's results depend on
+UPLOAD_PROMPT_VERSIONS = {"risk": CLAUSE_PROMPT_VERSION, "timeline": timeline_service.TIMELINE_PROMPT_VERSION}
+# Lineage fields a shared-scope copy does not inherit
+LINEAGE_FIELDS = ('parentId', 'rootId', 'version', 'versionDiff')
+
+upload_coalescer = upload_dedup.InFlightUploads()
+
+@functools.cache
+def get_upload_index() -> upload_dedup.UploadIndex:
+    """(content hash, analysis type, prompt version) -> document that already holds the analysis."""
+    return analysis_cache.create_clause_cache(
+        get_firestore_db(), prompt_version=upload_dedup.INDEX_VERSION,
+        model_name=gemini_service.MODEL_NAME, cache_class=upload_dedup.UploadIndex
+    )
+
+def is_reusable_upload(document_data: dict) -> bool:
+    """Only fully analyzed documents are handed out again; fallbacks deserve a fresh attempt."""
+    if document_data.get('analysisType') == 'risk':
+        analysis = document_data.get('fullAnalysis') or []
+        return bool(analysis) and all(item.get('risk_level') in ('Red', 'Orange', 'Green') for item in analysis)
+    # A timeline missing any window would hand out the gap to every later uploader
+    return document_data.get('summary') != TIMELINE_FAILED_SUMMARY and not document_data.get('timelineFailedWindows')
+
+async def record_upload(index_text: str, doc_id: str, user_id: str):
+    await get_upload_index().put_many([(index_text, {"documentId": doc_id, "userId": user_id})])
+    upload_dedup.metrics["recorded"] += 1
+
+async def adopt_document(source_id: str, source: dict, user_id: str, file_name: str) -> dict:
+    """Copies another user's analysis of identical content into this user's history."""
+    document_data = {k: v for k, v in source.items() if k not in LINEAGE_FIELDS}
+    document_data.update({
+        "userId": user_id,
+        "fileName": file_name,
+        "createdAt": datetime.now(timezone.utc),
+        "duplicateOf": source_id
+    })
+    doc_id = await save_document(document_data)
+    return {"document_id": doc_id, "data": document_data, "deduplicated": True}
+
+async def find_duplicate_upload(index_text: str, user_id: str, file_name: str) -> dict | None:
+    """Response for an upload whose content was already analyzed, or None."""
+    upload_dedup.metrics["lookups"] += 1
+    with telemetry.span("upload.dedup_lookup"):
+        entry = (await get_upload_index().get_many([index_text])).get(0)
+    if entry is None:
+        return None
+    document_data = await load_document(entry["documentId"])
+    if (not document_data or document_data.get('status', 'complete') != 'complete'
+            or not is_reusable_upload(document_data)):
+        # Deleted, never finished or only partly analyzed; analyze again and overwrite the entry
+        upload_dedup.metrics["stale"] += 1
+        return None
+    upload_dedup.metrics["hits"] += 1
+    telemetry.log(f"♻️ Duplicate upload of {entry['documentId']}; skipping analysis.")
+    if document_data.get('userId') != user_id:
+        return await adopt_document(entry["documentId"], document_data, user_id, file_name)
+    return {"document_id": entry["documentId"], "data": document_data, "deduplicated": True}
+
 # --- Enhanced Upload endpoint with analysisType support ---
 @app.post("/api/upload")
 async def upload_and_analyze_document(
     userId: str = Query(...), 
     analysisType: str = Query(...), 
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    background: bool = Query(False, description="Queue the analysis and return a job id immediately"),
+    parentId: str | None = Query(None, description="Previous version of this document; unchanged clauses are carried over")
 ):
     if not userId or not analysisType:
         raise HTTPException(status_code=400, detail="User ID and Analysis Type are required.")
-        
-    try:
-        contents = await file.read()
-        file_name = file.filename or "uploaded_document.pdf"
 
-        print(f"📤 Uploading {file_name} to Vercel Blob...")
-        # 1. Upload file to Vercel Blob (with proper error handling)
-        blob_url = upload_to_blob(file_name, contents)
-
-        # 2. Extract text from document
-        full_text = ""
-        if file.content_type == 'application/pdf':
-            with fitz.open(stream=contents, filetype="pdf") as doc:
-                full_text = "".join(page.get_text() for page in doc) # type: ignore
-        elif file.content_type == 'text/plain':
-            full_text = contents.decode('utf-8')
-        else:
-            raise HTTPException(status_code=415, detail="Unsupported file type.")
+    if background:
+        return await enqueue_upload_job(userId, analysisType, file, parentId)
+
+    contents, content_hash = await upload_dedup.read_and_hash(file)
+    file_name = file.filename or "uploaded_document.pdf"
+    index_text = None
+    if not parentId:
+        # Revisions keep their own lineage, so only fresh uploads are deduplicated
+        index_text = upload_dedup.index_text(
+            content_hash, analysisType, UPLOAD_PROMPT_VERSIONS.get(analysisType, ""), userId
+        )
+    if index_text is None:
+        return await analyze_upload(userId, analysisType, file_name, file.content_type, contents, parentId)
 
-        # Base document data
+    duplicate = await find_duplicate_upload(index_text, userId, file_name)
+    if duplicate:
+        return duplicate
+    result = await upload_coalescer.run(index_text, lambda: analyze_upload(
+        userId, analysisType, file_name, file.content_type, contents, index_text=index_text
+    ))
+    if result["data"].get("userId") != userId:
+        # Shared scope: another user's identical upload finished while this one waited
+        return await adopt_document(result["document_id"], result["data"], userId, file_name)
+    return result
+
+async def analyze_upload(user_id: str, analysis_type: str, file_name: str, content_type: str | None,
+                         contents: bytes, parent_id: str | None = None, index_text: str | None = None) -> dict:
+    """Runs the full upload pipeline and returns the response body.
+
+    Stages run as a graph: the blob upload overlaps extraction, and the
+    summary (which only needs the leading text) overlaps clause analysis, so
+    the critical path is extraction plus the slowest model fan-out.
+    """
+    if analysis_type not in ('risk', 'timeline'):
+        raise HTTPException(status_code=400, detail="Invalid analysis type. Must be 'risk' or 'timeline'.")
+    try:
         document_data = {
-            "userId": userId,
+            "userId": user_id,
             "fileName": file_name,
-            "blobUrl": blob_url,
             "createdAt": datetime.now(timezone.utc),
-            "analysisType": analysisType,
-            "fullText": full_text
+            "analysisType": analysis_type
         }
+        telemetry.log(f"📤 Uploading {file_name} to Vercel Blob...")
+        graph = stage_graph.StageGraph("upload")
+        # A failed blob upload only leaves blobUrl empty, as before
+        graph.add("blob", lambda done: upload_to_blob(file_name, contents), default=None)
+        graph.add("extract", lambda done: extract_document(contents, content_type), critical=True)
+        if parent_id:
+            graph.add("parent", lambda done: load_parent_document(parent_id, user_id, analysis_type), critical=True)
 
-        # 3. Perform analysis based on the requested type
-        if analysisType == 'risk':
-            # Extract meaningful clauses
-            clauses_to_analyze = [
-                cleaned for clause in full_text.split('\n') 
-                if (cleaned := clause.strip()) and len(cleaned) > 25 and not cleaned.isdigit()
-            ]
+        if analysis_type == 'risk':
+            async def segment(done: dict) -> list[clause_segmenter.Clause]:
+                clauses = extract_clauses(done["extract"])
+                if not clauses:
+                    raise HTTPException(status_code=400, detail="No meaningful clauses found.")
+                telemetry.log(f"🔍 Found {len(clauses)} clauses to analyze.")
+                return clauses
 
-            if not clauses_to_analyze:
-                raise HTTPException(status_code=400, detail="No meaningful clauses found.")
-            
-            print(f"🔍 Found {len(clauses_to_analyze)} clauses to analyze.")
+            async def analyze_clauses(done: dict) -> dict:
+                clauses, parent = done["segment"], done.get("parent")
+                clauses_to_analyze = [clause.text for clause in clauses]
+                diff = versioning.diff_clauses(parent.get('fullAnalysis', []), clauses_to_analyze) if parent else None
+                if diff:
+                    telemetry.log(f"🧬 Version diff: {len(diff.carried)} clauses carried over from {parent_id}.")
+                results: dict[int, dict] = {}
+                async for indices, analyses in iter_clause_analyses(clauses_to_analyze, diff.carried if diff else None):
+                    results.update(zip(indices, analyses))
+                analysis_results = assemble_analysis(clauses, results)
+                fields = {"fullAnalysis": analysis_results, "riskCounts": build_risk_counts(analysis_results)}
+                if diff:
+                    fields["versionDiff"] = versioning.summarize_diff(diff, parent['fullAnalysis'], analysis_results)
+                return fields
 
-            # Perform analysis using async logic with chunking
-            chunk_size = 10
-            chunks = [clauses_to_analyze[i:i + chunk_size] for i in range(0, len(clauses_to_analyze), chunk_size)]
-            print(f"📦 Split into {len(chunks)} chunks of size ~{chunk_size}.")
+            graph.add("segment", segment, after=("extract",), critical=True)
+            graph.add("analyze_clauses", analyze_clauses,
+                      after=("segment", "parent") if parent_id else ("segment",), critical=True)
+            # Only needs the leading text, so it runs alongside clause analysis
+            graph.add("summary", lambda done: generate_brief_summary(done["extract"].text, file_name),
+                      after=("extract",), default=f"Legal document analysis for {file_name}")
+            analysis_stages = ("analyze_clauses", "summary")
+        else:
+            graph.add("timeline", lambda done: generate_timeline_data(done["extract"].text),
+                      after=("extract",), critical=True)
+            analysis_stages = ("timeline",)
 
-            # Use semaphore to limit concurrent requests
-            semaphore = asyncio.Semaphore(12)
-            
-            async def process_with_semaphore(chunk):
-                async with semaphore:
-                    await asyncio.sleep(1)  # Rate limiting
-                    return await analyze_chunk(chunk)
-
-            tasks = [process_with_semaphore(chunk) for chunk in chunks]
-            chunk_results_list = await asyncio.gather(*tasks)
-
-            # Flatten results
-            all_results = [item for sublist in chunk_results_list for item in sublist]
-
-            # Combine results with original text
-            analysis_results = []
-            for i, clause_text in enumerate(clauses_to_analyze):
-                analysis = all_results[i] if i < len(all_results) else create_fallback_analysis("Processing incomplete")
-                analysis['original_text'] = clause_text
-                analysis_results.append(analysis)
-
-            # Calculate risk counts
-            red_count = sum(1 for r in analysis_results if r.get('risk_level') == 'Red')
-            orange_count = sum(1 for r in analysis_results if r.get('risk_level') == 'Orange')
-            green_count = sum(1 for r in analysis_results if r.get('risk_level') == 'Green')
-            
-            # Generate a brief summary using Gemini
-            try:
-                summary_prompt = f"Summarize the following legal document's purpose in one friendly sentence: {full_text[:2000]}"
-                response = await gemini_service.model.generate_content_async(summary_prompt)
-                brief_summary = response.text.strip()
-            except Exception as e:
-                print(f"⚠️ Summary generation failed: {e}")
-                brief_summary = f"Legal document analysis for {file_name}"
+        async def save(done: dict) -> str:
+            document_data.update({"blobUrl": done["blob"], "fullText": done["extract"].text})
+            if parent_id:
+                document_data.update(version_fields(parent_id, done["parent"]))
+            if analysis_type == 'risk':
+                document_data.update({"summary": done["summary"], **done["analyze_clauses"]})
+            else:
+                document_data.update(done["timeline"])
+            telemetry.log(f"💾 Saving metadata to Firestore for user {user_id}...")
+            return await save_document(document_data)
 
-            document_data.update({
-                "fullAnalysis": analysis_results,
-                "summary": brief_summary,
-                "riskCounts": {
-                    "red": red_count,
-                    "orange": orange_count,
-                    "green": green_count,
-                    "total": len(analysis_results)
-                }
-            })
-            
-        elif analysisType == 'timeline':
-            try:
-                # Generate timeline using gemini service
-                timeline_events = gemini_service.generate_timeline_from_text(full_text)
-                
-                document_data.update({
-                    "timeline": timeline_events,
-                    "summary": f"Generated a timeline with {len(timeline_events)} key events.",
-                    "riskCounts": {"red": 0, "orange": 0}  # Timelines don't have risk counts
-                })
-            except Exception as e:
-                print(f"⚠️ Timeline generation failed: {e}")
-                document_data.update({
-                    "timeline": [],
-                    "summary": "Timeline generation failed",
-                    "riskCounts": {"red": 0, "orange": 0}
-                })
-        else:
-            raise HTTPException(status_code=400, detail="Invalid analysis type. Must be 'risk' or 'timeline'.")
+        graph.add("save", save, after=("blob", *analysis_stages), critical=True)
+        run = await graph.run()
+        run.raise_for_critical()
+        doc_id = run.outcomes["save"].value
 
-        # 4. Save metadata to Firestore (with fallback to memory)
-        print(f"💾 Saving metadata to Firestore for user {userId}...")
-        doc_id = save_document_to_firestore(document_data)
-        
-        if not doc_id:
-            # Fallback to memory storage
-            doc_id = "doc_" + os.urandom(4).hex()
-            memory_db[doc_id] = document_data
-            print(f"✅ Document {doc_id} saved to memory (fallback)")
+        run_in_background(index_for_chat(doc_id, document_data["fullText"]))
+        if index_text and is_reusable_upload(document_data):
+            await record_upload(index_text, doc_id, user_id)
+
+        timings = run.timings()
+        telemetry.log(f"✅ Successfully processed document with analysis type: {analysis_type}",
+                      document_id=doc_id, stages=timings)
 
-        print(f"✅ Successfully processed document with analysis type: {analysisType}")
-        
         # Return the structure expected by frontend
         return {
-            "document_id": doc_id, 
-            "data": document_data
+            "document_id": doc_id,
+            "data": document_data,
+            "timings": timings
         }
 
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"💥 Unexpected server error during upload: {e}")
+        telemetry.log(f"💥 Unexpected server error during upload: {e}", level="error")
         raise HTTPException(status_code=500, detail="An internal server error occurred.")
 
+# --- Batch upload endpoint (data rooms) ---
+@app.post("/api/upload/batch")
+async def upload_and_analyze_batch(
+    userId: str = Query(...),
+    analysisType: str = Query(...),
+    files: list[UploadFile] = File(...)
+):
+    """Analyzes many files at once, packing clauses from all of them into shared model requests."""
+    if not userId or not analysisType:
+        raise HTTPException(status_code=400, detail="User ID and Analysis Type are required.")
+    if analysisType not in ('risk', 'timeline'):
+        raise HTTPException(status_code=400, detail="Invalid analysis type. Must be 'risk' or 'timeline'.")
+    if len(files) > batch_upload.MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {batch_upload.MAX_BATCH_FILES} files per batch.")
+
+    started = time.perf_counter()
+    entries = []
+    for file in files:
+        contents, content_hash = await upload_dedup.read_and_hash(file)
+        file_name = file.filename or "uploaded_document.pdf"
+        entries.append({
+            "fileName": file_name,
+            "contentType": file.content_type,
+            "contents": contents,
+            "indexText": upload_dedup.index_text(
+                content_hash, analysisType, UPLOAD_PROMPT_VERSIONS[analysisType], userId
+            ),
+            "result": None
+        })
+
+    # 1. Already analyzed content, and repeats of the same file within this batch
+    duplicates = await asyncio.gather(*[
+        find_duplicate_upload(entry["indexText"], userId, entry["fileName"]) if entry["indexText"] else asyncio.sleep(0)
+        for entry in entries
+    ])
+    first_by_key: dict[str, dict] = {}
+    work = []
+    for entry, duplicate in zip(entries, duplicates):
+        if duplicate:
+            entry["result"] = {"document_id": duplicate["document_id"], "fileName": entry["fileName"],
+                               "status": "complete", "deduplicated": True,
+                               "summary": duplicate["data"].get("summary"),
+                               "riskCounts": duplicate["data"].get("riskCounts")}
+        elif entry["indexText"] and entry["indexText"] in first_by_key:
+            entry["sameAs"] = first_by_key[entry["indexText"]]
+        else:
+            if entry["indexText"]:
+                first_by_key[entry["indexText"]] = entry
+            work.append(entry)
+
+    # 2. Blob uploads and text extraction for every file concurrently
+    async def prepare(entry: dict):
+        try:
+            with telemetry.span("upload.blob"):
+                entry["blobUrl"] = await upload_to_blob(entry["fileName"], entry["contents"])
+            with telemetry.span("upload.extract"):
+                entry["document"] = await extract_document(entry["contents"], entry["contentType"])
+            if analysisType == 'risk':
+                with telemetry.span("upload.segment"):
+                    entry["clauses"] = extract_clauses(entry["document"])
+                if not entry["clauses"]:
+                    raise HTTPException(status_code=400, detail="No meaningful clauses found.")
+        except Exception as e:
+            entry["error"] = e.detail if isinstance(e, HTTPException) else "Failed to read document."
+            telemetry.log(f"⚠️ Batch file {entry['fileName']} skipped: {e}", level="warning")
+
+    await asyncio.gather(*[prepare(entry) for entry in work])
+    ready = [entry for entry in work if "error" not in entry]
+    telemetry.log(f"📚 Batch of {len(entries)} files: {len(ready)} to analyze, "
+                  f"{sum(1 for entry in entries if entry['result'])} already analyzed.")
+
+    # 3. One global clause queue: requests are packed across document boundaries
+    if analysisType == 'risk':
+        pooled, owners = batch_upload.pool_clauses([[clause.text for clause in entry["clauses"]] for entry in ready])
+        results: list[dict[int, dict]] = [{} for _ in ready]
+        with telemetry.span("upload.analyze_clauses"):
+            async for indices, analyses in iter_clause_analyses(pooled):
+                for i, analysis in zip(indices, analyses):
+                    position, clause_index = owners[i]
+                    results[position][clause_index] = analysis
+        with telemetry.span("upload.summary"):
+            summaries = await generate_brief_summaries([(entry["document"].text, entry["fileName"]) for entry in ready])
+        for entry, clause_results, summary in zip(ready, results, summaries):
+            analysis_results = assemble_analysis(entry["clauses"], clause_results)
+            entry["fields"] = {
+                "fullAnalysis": analysis_results,
+                "summary": summary,
+                "riskCounts": build_risk_counts(analysis_results)
+            }
+    else:
+        async def build_timeline(entry: dict):
+            try:
+                entry["fields"] = await generate_timeline_data(entry["document"].text)
+            except Exception as e:
+                entry["error"] = "Timeline generation failed."
+                telemetry.log(f"⚠️ Batch file {entry['fileName']} timeline failed: {e}", level="warning")
+
+        with telemetry.span("upload.timeline"):
+            await asyncio.gather(*[build_timeline(entry) for entry in ready])
+
+    # 4. Each result goes to its own document record; a failed save only fails its own file
+    async def store(entry: dict):
+        try:
+            await save_entry(entry)
+        except Exception as e:
+            entry["error"] = e.detail if isinstance(e, HTTPException) else "Failed to save document."
+            telemetry.log(f"⚠️ Batch file {entry['fileName']} not saved: {e}", level="warning")
+
+    async def save_entry(entry: dict):
+        document_data = {
+            "userId": userId,
+            "fileName": entry["fileName"],
+            "blobUrl": entry["blobUrl"],
+            "createdAt": datetime.now(timezone.utc),
+            "analysisType": analysisType,
+            "fullText": entry["document"].text,
+            **entry["fields"]
+        }
+        doc_id = await save_document(document_data)
+        run_in_background(index_for_chat(doc_id, document_data["fullText"]))
+        if entry["indexText"] and is_reusable_upload(document_data):
+            try:
+                await record_upload(entry["indexText"], doc_id, userId)
+            except Exception as e:
+                # The document is stored; only deduplication of later uploads is lost
+                telemetry.log(f"⚠️ Upload index write for {doc_id} failed: {e}", level="warning")
+        entry["result"] = {"document_id": doc_id, "fileName": entry["fileName"], "status": "complete",
+                           "summary": document_data["summary"], "riskCounts": document_data["riskCounts"]}
+
+    with telemetry.span("upload.save"):
+        await asyncio.gather(*[store(entry) for entry in ready if "fields" in entry])
+
+    for entry in entries:
+        if "sameAs" in entry:
+            # Earlier in the list, so its result is already settled
+            entry["result"] = {**entry["sameAs"]["result"], "fileName": entry["fileName"]}
+        elif entry["result"] is None:
+            entry["result"] = {"document_id": None, "fileName": entry["fileName"], "status": "failed",
+                               "error": entry.get("error", "An internal server error occurred.")}
+
+    documents = [entry["result"] for entry in entries]
+    failed = sum(1 for document in documents if document["status"] == "failed")
+    deduplicated = sum(1 for document in documents if document.get("deduplicated"))
+    clause_count = sum(len(entry["clauses"]) for entry in ready) if analysisType == 'risk' else 0
+    elapsed = time.perf_counter() - started
+    batch_upload.record_batch(len(documents) - failed, failed, deduplicated, clause_count, elapsed)
+    telemetry.log(f"✅ Batch complete: {len(documents) - failed}/{len(documents)} documents in {elapsed:.1f}s")
+    return {
+        "documents": documents,
+        "throughput": {**batch_upload.throughput(len(documents) - failed, clause_count, elapsed),
+                       "failed": failed, "deduplicated": deduplicated}
+    }
+
+# --- Background analysis jobs ---
+async def process_upload_job(job: dict, payload: bytes, report):
+    """Job handler: runs the job under the trace id of the request that queued it."""
+    with telemetry.trace(job["params"].get("traceId") or job["id"]):
+        await run_upload_job(job, payload, report)
+
+async def run_upload_job(job: dict, payload: bytes, report):
+    """Runs the upload pipeline and mirrors its events into job progress."""
+    params = job["params"]
+    document_data = {
+        "userId": job["userId"],
+        "fileName": params["fileName"],
+        "blobUrl": None,
+        "createdAt": datetime.now(timezone.utc),
+        "analysisType": params["analysisType"],
+    }
+    parent = None
+    if params.get("parentId"):
+        parent = await load_parent_document(params["parentId"], job["userId"], params["analysisType"])
+        document_data.update(version_fields(params["parentId"], parent))
+    # A job taken over from a dead worker finishes the document that worker started
+    doc_id = (job.get("result") or {}).get("document_id")
+    if doc_id:
+        document_data["createdAt"] = datetime.fromtimestamp(job["createdAt"], timezone.utc)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    pipeline = asyncio.create_task(
+        run_upload_pipeline(queue, document_data, payload, params["contentType"], parent, doc_id)
+    )
+    total = 0
+    while (item := await queue.get()) is not None:
+        event, data = item
+        if event == 'started':
+            total = data["totalClauses"]
+            await report({
+                "progress": {"stage": "analyzing", "completed": 0, "total": total},
+                "result": {"document_id": data["document_id"]}
+            })
+        elif event == 'clauses':
+            await report({"progress": {"stage": "analyzing", "completed": data["completed"], "total": total}})
+        elif event == 'summary':
+            await report({
+                "status": "complete",
+                "progress": {"stage": "complete", "completed": total, "total": total},
+                "result": {
+                    "document_id": data["document_id"],
+                    "summary": data["summary"],
+                    "riskCounts": data["riskCounts"]
+                }
+            })
+        elif event == 'error':
+            await report({"status": "failed", "error": data["detail"]})
+    await pipeline
+
+@functools.cache
+def get_jobs() -> job_queue.JobQueue:
+    """Upload job queue on the configured job store."""
+    return job_queue.JobQueue(job_queue.create_job_backend(get_firestore_db()), process_upload_job)
+
+async def enqueue_upload_job(user_id: str, analysis_type: str, file: UploadFile, parent_id: str | None = None) -> JSONResponse:
+    """Validates an upload and hands it to the job workers."""
+    if analysis_type not in ('risk', 'timeline'):
+        raise HTTPException(status_code=400, detail="Invalid analysis type. Must be 'risk' or 'timeline'.")
+    if file.content_type not in document_ai_service.SUPPORTED_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail="Unsupported file type.")
+    if parent_id:
+        await load_parent_document(parent_id, user_id, analysis_type)
+
+    contents = await file.read()
+    job = await get_jobs().enqueue(user_id, {
+        "analysisType": analysis_type,
+        "fileName": file.filename or "uploaded_document.pdf",
+        "contentType": file.content_type,
+        "parentId": parent_id,
+        "traceId": telemetry.trace_id_var.get()
+    }, contents)
+    telemetry.log(f"📥 Queued job {job['id']} for user {user_id}")
+    return JSONResponse(status_code=202, content={
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/api/jobs/{job['id']}"
+    })
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = await get_jobs().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+# --- Streaming upload endpoint (SSE / NDJSON progress) ---
+# Minimum seconds between incremental Firestore writes of partial analysis
+STREAM_PERSIST_INTERVAL = 2.0
+
+def format_stream_event(event: str, payload: dict, stream_format: str) -> str:
+    """Serializes one progress event as SSE or NDJSON."""
+    if stream_format == 'ndjson':
+        return json.dumps({"event": event, **payload}, default=str) + "\n"
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+async def run_upload_pipeline(
+    queue: asyncio.Queue, document_data: dict, contents: bytes, content_type: str | None,
+    parent: dict | None = None, doc_id: str | None = None
+):
+    """Runs extraction and analysis, persisting incrementally and publishing events to the queue.
+
+    With ``doc_id`` the placeholder overwrites that document (a resumed job) instead of creating one.
+    """
+    file_name = document_data["fileName"]
+    analysis_type = document_data["analysisType"]
+    try:
+        with telemetry.span("upload.blob"):
+            document_data["blobUrl"] = await upload_to_blob(file_name, contents)
+        with telemetry.span("upload.extract"):
+            document = await extract_document(contents, content_type)
+        full_text = document.text
+        document_data["fullText"] = full_text
+
+        with telemetry.span("upload.segment"):
+            clauses = extract_clauses(document) if analysis_type == 'risk' else []
+        clauses_to_analyze = [clause.text for clause in clauses]
+        if analysis_type == 'risk' and not clauses_to_analyze:
+            raise HTTPException(status_code=400, detail="No meaningful clauses found.")
+        diff = None
+        if parent and analysis_type == 'risk':
+            diff = versioning.diff_clauses(parent.get('fullAnalysis', []), clauses_to_analyze)
+
+        # Persist a placeholder right away so partial results have a home
+        document_data.update({"status": "processing", "fullAnalysis": [], "summary": ""})
+        with telemetry.span("upload.save"):
+            if doc_id:
+                await update_document(doc_id, document_data)
+            else:
+                doc_id = await save_document(document_data)
+        run_in_background(index_for_chat(doc_id, full_text))
+        await queue.put(("started", {
+            "document_id": doc_id,
+            "fileName": file_name,
+            "analysisType": analysis_type,
+            "totalClauses": len(clauses_to_analyze),
+            "parentId": document_data.get("parentId"),
+            "carriedOver": len(diff.carried) if diff else 0
+        }))
+
+        if analysis_type == 'risk':
+            results: dict[int, dict] = {}
+            last_persist = asyncio.get_running_loop().time()
+            with telemetry.span("upload.analyze_clauses"):
+                async for indices, analyses in iter_clause_analyses(clauses_to_analyze, diff.carried if diff else None):
+                    results.update(zip(indices, analyses))
+                    await queue.put(("clauses", {
+                        "document_id": doc_id,
+                        "clauses": [
+                            {"index": i, **analysis, **clause_fields(clauses[i])}
+                            for i, analysis in zip(indices, analyses)
+                        ],
+                        "completed": len(results),
+                        "total": len(clauses_to_analyze)
+                    }))
+
+                    now = asyncio.get_running_loop().time()
+                    if now - last_persist >= STREAM_PERSIST_INTERVAL:
+                        last_persist = now
+                        partial = [
+                            {**results[i], **clause_fields(clauses[i])} for i in sorted(results)
+                        ]
+                        await update_document(doc_id, {
+                            "fullAnalysis": partial,
+                            "riskCounts": build_risk_counts(partial)
+                        })
+
+            analysis_results = assemble_analysis(clauses, results)
+            with telemetry.span("upload.summary"):
+                summary = await generate_brief_summary(full_text, file_name)
+            final_fields = {
+                "fullAnalysis": analysis_results,
+                "summary": summary,
+                "riskCounts": build_risk_counts(analysis_results)
+            }
+            if diff:
+                final_fields["versionDiff"] = versioning.summarize_diff(diff, parent['fullAnalysis'], analysis_results)
+        else:
+            with telemetry.span("upload.timeline"):
+                final_fields = await generate_timeline_data(full_text)
+            await queue.put(("timeline", {"document_id": doc_id, "timeline": final_fields["timeline"]}))
+
+        final_fields["status"] = "complete"
+        document_data.update(final_fields)
+        with telemetry.span("upload.save"):
+            await update_document(doc_id, final_fields)
+        run_in_background(index_clauses(doc_id, document_data))
+        telemetry.log(f"✅ Successfully streamed document {doc_id} with analysis type: {analysis_type}",
+                      document_id=doc_id, spans=telemetry.summarize_spans(telemetry.current_spans()))
+
+        await queue.put(("summary", {
+            "document_id": doc_id,
+            "summary": document_data["summary"],
+            "riskCounts": document_data["riskCounts"],
+            "versionDiff": document_data.get("versionDiff"),
+            "status": "complete"
+        }))
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else "An internal server error occurred."
+        telemetry.log(f"💥 Streaming upload failed: {e}", level="error")
+        if doc_id:
+            await update_document(doc_id, {"status": "failed"})
+        await queue.put(("error", {"document_id": doc_id, "detail": detail}))
+    finally:
+        await queue.put(None)
+
+@app.post("/api/upload/stream")
+async def upload_and_analyze_document_stream(
+    userId: str = Query(...),
+    analysisType: str = Query(...),
+    stream_format: str = Query("sse", alias="format", description="Event format: 'sse' or 'ndjson'"),
+    file: UploadFile = File(...),
+    parentId: str | None = Query(None, description="Previous version of this document; unchanged clauses are carried over")
+):
+    if not userId or not analysisType:
+        raise HTTPException(status_code=400, detail="User ID and Analysis Type are required.")
+    if analysisType not in ('risk', 'timeline'):
+        raise HTTPException(status_code=400, detail="Invalid analysis type. Must be 'risk' or 'timeline'.")
+    if stream_format not in ('sse', 'ndjson'):
+        raise HTTPException(status_code=400, detail="Invalid format. Must be 'sse' or 'ndjson'.")
+
+    contents = await file.read()
+    document_data = {
+        "userId": userId,
+        "fileName": file.filename or "uploaded_document.pdf",
+        "blobUrl": None,
+        "createdAt": datetime.now(timezone.utc),
+        "analysisType": analysisType,
+    }
+    parent = None
+    if parentId:
+        parent = await load_parent_document(parentId, userId, analysisType)
+        document_data.update(version_fields(parentId, parent))
+
+    queue: asyncio.Queue = asyncio.Queue()
+    # The pipeline keeps running (and persisting) if the client disconnects
+    run_in_background(run_upload_pipeline(queue, document_data, contents, file.content_type, parent))
+
+    async def event_stream():
+        while (item := await queue.get()) is not None:
+            event, payload = item
+            yield format_stream_event(event, payload, stream_format)
+
+    media_type = "application/x-ndjson" if stream_format == 'ndjson' else "text/event-stream"
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # --- Enhanced Chat Endpoint ---
-@app.post("/api/chat")
-async def chat_with_document(request: dict):
-    """Endpoint for the Q&A feature."""
+async def prepare_chat_turn(request: dict) -> tuple[chat_session.ChatContext, str, str, str]:
+    """Validates a chat request; returns (context, conversation id, question, prompt)."""
     doc_id = request.get('document_id')
     question = request.get('question')
 
     if not doc_id or not question:
         raise HTTPException(status_code=400, detail="Document ID and question are required.")
     
-    # Try Firestore first, then fallback to memory
-    document_data = get_document_from_firestore(doc_id)
-    if not document_data and doc_id in memory_db:
-        document_data = memory_db[doc_id]
-    
+    document_data = await load_document(doc_id)
     if not document_data:
         raise HTTPException(status_code=404, detail="Document not found.")
     
-    context = document_data.get('fullText', '')
-    if not context:
+    text = await get_document_text(document_data)
+    if not text:
         raise HTTPException(status_code=400, detail="Document text not available for Q&A.")
-    
+
     try:
-        # Use the appropriate method based on what's available in your gemini_service
-        if hasattr(gemini_service, 'get_answer_from_gemini'):
-            answer = gemini_service.get_answer_from_gemini(context, question)
-        else:
-            # Fallback to direct model usage if the helper method doesn't exist
-            prompt = f"Context: {context[:3000]}\n\nQuestion: {question}\n\nAnswer:"
-            response = await gemini_service.model.generate_content_async(prompt)
-            answer = response.text.strip()
-        
-        return {"answer": answer}
+        conversation_id, turns = conversations.open(request.get('conversation_id'), doc_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    context = await chat_contexts.get(doc_id, document_data, text)
+    excerpts = None
+    if context.mode == "local":
+        try:
+            # Retrieve only the passages relevant to the question so prompt size stays bounded
+            with telemetry.span("chat.retrieve"):
+                passages = await vector_index.search_or_build(doc_id, text, question)
+            excerpts = vector_db_service.format_passages(passages)
+        except Exception as e:
+            telemetry.log(f"⚠️ Retrieval failed for {doc_id}, using leading text: {e}", level="warning")
+            excerpts = text[:vector_db_service.CHUNK_CHARS * vector_db_service.DEFAULT_TOP_K]
+
+    prompt = chat_session.build_turn_prompt(context, turns, question, excerpts)
+    return context, conversation_id, question, prompt
+
+@app.post("/api/chat")
+async def chat_with_document(request: dict):
+    """Endpoint for the Q&A feature."""
+    started = time.perf_counter()
+    context, conversation_id, question, prompt = await prepare_chat_turn(request)
+    try:
+        response = await gemini_service.generate(prompt, priority=gemini_service.PRIORITY_CHAT, target=context.model)
+        answer = response.text
     except Exception as e:
-        print(f"❌ Chat error: {e}")
+        telemetry.log(f"❌ Chat error: {e}", level="error")
         raise HTTPException(status_code=500, detail="Failed to generate answer.")
 
+    chat_session.record_turn(context.mode, prompt, time.perf_counter() - started, streamed=False)
+    conversations.append(conversation_id, context.doc_id, question, answer)
+    return {"answer": answer, "conversation_id": conversation_id}
+
+@app.post("/api/chat/stream")
+async def chat_with_document_stream(request: dict):
+    """Q&A with the answer streamed token by token (SSE, or NDJSON with "format": "ndjson").
+
+    Events: "start" (conversation id), "token" (text), then "done" with the
+    full answer, or "error". Pass the conversation id back on the next turn to
+    keep the conversation's history.
+    """
+    started = time.perf_counter()
+    stream_format = request.get('format', 'sse')
+    if stream_format not in ('sse', 'ndjson'):
+        raise HTTPException(status_code=400, detail="Invalid format. Must be 'sse' or 'ndjson'.")
+    context, conversation_id, question, prompt = await prepare_chat_turn(request)
+
+    async def event_stream():
+        yield format_stream_event("start", {"conversation_id": conversation_id, "context": context.mode}, stream_format)
+        parts = []
+        try:
+            async for text in gemini_service.generate_stream(prompt, target=context.model):
+                if not parts:
+                    chat_session.record_turn(context.mode, prompt, time.perf_counter() - started, streamed=True)
+                parts.append(text)
+                yield format_stream_event("token", {"text": text}, stream_format)
+        except Exception as e:
+            telemetry.log(f"❌ Chat stream error: {e}", level="error")
+            yield format_stream_event("error", {"detail": "Failed to generate answer."}, stream_format)
+            return
+        answer = "".join(parts)
+        conversations.append(conversation_id, context.doc_id, question, answer)
+        yield format_stream_event("done", {"answer": answer, "conversation_id": conversation_id}, stream_format)
+
+    media_type = "application/x-ndjson" if stream_format == 'ndjson' else "text/event-stream"
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # --- Timeline Generation Endpoint ---
 @app.post("/api/generate-timeline")
 async def generate_timeline(request: dict):
@@ -438,57 +1495,188 @@ async def generate_timeline(request: dict):
         raise HTTPException(status_code=400, detail="Document ID is required.")
 
     try:
-        # Try Firestore first, then fallback to memory
-        document_data = get_document_from_firestore(doc_id)
-        if not document_data and doc_id in memory_db:
-            document_data = memory_db[doc_id]
-        
+        document_data = await load_document(doc_id)
         if not document_data:
             raise HTTPException(status_code=404, detail="Document not found.")
         
-        full_analysis = document_data.get('fullAnalysis', [])
-        # Reconstruct the document text from the original_text of all clauses
-        document_text = "\n".join([clause.get('original_text', '') for clause in full_analysis])
+        document_text = await get_document_text(document_data)
+        if not document_text.strip():
+            # Documents without stored text: reconstruct it from the analyzed clauses
+            full_analysis = document_data.get('fullAnalysis', [])
+            document_text = "\n\n".join([clause.get('original_text', '') for clause in full_analysis])
 
         if not document_text.strip():
             raise HTTPException(status_code=400, detail="Document has no text content to analyze.")
 
-        # Call the AI agent function to generate timeline
-        timeline_events = gemini_service.generate_timeline_from_text(document_text)
+        timeline = await timeline_service.build_timeline(document_text, get_timeline_cache())
 
-        # Save the generated timeline back to the document (if Firestore is available)
-        if timeline_events and firestore_db:
-            try:
-                doc_ref = firestore_db.collection('documents').document(doc_id)
-                doc_ref.update({"timeline": timeline_events})
-            except Exception as e:
-                print(f"⚠️ Failed to save timeline to Firestore: {e}")
-                # Also update memory storage if document exists there
-                if doc_id in memory_db:
-                    memory_db[doc_id]["timeline"] = timeline_events
+        # Save the generated timeline back to the document
+        if timeline.events:
+            await update_document(doc_id, {"timeline": timeline.events, "timelineFailedWindows": timeline.failed_windows})
 
-        # Also update memory storage if document exists there
-        elif timeline_events and doc_id in memory_db:
-            memory_db[doc_id]["timeline"] = timeline_events
-
-        return {"timeline": timeline_events}
+        return {"timeline": timeline.events, "failedWindows": timeline.failed_windows}
+    except HTTPException:
+        raise
+    except timeline_service.TimelineUnavailableError as e:
+        telemetry.log(f"💥 Timeline generation failed: {e}", level="error")
+        raise HTTPException(status_code=503, detail="Timeline extraction is unavailable; try again later.")
     except Exception as e:
-        print(f"💥 Timeline generation failed: {e}")
+        telemetry.log(f"💥 Timeline generation failed: {e}", level="error")
         raise HTTPException(status_code=500, detail="Failed to generate case timeline.")
 
+# --- Clause search and analytics ---
+# One backfill per user at a time on this instance. Locks stay in the map: dropping
+# one while a request still waits on it would let a second backfill start beside it.
+backfill_locks: dict[str, asyncio.Lock] = {}
+
+async def walk_listings(next_page) -> list[dict] | None:
+    """Every listing one store holds for a user, page by page; None if the store fails mid-walk."""
+    listings, cursor = [], None
+    while True:
+        page = await next_page(cursor)
+        if page is None:
+            return None
+        listings.extend(page[0])
+        if not (cursor := page[1]):
+            return listings
+
+async def backfill_clause_index(user_id: str):
+    """Indexes a user's stored documents the first time this instance serves their search."""
+    if await run_blocking(clause_search.is_user_indexed, user_id):
+        return
+    lock = backfill_locks.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        if await run_blocking(clause_search.is_user_indexed, user_id):
+            return
+        page_size = document_listing.MAX_PAGE_SIZE
+        # Documents saved during a Firestore outage live in the local store until replayed
+        sources = [lambda cursor: run_blocking(local_store.page, user_id, page_size, cursor)]
+        if await firestore_client() is not None:
+            sources.insert(0, lambda cursor: get_documents_from_firestore(user_id, page_size, cursor))
+
+        indexed, seen = 0, set()
+        with telemetry.span("clause_index.backfill"):
+            for next_page in sources:
+                listings = await walk_listings(next_page)
+                if listings is None:
+                    # Left unmarked, so the next search retries the backfill
+                    telemetry.log(f"⚠️ Clause index backfill for user {user_id} stopped: listing unavailable",
+                                  level="warning")
+                    return
+                for listing in listings:
+                    if listing['id'] in seen:
+                        continue  # replayed to Firestore and still held locally
+                    seen.add(listing['id'])
+                    if listing.get('analysisType') != 'risk' or listing.get('status', 'complete') != 'complete':
+                        continue
+                    document_data = await load_document(listing['id'])
+                    if document_data:
+                        await run_blocking(clause_search.index_document, listing['id'], document_data)
+                        indexed += 1
+        await run_blocking(clause_search.mark_user_indexed, user_id)
+    telemetry.log(f"🔎 Backfilled clause index with {indexed} documents for user {user_id}")
+
+def parse_risk_levels(risk: str | None) -> list[str] | None:
+    if not risk:
+        return None
+    levels = [level.strip().capitalize() for level in risk.split(",") if level.strip()]
+    if any(level not in clause_index.RISK_LEVELS for level in levels):
+        raise HTTPException(status_code=400, detail="Invalid risk level. Use Red, Orange, Green or Gray.")
+    return levels
+
+@app.get("/api/search")
+async def search_clauses(
+    userId: str = Query(..., description="User whose analyzed clauses are searched"),
+    q: str = Query(..., min_length=1, description="Free-text query over clause text and plain-English summaries"),
+    limit: int = Query(clause_index.DEFAULT_SEARCH_LIMIT, ge=1, le=clause_index.MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0),
+    risk: str | None = Query(None, description="Comma-separated risk levels, e.g. 'Red,Orange'"),
+    clauseType: str | None = Query(None, description="Clause type facet, e.g. 'indemnity'"),
+    monthFrom: str | None = Query(None, alias="from", pattern=r"^\d{4}-\d{2}$"),
+    monthTo: str | None = Query(None, alias="to", pattern=r"^\d{4}-\d{2}$"),
+    match: str = Query("all", pattern="^(all|any)$", description="Require all query terms or any of them"),
+):
+    """BM25-ranked clauses across all of a user's risk analyses."""
+    risk_levels = parse_risk_levels(risk)
+    await backfill_clause_index(userId)
+    return await run_blocking(
+        clause_search.search, userId, q, limit, offset, risk_levels, clauseType, monthFrom, monthTo, match == "all"
+    )
+
+@app.get("/api/analytics")
+async def clause_analytics(
+    userId: str = Query(...),
+    risk: str | None = Query("Red,Orange", description="Comma-separated risk levels to count"),
+    clauseType: str | None = Query(None),
+    monthFrom: str | None = Query(None, alias="from", pattern=r"^\d{4}-\d{2}$"),
+    monthTo: str | None = Query(None, alias="to", pattern=r"^\d{4}-\d{2}$"),
+):
+    """Risk counts across a user's documents, faceted by clause type and by month."""
+    risk_levels = parse_risk_levels(risk)
+    await backfill_clause_index(userId)
+    return await run_blocking(clause_search.analytics, userId, risk_levels, clauseType, monthFrom, monthTo)
+
 # --- Health check endpoint ---
+def lazy_stats(getter) -> dict:
+    """Stats of a service built on first use, without building it just to report on it."""
+    if not getter.cache_info().currsize:
+        return {"initialized": False}
+    return getter().stats()
+
 @app.get("/health")
 async def health_check():
+    db = await firestore_client()
+    firestore_error = None
+    if db:
+        try:
+            await asyncio.wait_for(run_blocking(probe_firestore, db), FIRESTORE_PROBE_TIMEOUT)
+        except Exception as e:
+            firestore_error = describe_firestore_error(str(e) or type(e).__name__)
     return {
         "status": "healthy",
-        "firebase_connected": firestore_db is not None,
-        "storage_type": "firestore" if firestore_db else "memory",
+        "firebase_connected": db is not None and firestore_error is None,
+        "storage_type": "firestore" if db else "local",
         "services": {
-            "firestore": firestore_db is not None,
+            "firestore": db is not None and firestore_error is None,
+            "firestore_error": firestore_error,
             "vercel_blob": VERCEL_BLOB_AVAILABLE and os.getenv('BLOB_READ_WRITE_TOKEN') is not None
-        }
+        },
+        "local_store": local_store.stats(),
+        "clause_cache": lazy_stats(get_clause_cache),
+        "timeline": {**timeline_service.stats(), "cache": lazy_stats(get_timeline_cache)},
+        "document_cache": documents_cache.stats(),
+        "jobs": lazy_stats(get_jobs),
+        "batching": clause_batcher.stats(),
+        "versioning": versioning.stats(),
+        "batch_upload": batch_upload.stats(),
+        "upload_dedup": {**upload_dedup.stats(), "index": lazy_stats(get_upload_index), "in_flight": len(upload_coalescer)},
+        "structured_output": structured_output.stats(),
+        "clause_index": clause_search.stats(),
+        "risk_triage": clause_triage.stats(),
+        "chat": {**chat_session.stats(), "contexts": chat_contexts.stats(), "conversations": len(conversations)},
+        "gemini": gemini_service.scheduler.stats()
     }
 
+# --- Metrics endpoint (Prometheus text format) ---
+telemetry.registry.register_stats("local_store", lambda: local_store.stats())
+telemetry.registry.register_stats("clause_cache", lambda: lazy_stats(get_clause_cache))
+telemetry.registry.register_stats("timeline", lambda: {**timeline_service.stats(), "cache": lazy_stats(get_timeline_cache)})
+telemetry.registry.register_stats("document_cache", lambda: documents_cache.stats())
+telemetry.registry.register_stats("jobs", lambda: lazy_stats(get_jobs))
+telemetry.registry.register_stats("batching", lambda: clause_batcher.stats())
+telemetry.registry.register_stats("versioning", versioning.stats)
+telemetry.registry.register_stats("batch_upload", batch_upload.stats)
+telemetry.registry.register_stats("upload_dedup", lambda: {**upload_dedup.stats(), "index": lazy_stats(get_upload_index)})
+telemetry.registry.register_stats("structured_output", structured_output.stats)
+telemetry.registry.register_stats("clause_index", lambda: clause_search.stats())
+telemetry.registry.register_stats("risk_triage", lambda: clause_triage.stats())
+telemetry.registry.register_stats("chat", lambda: {**chat_session.stats(), "contexts": chat_contexts.stats(), "conversations": len(conversations)})
+telemetry.registry.register_stats("gemini", gemini_service.scheduler.stats)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
 # --- Root endpoint ---
 @app.get("/")
 async def root():
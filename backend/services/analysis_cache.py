@@ -0,0 +1,328 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from backend.services import telemetry
+from backend.services.executor import run_blocking
+from datetime import datetime, timezone, timedelta
+
+# Durable tier selection: "auto" uses Firestore when a client is available and
+# falls back to a local SQLite file otherwise.
+CACHE_BACKEND = os.getenv("CLAUSE_CACHE_BACKEND", "auto")
+CACHE_PATH = os.getenv(
+    "CLAUSE_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "lawlytics_clause_cache.sqlite3"),
+)
+CACHE_TTL_SECONDS = int(os.getenv("CLAUSE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+CACHE_MEMORY_ENTRIES = int(os.getenv("CLAUSE_CACHE_MEMORY_ENTRIES", "5000"))
+CACHE_DURABLE_ENTRIES = int(os.getenv("CLAUSE_CACHE_DURABLE_ENTRIES", "200000"))
+# Table (SQLite) or collection (Firestore) holding clause analyses; other caches
+# built on these tiers declare their own so each keeps a separate size budget and TTL
+CACHE_COLLECTION = "clause_cache"
+
+_QUOTE_TABLE = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"'})
+
+
+def normalize_clause(text: str) -> str:
+    """Collapses whitespace, quote styles and case so template copies share a key."""
+    return " ".join(text.translate(_QUOTE_TABLE).split()).casefold()
+
+
+def cache_key(text: str, prompt_version: str, model_name: str) -> str:
+    """Content address for a clause analysis under a given prompt and model."""
+    payload = f"{model_name}\x00{prompt_version}\x00{normalize_clause(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def exact_key(text: str, prompt_version: str, model_name: str) -> str:
+    """Like cache_key, but for text that must match byte for byte (no normalization)."""
+    payload = f"{model_name}\x00{prompt_version}\x00{text}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: dict, stored_at: float | None = None):
+        with self._lock:
+            self._entries[key] = (stored_at or time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """Durable cache tier backed by a local SQLite file."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int, table: str = CACHE_COLLECTION):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.table = table
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[float, dict]]:
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value, stored_at FROM {self.table} WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, value, stored_at in rows:
+                    if now - stored_at <= self.ttl_seconds:
+                        found[key] = (stored_at, json.loads(value))
+            if found:
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items: dict[str, dict]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(value), now, now) for key, value in items.items()],
+            )
+            self._evict_locked(now)
+            self._conn.commit()
+
+    def _evict_locked(self, now: float):
+        expired = self._conn.execute(
+            f"DELETE FROM {self.table} WHERE stored_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        overflow = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f" SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+        self.evictions += max(expired, 0) + max(overflow, 0)
+
+
+class FirestoreTier:
+    """Durable cache tier stored as one Firestore document per clause key.
+
+    Size is bounded by a Firestore TTL policy on the ``expiresAt`` field of each
+    cache's collection (clause_cache, timeline_window_cache, upload_index); reads
+    also ignore expired entries so the policy's deletion lag is harmless.
+    """
+
+    name = "firestore"
+
+    def __init__(self, client, ttl_seconds: int, collection: str = CACHE_COLLECTION):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.collection = collection
+        self.evictions = 0
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[float, dict]]:
+        if not keys:
+            return {}
+        now = time.time()
+        collection = self.client.collection(self.collection)
+        refs = [collection.document(key) for key in keys]
+        found = {}
+        for snapshot in self.client.get_all(refs):
+            if not snapshot.exists:
+                continue
+            data = snapshot.to_dict()
+            stored_at = data.get("storedAt", 0)
+            if now - stored_at > self.ttl_seconds:
+                self.evictions += 1
+                continue
+            found[snapshot.id] = (stored_at, data.get("analysis", {}))
+        return found
+
+    def put_many(self, items: dict[str, dict]):
+        if not items:
+            return
+        now = time.time()
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        collection = self.client.collection(self.collection)
+        pairs = list(items.items())
+        # Firestore batches are capped at 500 writes.
+        for start in range(0, len(pairs), 500):
+            batch = self.client.batch()
+            for key, value in pairs[start:start + 500]:
+                batch.set(collection.document(key), {
+                    "analysis": value,
+                    "storedAt": now,
+                    "expiresAt": expires_at,
+                })
+            batch.commit()
+
+
+class ClauseAnalysisCache:
+    """Two-tier (LRU + durable) cache of per-clause Gemini analyses."""
+
+    # Durable table/collection and limits; subclasses reusing the tiers override all four
+    namespace = CACHE_COLLECTION
+    memory_entries = CACHE_MEMORY_ENTRIES
+    durable_entries = CACHE_DURABLE_ENTRIES
+    ttl_seconds = CACHE_TTL_SECONDS
+
+    def __init__(self, durable=None, prompt_version: str = "", model_name: str = "",
+                 memory_entries: int | None = None, ttl_seconds: int | None = None):
+        self.prompt_version = prompt_version
+        self.model_name = model_name
+        self.memory = MemoryTier(memory_entries or self.memory_entries, ttl_seconds or self.ttl_seconds)
+        self.durable = durable
+        self.memory_hits = 0
+        self.durable_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.durable_errors = 0
+
+    @staticmethod
+    def is_cacheable(analysis: dict) -> bool:
+        return analysis.get("risk_level") in ("Red", "Orange", "Green")
+
+    def key_for(self, text: str) -> str:
+        return cache_key(text, self.prompt_version, self.model_name)
+
+    async def get_many(self, clauses: list[str]) -> dict[int, dict]:
+        """Returns cached analyses keyed by clause index; absent indices are misses."""
+        keys = [self.key_for(clause) for clause in clauses]
+        results: dict[int, dict] = {}
+        pending: dict[str, list[int]] = {}
+
+        for index, key in enumerate(keys):
+            value = self.memory.get(key)
+            if value is not None:
+                results[index] = dict(value)
+                self.memory_hits += 1
+            else:
+                pending.setdefault(key, []).append(index)
+
+        if pending and self.durable is not None:
+            try:
+                found = await run_blocking(self.durable.get_many, list(pending))
+            except Exception as e:
+                self.durable_errors += 1
+                telemetry.log(f"⚠️ Cache read failed ({self.namespace}, {self.durable.name}): {e}", level="warning")
+                found = {}
+            for key, (stored_at, value) in found.items():
+                self.memory.put(key, value, stored_at)
+                for index in pending.pop(key):
+                    results[index] = dict(value)
+                    self.durable_hits += 1
+
+        self.misses += sum(len(indices) for indices in pending.values())
+        return results
+
+    async def put_many(self, entries: list[tuple[str, dict]]):
+        """Stores (clause_text, analysis) pairs, skipping fallback results."""
+        items = {}
+        for clause, analysis in entries:
+            if not self.is_cacheable(analysis):
+                continue
+            value = {k: v for k, v in analysis.items() if k != "original_text"}
+            key = self.key_for(clause)
+            self.memory.put(key, value)
+            items[key] = value
+
+        if not items:
+            return
+        self.writes += len(items)
+        if self.durable is not None:
+            try:
+                await run_blocking(self.durable.put_many, items)
+            except Exception as e:
+                self.durable_errors += 1
+                telemetry.log(f"⚠️ Cache write failed ({self.namespace}, {self.durable.name}): {e}", level="warning")
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.durable_hits + self.misses
+        return {
+            "backend": self.durable.name if self.durable is not None else "memory",
+            "namespace": self.namespace,
+            "memory_entries": len(self.memory),
+            "memory_hits": self.memory_hits,
+            "durable_hits": self.durable_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.durable_hits) / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.memory.evictions + (self.durable.evictions if self.durable is not None else 0),
+            "durable_errors": self.durable_errors,
+        }
+
+
+def create_clause_cache(firestore_client, prompt_version: str, model_name: str,
+                        cache_class: type[ClauseAnalysisCache] = ClauseAnalysisCache) -> ClauseAnalysisCache:
+    """Builds the clause cache with the durable tier chosen by CLAUSE_CACHE_BACKEND.
+
+    The durable tier is scoped to ``cache_class.namespace`` and its own limits, so
+    caches sharing the backend never evict each other's entries.
+    """
+    backend = CACHE_BACKEND
+    if backend == "auto":
+        backend = "firestore" if firestore_client is not None else "sqlite"
+
+    durable = None
+    try:
+        if backend == "firestore" and firestore_client is not None:
+            durable = FirestoreTier(firestore_client, cache_class.ttl_seconds, collection=cache_class.namespace)
+        elif backend == "sqlite":
+            durable = SQLiteTier(CACHE_PATH, cache_class.ttl_seconds, cache_class.durable_entries,
+                                 table=cache_class.namespace)
+    except Exception as e:
+        telemetry.log(f"⚠️ {cache_class.namespace} durable tier unavailable, using memory only: {e}",
+                      level="warning")
+
+    return cache_class(durable, prompt_version=prompt_version, model_name=model_name)
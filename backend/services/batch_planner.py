@@ -0,0 +1,163 @@
+import os
+import re
+import math
+import threading
+from dataclasses import dataclass
+
+# Clause text tokens packed into one analyze_chunk request
+BATCH_TOKEN_BUDGET = int(os.getenv("CLAUSE_BATCH_TOKEN_BUDGET", "1500"))
+# Clauses above this size are split into parts instead of being clipped
+MAX_SEGMENT_TOKENS = int(os.getenv("CLAUSE_MAX_SEGMENT_TOKENS", "400"))
+INITIAL_BATCH_ITEMS = int(os.getenv("CLAUSE_BATCH_INITIAL_ITEMS", "10"))
+MIN_BATCH_ITEMS = 2
+MAX_BATCH_ITEMS = int(os.getenv("CLAUSE_BATCH_MAX_ITEMS", "40"))
+
+# Chunk size used before adaptive batching, kept for call-count comparisons
+FIXED_CHUNK_SIZE = 10
+
+_WORD_RE = re.compile(r"\S+")
+_SENTENCE_RE = re.compile(r"(?<=[.;:!?])\s+")
+_RISK_ORDER = {"Red": 3, "Orange": 2, "Green": 1}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 chars or ~0.75 words per token, whichever is larger)."""
+    words = len(_WORD_RE.findall(text))
+    return max(1, math.ceil(len(text) / 4), math.ceil(words * 4 / 3))
+
+
+def split_clause(text: str, max_tokens: int = MAX_SEGMENT_TOKENS) -> list[str]:
+    """Splits an oversized clause at sentence, then word, boundaries."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    pieces = []
+    for sentence in _SENTENCE_RE.split(text):
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words, current = sentence.split(), []
+        for word in words:
+            if current and estimate_tokens(" ".join(current + [word])) > max_tokens:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+
+    parts, current = [], ""
+    for piece in pieces:
+        candidate = f"{current} {piece}" if current else piece
+        if current and estimate_tokens(candidate) > max_tokens:
+            parts.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def merge_part_analyses(parts: list[dict]) -> dict:
+    """Combines the analyses of a split clause; the riskiest part decides the level.
+
+    A part without a real level (Gray) means the clause was not fully
+    analyzed, so the merged result is that part's Gray and is not cacheable.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    unanalyzed = [part for part in parts if part.get("risk_level") not in _RISK_ORDER]
+    worst = unanalyzed[0] if unanalyzed else max(parts, key=lambda part: _RISK_ORDER[part["risk_level"]])
+    return {
+        **worst,
+        "plain_english": " ".join(p.get("plain_english", "") for p in parts if p.get("plain_english")),
+    }
+
+
+@dataclass
+class Segment:
+    """One model input: a clause or one part of a split clause."""
+    clause_index: int
+    part_index: int
+    part_count: int
+    text: str
+    tokens: int
+
+
+class BatchPlanner:
+    """Packs clauses into token-budgeted batches and adapts batch size per model.
+
+    The item cap follows AIMD: it grows by one after each clean batch and halves
+    when the model returns the wrong number of results.
+    """
+
+    def __init__(self, token_budget: int = BATCH_TOKEN_BUDGET, max_segment_tokens: int = MAX_SEGMENT_TOKENS):
+        self.token_budget = token_budget
+        self.max_segment_tokens = max_segment_tokens
+        self._batch_items: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            "documents": 0,
+            "clauses": 0,
+            "split_clauses": 0,
+            "segments": 0,
+            "model_calls": 0,
+            "fixed_chunk_calls": 0,
+            "length_mismatches": 0,
+            "fallback_results": 0,
+        }
+
+    def batch_items(self, model_name: str) -> int:
+        with self._lock:
+            return int(self._batch_items.get(model_name, INITIAL_BATCH_ITEMS))
+
+    def plan(self, clauses: list[str], model_name: str) -> list[list[Segment]]:
+        """Returns batches of segments in clause order."""
+        max_items = self.batch_items(model_name)
+        segments = []
+        for clause_index, clause in enumerate(clauses):
+            parts = split_clause(clause, self.max_segment_tokens)
+            if len(parts) > 1:
+                self.metrics["split_clauses"] += 1
+            for part_index, part in enumerate(parts):
+                segments.append(Segment(clause_index, part_index, len(parts), part, estimate_tokens(part)))
+
+        batches, current, current_tokens = [], [], 0
+        for segment in segments:
+            if current and (current_tokens + segment.tokens > self.token_budget or len(current) >= max_items):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(segment)
+            current_tokens += segment.tokens
+        if current:
+            batches.append(current)
+
+        self.metrics["documents"] += 1
+        self.metrics["clauses"] += len(clauses)
+        self.metrics["segments"] += len(segments)
+        self.metrics["fixed_chunk_calls"] += math.ceil(len(clauses) / FIXED_CHUNK_SIZE)
+        return batches
+
+    def record_attempt(self, model_name: str, size: int, outcome: str):
+        """Feeds one model call outcome ('ok', 'mismatch' or 'error') into the per-model batch size."""
+        with self._lock:
+            self.metrics["model_calls"] += 1
+            current = self._batch_items.get(model_name, INITIAL_BATCH_ITEMS)
+            if outcome == "mismatch":
+                self.metrics["length_mismatches"] += 1
+                current = max(MIN_BATCH_ITEMS, min(current, size) / 2)
+            elif outcome == "ok" and size >= int(current):
+                current = min(MAX_BATCH_ITEMS, current + 1)
+            self._batch_items[model_name] = current
+
+    def record_fallbacks(self, count: int):
+        self.metrics["fallback_results"] += count
+
+    def stats(self) -> dict:
+        calls = self.metrics["model_calls"]
+        return {
+            **self.metrics,
+            "batch_items": {name: int(size) for name, size in self._batch_items.items()},
+            "segments_per_call": round(self.metrics["segments"] / calls, 2) if calls else 0.0,
+            "mismatch_rate": round(self.metrics["length_mismatches"] / calls, 4) if calls else 0.0,
+        }
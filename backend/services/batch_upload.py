@@ -0,0 +1,59 @@
+import os
+
+MAX_BATCH_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "200"))
+# Documents summarized per model call
+SUMMARY_GROUP_SIZE = int(os.getenv("UPLOAD_BATCH_SUMMARY_GROUP", "8"))
+# Leading characters of each document a summary sees (as for single uploads)
+SUMMARY_CHARS = 2000
+
+metrics = {
+    "batches": 0,
+    "documents": 0,
+    "failed_documents": 0,
+    "deduplicated_documents": 0,
+    "clauses": 0,
+    "summary_calls": 0,
+    "seconds": 0.0,
+}
+
+
+def pool_clauses(documents: list[list[str]]) -> tuple[list[str], list[tuple[int, int]]]:
+    """Concatenates per-document clause lists into one work list.
+
+    ``owners[i]`` is the (document position, clause index) that pooled clause
+    ``i`` came from, so results can be routed back.
+    """
+    pooled, owners = [], []
+    for position, clauses in enumerate(documents):
+        for index, clause in enumerate(clauses):
+            pooled.append(clause)
+            owners.append((position, index))
+    return pooled, owners
+
+
+def summary_groups(count: int, group_size: int = SUMMARY_GROUP_SIZE) -> list[range]:
+    return [range(start, min(start + group_size, count)) for start in range(0, count, group_size)]
+
+
+def throughput(documents: int, clauses: int, seconds: float) -> dict:
+    minutes = seconds / 60
+    return {
+        "documents": documents,
+        "clauses": clauses,
+        "seconds": round(seconds, 2),
+        "documents_per_minute": round(documents / minutes, 1) if minutes else 0.0,
+        "clauses_per_minute": round(clauses / minutes, 1) if minutes else 0.0,
+    }
+
+
+def record_batch(documents: int, failed: int, deduplicated: int, clauses: int, seconds: float):
+    metrics["batches"] += 1
+    metrics["documents"] += documents
+    metrics["failed_documents"] += failed
+    metrics["deduplicated_documents"] += deduplicated
+    metrics["clauses"] += clauses
+    metrics["seconds"] += seconds
+
+
+def stats() -> dict:
+    return {**metrics, **throughput(metrics["documents"], metrics["clauses"], metrics["seconds"])}
@@ -0,0 +1,230 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+
+from backend.services import document_cache, gemini_service, telemetry
+from backend.services.batch_planner import estimate_tokens
+
+# "auto" keeps large documents in a Gemini context cache; "off" always uses the local prefix
+CHAT_CONTEXT_CACHE = os.getenv("CHAT_CONTEXT_CACHE", "auto").lower()
+# Gemini rejects cached contents below this size; smaller documents answer from retrieved passages
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CHAT_CONTEXT_CACHE_MIN_TOKENS", "32768"))
+CONTEXT_CACHE_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_CACHE_MAX_TOKENS", "800000"))
+CHAT_CONTEXT_TTL_SECONDS = float(os.getenv("CHAT_CONTEXT_TTL_SECONDS", "3600"))
+# Gemini keeps a cache this much longer than we use it, so a turn never races its expiry
+CONTEXT_CACHE_TTL_MARGIN_SECONDS = 300
+# After a failed cache creation (quota, unsupported model) stay on local prefixes this long
+CONTEXT_CACHE_RETRY_SECONDS = 600
+CHAT_CONTEXT_CACHE_BYTES = int(os.getenv("CHAT_CONTEXT_CACHE_BYTES", str(8 * 1024 * 1024)))
+# Budget charged for a context held in a Gemini cache, which takes no local memory but
+# costs storage; with the default budget at most 16 documents hold one at a time
+CACHED_CONTEXT_NOMINAL_BYTES = int(os.getenv("CHAT_CACHED_CONTEXT_NOMINAL_BYTES", str(512 * 1024)))
+# An evicted context cache is deleted after this grace, so turns already using it can finish
+CONTEXT_CACHE_DELETE_DELAY_SECONDS = 120
+
+# History is per instance, like the document cache; a conversation that lands on
+# another instance (or outlives the TTL) continues without its earlier turns
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+CHAT_HISTORY_CHARS = int(os.getenv("CHAT_HISTORY_CHARS", "6000"))
+CHAT_CONVERSATION_LIMIT = int(os.getenv("CHAT_CONVERSATION_LIMIT", "2000"))
+CHAT_CONVERSATION_TTL_SECONDS = float(os.getenv("CHAT_CONVERSATION_TTL_SECONDS", "3600"))
+
+INSTRUCTIONS = """You are a helpful AI assistant for LawLytic. Answer the user's question based *only* on the provided legal document. Be friendly and clear.
+
+If the answer is not in the text, state that the document does not seem to provide that information."""
+
+metrics = {
+    "turns": 0,
+    "streamed_turns": 0,
+    "cached_turns": 0,
+    "contexts_built": 0,
+    "context_caches_created": 0,
+    "context_cache_failures": 0,
+    "context_caches_deleted": 0,
+    "history_trims": 0,
+    "prompt_tokens": 0,
+}
+
+chat_ttft_seconds = telemetry.registry.histogram(
+    "chat_ttft_seconds", "Time from a chat request to its first answer token.", ("mode", "stream")
+)
+chat_prompt_tokens = telemetry.registry.histogram(
+    "chat_prompt_tokens", "Estimated prompt tokens sent per chat turn (context-cached tokens excluded).", ("mode",),
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536),
+)
+
+
+class ChatContext:
+    """The stable part of a document's chat prompt, built once and reused across turns.
+
+    ``mode`` is "cached" when the whole document lives in a Gemini context
+    cache (``model`` is bound to it, and turns send only history and the
+    question), otherwise "local": ``prefix`` is prepended to each turn together
+    with the passages retrieved for that question.
+    """
+
+    def __init__(self, doc_id: str, mode: str, prefix: str, model=None, cache_name: str | None = None):
+        self.doc_id = doc_id
+        self.mode = mode
+        self.prefix = prefix
+        self.model = model
+        self.cache_name = cache_name
+
+    def cache_size(self) -> int:
+        """Bytes charged against the contexts' LRU budget."""
+        return CACHED_CONTEXT_NOMINAL_BYTES if self.mode == "cached" else len(self.prefix)
+
+
+def document_header(document_data: dict) -> str:
+    header = f"**Document:** {document_data.get('fileName') or 'Untitled document'}"
+    summary = document_data.get('summary')
+    if summary:
+        header += f"\n**Summary:** {summary}"
+    return header
+
+
+class ChatContexts:
+    """Per-document ChatContexts behind a TTL'd LRU with single-flight building."""
+
+    def __init__(self, max_bytes: int = CHAT_CONTEXT_CACHE_BYTES, ttl_seconds: float = CHAT_CONTEXT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._cache = document_cache.DocumentCache(max_bytes=max_bytes, ttl_seconds=ttl_seconds,
+                                                   on_evict=self._evicted)
+        self._cache_disabled_until = 0.0
+        self._deletions: set[asyncio.Task] = set()
+
+    def _evicted(self, doc_id: str, context: ChatContext):
+        if context.cache_name is None:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._delete_remote(context.cache_name))
+        except RuntimeError:
+            return  # no loop (shutdown); Gemini drops the cache at its TTL
+        self._deletions.add(task)
+        task.add_done_callback(self._deletions.discard)
+
+    async def _delete_remote(self, cache_name: str):
+        await asyncio.sleep(CONTEXT_CACHE_DELETE_DELAY_SECONDS)
+        try:
+            await gemini_service.uncache_context(cache_name)
+            metrics["context_caches_deleted"] += 1
+        except Exception as e:
+            telemetry.log(f"⚠️ Deleting context cache {cache_name} failed; it expires at its TTL: {e}",
+                          level="warning")
+
+    def _wants_cache(self, tokens: int) -> bool:
+        return (
+            CHAT_CONTEXT_CACHE != "off"
+            and CONTEXT_CACHE_MIN_TOKENS <= tokens <= CONTEXT_CACHE_MAX_TOKENS
+            and time.monotonic() >= self._cache_disabled_until
+        )
+
+    async def _build(self, doc_id: str, document_data: dict, text: str) -> ChatContext:
+        metrics["contexts_built"] += 1
+        header = document_header(document_data)
+        if self._wants_cache(estimate_tokens(text)):
+            try:
+                with telemetry.span("chat.context_cache"):
+                    model, cache_name = await gemini_service.cache_context(
+                        INSTRUCTIONS, f"{header}\n---\n{text}\n---",
+                        self.ttl_seconds + CONTEXT_CACHE_TTL_MARGIN_SECONDS,
+                    )
+                metrics["context_caches_created"] += 1
+                return ChatContext(doc_id, "cached", "", model, cache_name)
+            except Exception as e:
+                metrics["context_cache_failures"] += 1
+                self._cache_disabled_until = time.monotonic() + CONTEXT_CACHE_RETRY_SECONDS
+                telemetry.log(f"⚠️ Context caching failed for {doc_id}, using a local prefix: {e}", level="warning")
+        return ChatContext(doc_id, "local", f"{INSTRUCTIONS}\n\n{header}\n")
+
+    async def get(self, doc_id: str, document_data: dict, text: str) -> ChatContext:
+        return await self._cache.get(doc_id, lambda: self._build(doc_id, document_data, text))
+
+    def invalidate(self, doc_id: str):
+        self._cache.invalidate(doc_id)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+class Conversations:
+    """Bounded server-side chat history, keyed by conversation id and tied to one document."""
+
+    def __init__(self, limit: int = CHAT_CONVERSATION_LIMIT, ttl_seconds: float = CHAT_CONVERSATION_TTL_SECONDS,
+                 max_turns: int = CHAT_HISTORY_TURNS, max_chars: int = CHAT_HISTORY_CHARS):
+        self.limit = limit
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        # conversation id -> (last used, document id, [(question, answer), ...])
+        self._entries: OrderedDict[str, tuple[float, str, list[tuple[str, str]]]] = OrderedDict()
+
+    def open(self, conversation_id: str | None, doc_id: str) -> tuple[str, list[tuple[str, str]]]:
+        """Returns (conversation id, prior turns), starting a new conversation when needed.
+
+        Raises ValueError when the id belongs to a different document.
+        """
+        if not conversation_id:
+            return uuid.uuid4().hex, []
+        entry = self._entries.get(conversation_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            return conversation_id, []
+        if entry[1] != doc_id:
+            raise ValueError("Conversation belongs to a different document.")
+        return conversation_id, list(entry[2])
+
+    def append(self, conversation_id: str, doc_id: str, question: str, answer: str):
+        entry = self._entries.pop(conversation_id, None)
+        turns = list(entry[2]) if entry and entry[1] == doc_id else []
+        turns.append((question, answer))
+        trimmed = len(turns)
+        turns = turns[-self.max_turns:]
+        while len(turns) > 1 and sum(len(q) + len(a) for q, a in turns) > self.max_chars:
+            turns.pop(0)
+        if len(turns) < trimmed:
+            metrics["history_trims"] += 1
+        self._entries[conversation_id] = (time.monotonic(), doc_id, turns)
+        while len(self._entries) > self.limit:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def format_history(turns: list[tuple[str, str]]) -> str:
+    return "\n\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+
+
+def build_turn_prompt(context: ChatContext, turns: list[tuple[str, str]], question: str,
+                      excerpts: str | None = None) -> str:
+    """The prompt for one turn; in "cached" mode the document is already on the model's side."""
+    parts = [context.prefix] if context.prefix else []
+    if excerpts:
+        parts.append(f"**Relevant Document Excerpts:**\n---\n{excerpts}\n---")
+    if turns:
+        parts.append(f"**Conversation so far:**\n{format_history(turns)}")
+    parts.append(f'**User\'s Question:** "{question}"\n\n**Answer:**')
+    return "\n\n".join(parts)
+
+
+def record_turn(mode: str, prompt: str, ttft: float, streamed: bool):
+    tokens = estimate_tokens(prompt)
+    metrics["turns"] += 1
+    metrics["prompt_tokens"] += tokens
+    if streamed:
+        metrics["streamed_turns"] += 1
+    if mode == "cached":
+        metrics["cached_turns"] += 1
+    chat_prompt_tokens.observe(tokens, mode=mode)
+    chat_ttft_seconds.observe(ttft, mode=mode, stream=str(streamed).lower())
+
+
+def stats() -> dict:
+    turns = metrics["turns"]
+    return {
+        "context_cache": CHAT_CONTEXT_CACHE,
+        **metrics,
+        "prompt_tokens_per_turn": round(metrics["prompt_tokens"] / turns) if turns else 0,
+    }
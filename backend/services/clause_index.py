@@ -0,0 +1,286 @@
+import os
+import re
+import time
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from backend.services import telemetry
+
+CLAUSE_INDEX_PATH = os.getenv(
+    "CLAUSE_INDEX_PATH",
+    os.path.join(tempfile.gettempdir(), "lawlytics_clause_index.sqlite3"),
+)
+DEFAULT_SEARCH_LIMIT = int(os.getenv("CLAUSE_SEARCH_LIMIT", "20"))
+MAX_SEARCH_LIMIT = 100
+# BM25 weights of the indexed columns (original_text, plain_english)
+BM25_WEIGHTS = (1.0, 0.5)
+SNIPPET_TOKENS = 24
+RISK_LEVELS = ("Red", "Orange", "Green", "Gray")
+
+# Clause types, first match wins; everything else is "other"
+CLAUSE_TYPES = (
+    ("indemnity", re.compile(r"\bindemn|\bhold\s+harmless", re.IGNORECASE)),
+    ("limitation_of_liability", re.compile(r"\blimitation\s+of\s+liability|\bliab(?:le|ility)\b.{0,60}\b(?:exceed|cap|limit)", re.IGNORECASE)),
+    ("termination", re.compile(r"\bterminat", re.IGNORECASE)),
+    ("confidentiality", re.compile(r"\bconfidential|\bnon-?disclosure", re.IGNORECASE)),
+    ("payment", re.compile(r"\bpayment|\bfees?\b|\binvoice|\binterest\s+at", re.IGNORECASE)),
+    ("intellectual_property", re.compile(r"\bintellectual\s+property|\bcopyright|\bpatent|\btrademark", re.IGNORECASE)),
+    ("non_compete", re.compile(r"\bnon-?compet|\bnon-?solicit", re.IGNORECASE)),
+    ("governing_law", re.compile(r"\bgoverning\s+law|\bjurisdiction|\barbitrat", re.IGNORECASE)),
+    ("warranty", re.compile(r"\bwarrant|\bas\s+is\b", re.IGNORECASE)),
+    ("renewal", re.compile(r"\brenew", re.IGNORECASE)),
+    ("assignment", re.compile(r"\bassign", re.IGNORECASE)),
+    ("force_majeure", re.compile(r"\bforce\s+majeure", re.IGNORECASE)),
+)
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+metrics = {
+    "documents_indexed": 0,
+    "clauses_indexed": 0,
+    "searches": 0,
+    "analytics_queries": 0,
+}
+
+search_seconds = telemetry.registry.histogram(
+    "clause_search_seconds", "Clause index query time by kind.", ("kind",),
+)
+
+
+def classify_clause(text: str) -> str:
+    for clause_type, pattern in CLAUSE_TYPES:
+        if pattern.search(text):
+            return clause_type
+    return "other"
+
+
+def build_match_query(query: str, match_all: bool = True) -> str | None:
+    """FTS5 MATCH expression for free text; every term is quoted so user input is never FTS syntax."""
+    terms = [f'"{term}"' for term in _TERM_RE.findall(query.lower())]
+    if not terms:
+        return None
+    return (" AND " if match_all else " OR ").join(terms)
+
+
+def _month(created_at) -> str:
+    if not isinstance(created_at, datetime):
+        return "unknown"
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.strftime("%Y-%m")
+
+
+def clause_rows(doc_id: str, document: dict) -> list[tuple]:
+    """Index rows for each analyzed clause of a risk document."""
+    month = _month(document.get("createdAt"))
+    rows = []
+    for position, item in enumerate(document.get("fullAnalysis") or []):
+        original_text = item.get("original_text") or ""
+        if not original_text:
+            continue
+        rows.append((
+            document.get("userId"), doc_id, position, item.get("clause_id"), item.get("page"),
+            item.get("risk_level") or "Gray", classify_clause(original_text), month,
+            document.get("fileName"), original_text, item.get("plain_english") or "", item.get("source"),
+        ))
+    return rows
+
+
+class ClauseIndex:
+    """Per-user inverted index over analyzed clauses (SQLite FTS5, BM25-ranked).
+
+    ``clauses`` holds one row per clause with its facets; ``clauses_fts`` is an
+    external-content FTS5 table over its text columns. Re-indexing a document
+    replaces its rows, so uploads update the index incrementally.
+    """
+
+    def __init__(self, path: str = CLAUSE_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS clauses ("
+            " rowid INTEGER PRIMARY KEY, user_id TEXT NOT NULL, doc_id TEXT NOT NULL, position INTEGER NOT NULL,"
+            " clause_id TEXT, page INTEGER, risk_level TEXT NOT NULL, clause_type TEXT NOT NULL,"
+            " month TEXT NOT NULL, file_name TEXT, original_text TEXT NOT NULL, plain_english TEXT NOT NULL,"
+            " source TEXT);"
+            "CREATE INDEX IF NOT EXISTS clauses_doc ON clauses (doc_id);"
+            "CREATE INDEX IF NOT EXISTS clauses_user_facets ON clauses (user_id, risk_level, clause_type, month, doc_id);"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS clauses_fts USING fts5("
+            " original_text, plain_english, content='clauses', content_rowid='rowid',"
+            " tokenize='porter unicode61');"
+            "CREATE TABLE IF NOT EXISTS indexed_users (user_id TEXT PRIMARY KEY, indexed_at REAL NOT NULL);"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(clauses)")}
+        if "source" not in columns:
+            # Indexes created before analyses recorded where they came from
+            self._conn.execute("ALTER TABLE clauses ADD COLUMN source TEXT")
+        self._conn.commit()
+
+    def _delete_locked(self, doc_id: str):
+        # External-content FTS rows are removed with the special 'delete' command
+        self._conn.execute(
+            "INSERT INTO clauses_fts (clauses_fts, rowid, original_text, plain_english)"
+            " SELECT 'delete', rowid, original_text, plain_english FROM clauses WHERE doc_id = ?",
+            (doc_id,),
+        )
+        self._conn.execute("DELETE FROM clauses WHERE doc_id = ?", (doc_id,))
+
+    def index_document(self, doc_id: str, document: dict) -> int:
+        """Replaces a document's clauses in the index (blocking); returns the clause count."""
+        rows = clause_rows(doc_id, document) if document.get("analysisType") == "risk" else []
+        with self._lock:
+            self._delete_locked(doc_id)
+            for row in rows:
+                cursor = self._conn.execute(
+                    "INSERT INTO clauses (user_id, doc_id, position, clause_id, page, risk_level, clause_type,"
+                    " month, file_name, original_text, plain_english, source)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                self._conn.execute(
+                    "INSERT INTO clauses_fts (rowid, original_text, plain_english) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, row[9], row[10]),
+                )
+            self._conn.commit()
+        metrics["documents_indexed"] += 1
+        metrics["clauses_indexed"] += len(rows)
+        return len(rows)
+
+    def delete_document(self, doc_id: str):
+        with self._lock:
+            self._delete_locked(doc_id)
+            self._conn.commit()
+
+    def is_user_indexed(self, user_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM indexed_users WHERE user_id = ?", (user_id,)
+            ).fetchone() is not None
+
+    def mark_user_indexed(self, user_id: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO indexed_users (user_id, indexed_at) VALUES (?, ?)", (user_id, time.time())
+            )
+            self._conn.commit()
+
+    def labelled_clauses(self, limit: int) -> list[tuple[str, str]]:
+        """Most recent distinct (text, risk_level) pairs labelled by the model, across all users."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT original_text, risk_level FROM clauses"
+                " WHERE source IS NULL AND risk_level IN ('Red', 'Orange', 'Green')"
+                " GROUP BY original_text ORDER BY MAX(rowid) DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+    @staticmethod
+    def _filters(user_id: str, risk_levels: list[str] | None, clause_type: str | None,
+                 month_from: str | None, month_to: str | None) -> tuple[str, list]:
+        clauses, params = ["c.user_id = ?"], [user_id]
+        if risk_levels:
+            clauses.append(f"c.risk_level IN ({', '.join('?' * len(risk_levels))})")
+            params.extend(risk_levels)
+        if clause_type:
+            clauses.append("c.clause_type = ?")
+            params.append(clause_type)
+        if month_from:
+            clauses.append("c.month >= ?")
+            params.append(month_from)
+        if month_to:
+            clauses.append("c.month <= ?")
+            params.append(month_to)
+        return " AND ".join(clauses), params
+
+    def search(self, user_id: str, query: str, limit: int = DEFAULT_SEARCH_LIMIT, offset: int = 0,
+               risk_levels: list[str] | None = None, clause_type: str | None = None,
+               month_from: str | None = None, month_to: str | None = None,
+               match_all: bool = True) -> dict:
+        """BM25-ranked clauses matching ``query`` (blocking), with per-risk counts of all matches."""
+        started = time.perf_counter()
+        match = build_match_query(query, match_all)
+        if match is None:
+            return {"results": [], "total": 0, "riskCounts": {}}
+        where, params = self._filters(user_id, risk_levels, clause_type, month_from, month_to)
+        weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+        # CROSS JOIN pins the FTS table as the outer loop; otherwise SQLite may walk
+        # every clause of the user and re-run MATCH per row
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT c.doc_id, c.file_name, c.position, c.clause_id, c.page, c.risk_level, c.clause_type,"
+                f" c.month, c.original_text, c.plain_english, bm25(clauses_fts, {weights}) AS score,"
+                f" snippet(clauses_fts, 0, '[', ']', ' … ', {SNIPPET_TOKENS})"
+                f" FROM clauses_fts CROSS JOIN clauses c ON c.rowid = clauses_fts.rowid"
+                f" WHERE clauses_fts MATCH ? AND {where} ORDER BY score LIMIT ? OFFSET ?",
+                [match, *params, limit, offset],
+            ).fetchall()
+            counts = self._conn.execute(
+                f"SELECT c.risk_level, COUNT(*) FROM clauses_fts CROSS JOIN clauses c ON c.rowid = clauses_fts.rowid"
+                f" WHERE clauses_fts MATCH ? AND {where} GROUP BY c.risk_level",
+                [match, *params],
+            ).fetchall()
+        metrics["searches"] += 1
+        search_seconds.observe(time.perf_counter() - started, kind="search")
+        results = [{
+            "documentId": doc_id, "fileName": file_name, "index": position, "clause_id": clause_id,
+            "page": page, "risk_level": risk_level, "clauseType": clause_type_, "month": month,
+            "original_text": original_text, "plain_english": plain_english,
+            # bm25() is lower-is-better; flip it so larger scores rank higher
+            "score": round(-score, 4), "snippet": snippet,
+        } for (doc_id, file_name, position, clause_id, page, risk_level, clause_type_, month,
+               original_text, plain_english, score, snippet) in rows]
+        risk_counts = {risk_level.lower(): count for risk_level, count in counts}
+        return {"results": results, "total": sum(risk_counts.values()), "riskCounts": risk_counts}
+
+    def analytics(self, user_id: str, risk_levels: list[str] | None = ("Red", "Orange"),
+                  clause_type: str | None = None, month_from: str | None = None,
+                  month_to: str | None = None) -> dict:
+        """Risk counts faceted by clause type and by month (blocking)."""
+        started = time.perf_counter()
+        where, params = self._filters(user_id, list(risk_levels or []), clause_type, month_from, month_to)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT c.clause_type, c.month, c.risk_level, COUNT(*)"
+                f" FROM clauses c WHERE {where} GROUP BY c.clause_type, c.month, c.risk_level",
+                params,
+            ).fetchall()
+            documents = self._conn.execute(
+                f"SELECT COUNT(DISTINCT c.doc_id) FROM clauses c WHERE {where}", params
+            ).fetchone()[0]
+        metrics["analytics_queries"] += 1
+        search_seconds.observe(time.perf_counter() - started, kind="analytics")
+
+        totals: dict[str, int] = {}
+        by_type: dict[str, dict[str, int]] = {}
+        by_month: dict[str, dict[str, int]] = {}
+        for clause_type_, month, risk_level, count in rows:
+            key = risk_level.lower()
+            totals[key] = totals.get(key, 0) + count
+            for facet, value in ((by_type, clause_type_), (by_month, month)):
+                bucket = facet.setdefault(value, {"total": 0})
+                bucket[key] = bucket.get(key, 0) + count
+                bucket["total"] += count
+        return {
+            "totals": {**totals, "total": sum(totals.values())},
+            "documents": documents,
+            "byClauseType": sorted(
+                ({"clauseType": value, **counts} for value, counts in by_type.items()),
+                key=lambda bucket: -bucket["total"],
+            ),
+            "byMonth": sorted(
+                ({"month": value, **counts} for value, counts in by_month.items()),
+                key=lambda bucket: bucket["month"],
+            ),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            clauses, documents = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT doc_id) FROM clauses"
+            ).fetchone()
+            users = self._conn.execute("SELECT COUNT(*) FROM indexed_users").fetchone()[0]
+        return {**metrics, "clauses": clauses, "documents": documents, "backfilled_users": users}
@@ -0,0 +1,257 @@
+import re
+import hashlib
+from dataclasses import dataclass, asdict
+
+from backend.services.document_ai_service import ExtractedDocument, Page, iter_text_pages
+
+# Clauses shorter than this are treated as noise (same threshold as the old splitter)
+MIN_CLAUSE_CHARS = 26
+# Lines seen in the top/bottom band of at least this share of pages are running headers/footers
+REPEATED_LINE_PAGE_SHARE = 0.6
+EDGE_LINES = 3
+
+_ROMAN = r"(?:[IVXLC]+|[ivxlc]+)"
+# Numbered clause starts: "1.", "1.1", "2.3.4)", "(a)", "(iv)", "a)", "Article IV", "Section 3.2", "Clause 7"
+NUMBERING_RE = re.compile(
+    r"^\s*(?:"
+    r"(?P<dotted>\d{1,3}(?:\.\d{1,3}){0,4}[.)]?)(?=\s)"
+    r"|\((?P<paren>[a-zA-Z]|\d{1,3}|" + _ROMAN + r")\)"
+    r"|(?P<letter>[a-z]|" + _ROMAN + r")\)(?=\s)"
+    r"|(?P<keyword>(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule)\s+(?:\d{1,3}(?:\.\d{1,3})*|" + _ROMAN + r"|[A-Z]))\b"
+    r")"
+)
+_PAGE_NUMBER_RE = re.compile(r"^\s*(?:page\s*)?[-–]?\s*\d{1,4}\s*(?:of\s*\d{1,4})?\s*[-–]?\s*$", re.IGNORECASE)
+_DIGITS_RE = re.compile(r"\d+")
+_TERMINAL_RE = re.compile(r"[.;:!?)\]\"”]\s*$")
+_HYPHEN_END_RE = re.compile(r"[A-Za-z]-$")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class Clause:
+    id: str
+    text: str
+    number: str | None
+    heading: str | None
+    page: int
+    start: int
+    end: int
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _edge_key(line: str) -> str:
+    return _DIGITS_RE.sub("#", _WHITESPACE_RE.sub(" ", line.strip().lower()))
+
+
+def find_repeated_edge_lines(pages: list[Page]) -> set[str]:
+    """Normalized header/footer lines repeated across most pages."""
+    if len(pages) < 3:
+        return set()
+    counts: dict[str, int] = {}
+    for page in pages:
+        lines = [line for line in page.text.splitlines() if line.strip()]
+        # Short pages have no separable header/footer band
+        band = min(EDGE_LINES, len(lines) // 3)
+        if not band:
+            continue
+        seen = {
+            _edge_key(line) for line in lines[:band] + lines[-band:]
+            if not NUMBERING_RE.match(line)
+        }
+        for key in seen:
+            counts[key] = counts.get(key, 0) + 1
+    threshold = max(3, int(len(pages) * REPEATED_LINE_PAGE_SHARE))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def boilerplate_lines(page: Page, repeated: set[str]) -> set[int]:
+    """Indexes of the page's running header/footer lines.
+
+    Only the runs of page numbers and repeated lines at the very top and bottom
+    of a page qualify, and a repeated line only when it stands apart from the
+    page's text: in a layout block of its own, or (plain text) set off by a
+    blank line. A repeated line inside an open paragraph is clause text.
+    """
+    raw_lines = page.text.splitlines()
+    has_layout = any(block.x1 for block in page.blocks)
+
+    def is_page_number(index: int) -> bool:
+        return bool(_PAGE_NUMBER_RE.match(raw_lines[index]))
+
+    def is_repeated(index: int) -> bool:
+        return bool(repeated) and _edge_key(raw_lines[index]) in repeated
+
+    def edge_run(indexes) -> list[int]:
+        """Blank, page-number and repeated lines from one edge up to the first other line."""
+        run = []
+        for index in indexes:
+            if raw_lines[index].strip() and not is_page_number(index) and not is_repeated(index):
+                break
+            run.append(index)
+        return run
+
+    skipped: set[int] = set()
+    top = edge_run(range(len(raw_lines)))
+    bottom = edge_run(range(len(raw_lines) - 1, len(top) - 1, -1))
+
+    # Edge lines that share a layout block with text other than page numbers and repeated lines
+    edge_text = {raw_lines[index].strip() for index in top + bottom if is_repeated(index)}
+    in_paragraph: set[str] = set()
+    for block in page.blocks if has_layout and edge_text else ():
+        block_lines = [line.strip() for line in block.text.splitlines() if line.strip()]
+        if not edge_text.intersection(block_lines):
+            continue
+        if any(not _PAGE_NUMBER_RE.match(line) and _edge_key(line) not in repeated for line in block_lines):
+            in_paragraph.update(block_lines)
+    for run in (top, bottom):
+        if has_layout:
+            apart = {index for index in run if raw_lines[index].strip() not in in_paragraph}
+        elif len(top) + len(bottom) == len(raw_lines):
+            apart = set(run)  # nothing but boilerplate on the page
+        else:
+            # Plain text: only what a blank line separates from the page's text
+            blanks = [position for position, index in enumerate(run) if not raw_lines[index].strip()]
+            apart = set(run[:blanks[-1]]) if blanks else set()
+        skipped.update(index for index in run if is_page_number(index) or (index in apart and is_repeated(index)))
+    return skipped
+
+
+# Headings are short titles, never a wrapped paragraph
+MAX_HEADING_WORDS = 10
+
+
+def _is_heading(line: str) -> bool:
+    """Short title lines: all caps, or a numbered title-case line without terminal punctuation."""
+    stripped = line.strip()
+    if len(stripped) > 80 or _TERMINAL_RE.search(stripped) or len(stripped.split()) > MAX_HEADING_WORDS:
+        return False
+    letters = [c for c in stripped if c.isalpha()]
+    if not letters:
+        return False
+    if all(c.isupper() for c in letters):
+        return True
+    match = NUMBERING_RE.match(stripped)
+    if not match:
+        return False
+    words = [w for w in stripped[match.end():].split() if len(w) > 3 and w[0].isalpha()]
+    return bool(words) and len(words) <= 6 and all(w[0].isupper() for w in words)
+
+
+def _numbering(line: str) -> str | None:
+    match = NUMBERING_RE.match(line)
+    if not match:
+        return None
+    return next(value for value in match.groupdict().values() if value)
+
+
+def _stable_id(text: str, occurrence: int) -> str:
+    normalized = _WHITESPACE_RE.sub(" ", text).strip().casefold()
+    return "c_" + hashlib.sha1(f"{normalized}\x00{occurrence}".encode("utf-8")).hexdigest()[:12]
+
+
+def segment_document(document: ExtractedDocument) -> list[Clause]:
+    """Single pass over the document's lines, rebuilding clauses across soft line breaks."""
+    repeated = find_repeated_edge_lines(document.pages)
+    clauses: list[Clause] = []
+    occurrences: dict[str, int] = {}
+
+    parts: list[str] = []
+    number = heading = None
+    clause_page = clause_start = clause_end = 0
+
+    def flush():
+        nonlocal parts, number
+        if parts:
+            text = "".join(parts).strip()
+            if len(text) >= MIN_CLAUSE_CHARS and not text.isdigit():
+                normalized = _WHITESPACE_RE.sub(" ", text).casefold()
+                occurrence = occurrences.get(normalized, 0)
+                occurrences[normalized] = occurrence + 1
+                clauses.append(Clause(
+                    id=_stable_id(text, occurrence),
+                    text=text,
+                    number=number,
+                    heading=heading,
+                    page=clause_page,
+                    start=clause_start,
+                    end=clause_end,
+                ))
+        parts, number = [], None
+
+    # (page, raw line, offset, ends a layout block) for every line that can carry clause text
+    lines: list[tuple[Page, str, int, bool]] = []
+    has_layout: dict[int, bool] = {}
+    offset = 0
+    for page in document.pages:
+        has_layout[page.number] = any(block.x1 for block in page.blocks)
+        block_ends = {block.text.strip().splitlines()[-1].strip() for block in page.blocks if block.text.strip()}
+        skipped = boilerplate_lines(page, repeated)
+        for index, raw_line in enumerate(page.text.splitlines(keepends=True)):
+            line_start, offset = offset, offset + len(raw_line)
+            if index in skipped:
+                continue  # running header/footer or page number; does not break the clause
+            line = raw_line.strip()
+            lines.append((page, raw_line, line_start, line in block_ends))
+
+    def ends_paragraph(position: int) -> bool:
+        """Whether a break (blank line, end of a layout block or of the text) follows this line."""
+        if lines[position][3] or position + 1 == len(lines):
+            return True
+        return not lines[position + 1][1].strip()
+
+    def starts_clause(position: int) -> bool:
+        return position + 1 < len(lines) and _numbering(lines[position + 1][1].strip()) is not None
+
+    previous_break = True
+    for position, (page, raw_line, line_start, is_block_end) in enumerate(lines):
+        line = raw_line.strip()
+        if not line:
+            flush()
+            previous_break = True
+            continue
+
+        # Numbering or a heading only counts at a paragraph boundary; mid-paragraph it
+        # is a wrapped line that happens to begin with "30 days" or "Schedule A"
+        at_boundary = not parts or previous_break or bool(_TERMINAL_RE.search(parts[-1]))
+        line_number = _numbering(line) if at_boundary else None
+        previous_break = is_block_end
+
+        if (at_boundary and _is_heading(line)
+                and (ends_paragraph(position) or starts_clause(position))):
+            flush()
+            heading = line
+            previous_break = True
+            continue
+
+        if line_number or not parts:
+            flush()
+            number = line_number
+            clause_page, clause_start = page.number, line_start
+            parts.append(line)
+        elif _HYPHEN_END_RE.search(parts[-1]) and line[:1].islower():
+            parts[-1] = parts[-1][:-1] + line  # re-join a hyphenated word
+        else:
+            parts.append(" " + line)
+        clause_end = line_start + len(raw_line.rstrip())
+
+        # PDF layout blocks mark paragraph ends; plain text has no layout, so a line
+        # ending in terminal punctuation ends the clause instead
+        if _TERMINAL_RE.search(line) and (is_block_end or not has_layout[page.number]):
+            flush()
+    flush()
+    return clauses
+
+
+def segment_text(text: str) -> list[Clause]:
+    """Segments plain text, treating form feeds as page breaks."""
+    return segment_document(ExtractedDocument(list(iter_text_pages(text))))
+
+
+def legacy_split(full_text: str) -> list[str]:
+    """The original newline splitter, kept for benchmarks and comparisons."""
+    return [
+        cleaned for clause in full_text.split('\n')
+        if (cleaned := clause.strip()) and len(cleaned) > 25 and not cleaned.isdigit()
+    ]
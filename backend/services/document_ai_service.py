@@ -0,0 +1,218 @@
+import os
+import asyncio
+import functools
+import tempfile
+import multiprocessing
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from backend.services import telemetry
+from backend.services.executor import run_blocking
+
+# PDFs with at least this many pages are fanned out across worker processes
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "64"))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+EXTRACTION_PROCESSES = int(os.getenv("PDF_EXTRACTION_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+SUPPORTED_CONTENT_TYPES = ('application/pdf', 'text/plain')
+
+
+class UnsupportedDocumentError(ValueError):
+    """Raised for content types the extractor cannot read."""
+
+
+@dataclass
+class TextBlock:
+    """A layout block: a paragraph-like run of text with its bounding box."""
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    text: str
+
+
+@dataclass
+class Page:
+    number: int
+    text: str
+    blocks: list[TextBlock] = field(default_factory=list)
+    height: float = 0.0
+
+
+@dataclass
+class ExtractedDocument:
+    pages: list[Page]
+
+    @functools.cached_property
+    def text(self) -> str:
+        """Full text, concatenated the same way the upload handler always has; built once."""
+        return "".join(page.text for page in self.pages)
+
+    def page_offsets(self) -> list[int]:
+        """Character offset of each page's start within ``text``."""
+        offsets, position = [], 0
+        for page in self.pages:
+            offsets.append(position)
+            position += len(page.text)
+        return offsets
+
+
+def _page_from_fitz(page, number: int) -> Page:
+    import fitz
+
+    # One textpage with the flags of page.get_text(), walked once: its plain text
+    # is exactly the text blocks concatenated in content order
+    raw_blocks = [block for block in page.get_textpage(flags=fitz.TEXTFLAGS_TEXT).extractBLOCKS() if block[6] == 0]
+    text = "".join(block[4] for block in raw_blocks)
+    # Reading order, as get_text("blocks", sort=True) gives it
+    raw_blocks.sort(key=lambda block: (block[3], block[0]))
+    blocks = [
+        TextBlock(x0, y0, x1, y1, block_text.strip())
+        for x0, y0, x1, y1, block_text, _, _ in raw_blocks
+        if block_text.strip()
+    ]
+    return Page(number=number, text=text, blocks=blocks, height=page.rect.height)
+
+
+def _extract_pages(doc, start: int, end: int) -> list[Page]:
+    return [_page_from_fitz(doc.load_page(number), number) for number in range(start, min(end, doc.page_count))]
+
+
+def open_pdf(contents: bytes):
+    import fitz
+
+    return fitz.open(stream=contents, filetype="pdf")
+
+
+# (path, document) last opened by this worker process. A worker usually gets
+# several ranges of the same upload, so the file is opened once per upload.
+_worker_document = None
+
+
+def extract_page_range(path: str, start: int, end: int) -> list[Page]:
+    """Process-pool entry point: extracts pages [start, end) of the PDF at ``path``.
+
+    Tasks carry a path rather than the PDF bytes, so the document is not
+    pickled into every task.
+    """
+    global _worker_document
+    import fitz
+
+    if _worker_document is None or _worker_document[0] != path:
+        if _worker_document is not None:
+            _worker_document[1].close()
+        _worker_document = (path, fitz.open(path))
+    return _extract_pages(_worker_document[1], start, end)
+
+
+def _spill_to_file(contents: bytes) -> str:
+    """Writes the upload where pool workers can open it; the caller removes the file."""
+    fd, path = tempfile.mkstemp(prefix="lawlytics-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(contents)
+    return path
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def iter_text_pages(text: str):
+    """Treats form feeds as page breaks and blank-line separated runs as blocks."""
+    for number, page_text in enumerate(text.split("\f")):
+        blocks = [TextBlock(0, 0, 0, 0, para.strip()) for para in page_text.split("\n\n") if para.strip()]
+        yield Page(number=number, text=page_text, blocks=blocks)
+
+
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_failed = False
+
+
+def _get_process_pool() -> ProcessPoolExecutor | None:
+    """Lazily starts the extraction pool; returns None where processes are unavailable."""
+    global _process_pool, _process_pool_failed
+    if _process_pool is None and not _process_pool_failed and EXTRACTION_PROCESSES > 1:
+        try:
+            # spawn, not fork: the server process has live threads and an event loop
+            _process_pool = ProcessPoolExecutor(
+                max_workers=EXTRACTION_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+            )
+        except (OSError, NotImplementedError) as e:
+            # e.g. serverless sandboxes without /dev/shm
+            telemetry.log(f"⚠️ PDF process pool unavailable, extracting in-thread: {e}", level="warning")
+            _process_pool_failed = True
+    return _process_pool
+
+
+def _disable_process_pool():
+    global _process_pool, _process_pool_failed
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+    _process_pool, _process_pool_failed = None, True
+
+
+async def stream_page_ranges(contents: bytes):
+    """Async generator of (first page number, pages) per page range, as each range finishes.
+
+    In-thread extraction opens the PDF once and yields ranges in order. Large
+    PDFs are fanned out to the process pool, whose ranges may finish out of
+    order; if the pool breaks, the remaining ranges are extracted in-thread.
+    """
+    doc = await run_blocking(open_pdf, contents)
+    try:
+        page_count = doc.page_count
+        ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+        pool = _get_process_pool() if page_count >= PARALLEL_PAGE_THRESHOLD else None
+        if pool is None:
+            for start, end in ranges:
+                yield start, await run_blocking(_extract_pages, doc, start, end)
+            return
+
+        path = await run_blocking(_spill_to_file, contents)
+        pending = {}
+        try:
+            loop = asyncio.get_running_loop()
+            for start, end in ranges:
+                if not _process_pool_failed:
+                    try:
+                        pending[loop.run_in_executor(pool, extract_page_range, path, start, end)] = (start, end)
+                        continue
+                    except (OSError, BrokenProcessPool, RuntimeError) as e:
+                        telemetry.log(f"⚠️ PDF process pool failed, extracting in-thread: {e}", level="warning")
+                        _disable_process_pool()
+                yield start, await run_blocking(_extract_pages, doc, start, end)
+
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    start, end = pending.pop(future)
+                    try:
+                        pages = future.result()
+                    except BrokenProcessPool as e:
+                        # A worker died (e.g. out of memory); every outstanding range fails the same way
+                        if not _process_pool_failed:
+                            telemetry.log(f"⚠️ PDF process pool failed, extracting in-thread: {e}", level="warning")
+                            _disable_process_pool()
+                        pages = await run_blocking(_extract_pages, doc, start, end)
+                    yield start, pages
+        finally:
+            for future in pending:
+                future.cancel()
+            await run_blocking(_remove_file, path)
+    finally:
+        await run_blocking(doc.close)
+
+
+async def extract_document(contents: bytes, content_type: str | None) -> ExtractedDocument:
+    """Extracts every page with its layout blocks."""
+    if content_type not in SUPPORTED_CONTENT_TYPES:
+        raise UnsupportedDocumentError(f"Unsupported content type: {content_type}")
+    if content_type == 'text/plain':
+        return ExtractedDocument(list(iter_text_pages(contents.decode('utf-8'))))
+    # Ranges are placed as they finish instead of being streamed back in order page by page
+    ranges = {start: pages async for start, pages in stream_page_ranges(contents)}
+    return ExtractedDocument([page for start in sorted(ranges) for page in ranges[start]])
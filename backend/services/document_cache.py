@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+
+DOCUMENT_CACHE_BYTES = int(os.getenv("DOCUMENT_CACHE_BYTES", str(64 * 1024 * 1024)))
+# Invalidation is per instance; the TTL bounds staleness across serverless instances
+DOCUMENT_CACHE_TTL_SECONDS = float(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", "300"))
+
+
+def estimate_size(value) -> int:
+    """Approximate in-memory footprint, measured as the serialized size."""
+    if isinstance(value, str):
+        return len(value)
+    if hasattr(value, "cache_size"):
+        return value.cache_size()
+    return len(json.dumps(value, default=str))
+
+
+class DocumentCache:
+    """Async read-through LRU bounded by bytes, with single-flight loading.
+
+    Concurrent misses for the same key share one loader call. Values are
+    shared between callers and must be treated as read-only. ``on_evict(key,
+    value)`` is called for every stored value that leaves the cache, whether
+    expired, evicted, replaced or invalidated.
+    """
+
+    def __init__(self, max_bytes: int = DOCUMENT_CACHE_BYTES, ttl_seconds: float = DOCUMENT_CACHE_TTL_SECONDS,
+                 on_evict=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self.bytes = 0
+        self._entries: OrderedDict[str, tuple[float, int, object]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        # Bumped on invalidation so a load that started earlier is not stored
+        self._generations: dict[str, int] = {}
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "oversized": 0,
+        }
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, size, value = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+            if self.on_evict is not None:
+                self.on_evict(key, entry[2])
+
+    def _store(self, key: str, value):
+        size = estimate_size(value)
+        if size > self.max_bytes // 4:
+            self.metrics["oversized"] += 1
+            return
+        self._drop(key)
+        self._entries[key] = (time.monotonic(), size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.metrics["evictions"] += 1
+
+    async def get(self, key: str, loader):
+        """Returns the cached value or awaits ``loader()``; None results are not cached."""
+        value = self._lookup(key)
+        if value is not None:
+            self.metrics["hits"] += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.metrics["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        self.metrics["misses"] += 1
+        generation = self._generations.get(key, 0)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            if value is not None and self._generations.get(key, 0) == generation:
+                self._store(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+            self._generations.pop(key, None)
+
+    def invalidate(self, key: str):
+        if key in self._inflight:
+            self._generations[key] = self._generations.get(key, 0) + 1
+        self._drop(key)
+        self.metrics["invalidations"] += 1
+
+    def stats(self) -> dict:
+        lookups = self.metrics["hits"] + self.metrics["misses"] + self.metrics["coalesced"]
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round((self.metrics["hits"] + self.metrics["coalesced"]) / lookups, 4) if lookups else 0.0,
+        }
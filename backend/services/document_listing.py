@@ -0,0 +1,95 @@
+import os
+import json
+import base64
+from datetime import datetime, timezone
+
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DOCUMENTS_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = 200
+
+# The only fields the history view renders; everything else stays on the server
+LISTING_FIELDS = ("userId", "fileName", "analysisType", "summary", "riskCounts", "status", "createdAt")
+
+_EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
+
+class InvalidCursorError(ValueError):
+    """Raised for cursors that were not produced by encode_cursor."""
+
+
+# Stores a cursor can come from; a cursor is only valid against the store that issued it
+FIRESTORE = "firestore"
+LOCAL = "local"
+
+
+def encode_cursor(created_at: datetime, doc_id: str, source: str = FIRESTORE) -> str:
+    """Opaque cursor pointing just past (created_at, doc_id) in newest-first order."""
+    payload = json.dumps({"t": created_at.isoformat(), "id": doc_id, "s": source}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _load_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, dict):
+            raise TypeError("not an object")
+        return payload
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}") from e
+
+
+def cursor_source(cursor: str) -> str:
+    """The store that issued the cursor; cursors from before sources were recorded are Firestore's."""
+    return str(_load_cursor(cursor).get("s", FIRESTORE))
+
+
+def decode_cursor(cursor: str, source: str = FIRESTORE) -> tuple[datetime, str]:
+    payload = _load_cursor(cursor)
+    if payload.get("s", FIRESTORE) != source:
+        raise InvalidCursorError(f"Invalid cursor: issued by {payload.get('s')}, not {source}")
+    try:
+        return datetime.fromisoformat(payload["t"]), str(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}") from e
+
+
+def _created_at(document: dict) -> datetime:
+    created_at = document.get("createdAt")
+    if not isinstance(created_at, datetime):
+        return _EPOCH
+    return created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+
+
+def project(document: dict, doc_id: str) -> dict:
+    listing = {field: document[field] for field in LISTING_FIELDS if field in document}
+    listing["id"] = doc_id
+    return listing
+
+
+def query_firestore_page(db, user_id: str, limit: int, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """One newest-first page of a user's documents (blocking).
+
+    Needs the composite index (userId ASC, createdAt DESC, __name__ DESC) from
+    firestore.indexes.json.
+    """
+    from google.cloud import firestore
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    query = (db.collection("documents")
+             .where(filter=FieldFilter("userId", "==", user_id))
+             .order_by("createdAt", direction=firestore.Query.DESCENDING)
+             .order_by("__name__", direction=firestore.Query.DESCENDING)
+             .select(list(LISTING_FIELDS))
+             .limit(limit + 1))
+    if cursor:
+        created_at, doc_id = decode_cursor(cursor)
+        query = query.start_after({"createdAt": created_at, "__name__": db.collection("documents").document(doc_id)})
+
+    snapshots = list(query.stream())
+    documents = [project(snapshot.to_dict(), snapshot.id) for snapshot in snapshots[:limit]]
+    next_cursor = None
+    if len(snapshots) > limit:
+        last = documents[-1]
+        next_cursor = encode_cursor(_created_at(last), last["id"])
+    return documents, next_cursor
@@ -0,0 +1,15 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads available for blocking SDK calls (Firestore, Vercel Blob, PyMuPDF, SQLite)
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="lawlytics-io")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking callable on the shared bounded pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
@@ -1,13 +1,453 @@
 import os
 import json
-import google.generativeai as genai
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+import contextlib
+from backend.services.batch_planner import estimate_tokens
+from backend.services import structured_output, telemetry
+from backend.services.executor import run_blocking
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))  #type: ignore
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:
+    google_exceptions = None
 
 # Use Gemini 1.5 Flash for speed and cost-effectiveness
-model = genai.GenerativeModel('gemini-1.5-flash') #type: ignore
+MODEL_NAME = 'gemini-1.5-flash'
+# Context caching needs an explicitly versioned model
+CACHE_MODEL_NAME = os.getenv("GEMINI_CACHE_MODEL", "models/gemini-1.5-flash-001")
+# Built by get_model() on the first call; the SDK import alone is a large share of cold start
+model = None
+_model_lock = threading.Lock()
 
-def analyze_clauses_batch(clauses: list[str]) -> list[dict]:
+
+def get_model():
+    """The shared GenerativeModel, configured on first use and reused across warm invocations."""
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))  #type: ignore
+                model = genai.GenerativeModel(MODEL_NAME) #type: ignore
+    return model
+
+# --- Process-wide request scheduling ---
+# Lower value = served first when capacity is scarce
+PRIORITY_CHAT = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BULK = 2
+
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("GEMINI_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Output tokens budgeted per call on top of the prompt estimate
+OUTPUT_TOKEN_ALLOWANCE = 512
+
+
+gemini_call_seconds = telemetry.registry.histogram(
+    "gemini_call_seconds", "Latency of individual Gemini calls, retries included separately.", ("outcome",)
+)
+gemini_tokens = telemetry.registry.counter(
+    "gemini_tokens_total", "Gemini tokens by direction (usage metadata when reported, else estimated).", ("direction",)
+)
+gemini_errors = telemetry.registry.counter(
+    "gemini_errors_total", "Failed Gemini calls by kind (quota = 429).", ("kind",)
+)
+
+
+def _response_usage(response, prompt_tokens: int, text: str | None = None) -> tuple[int, int]:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "prompt_token_count", None):
+        cached = getattr(usage, "cached_content_token_count", 0) or 0
+        if cached:
+            gemini_tokens.inc(cached, direction="cached")
+        return usage.prompt_token_count, getattr(usage, "candidates_token_count", 0) or 0
+    try:
+        return prompt_tokens, estimate_tokens(response.text if text is None else text)
+    except Exception:
+        return prompt_tokens, 0
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text
+    except Exception:
+        return ""  # a chunk with no text part (e.g. only finish metadata)
+
+
+class GeminiUnavailableError(Exception):
+    """Raised without calling the model while the quota circuit breaker is open."""
+
+
+def is_quota_error(e: Exception) -> bool:
+    if google_exceptions and isinstance(e, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return True
+    message = str(e).lower()
+    return "429" in message or "quota" in message or "resource exhausted" in message
+
+
+def is_transient_error(e: Exception) -> bool:
+    if isinstance(e, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if google_exceptions and isinstance(e, (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+    )):
+        return True
+    return False
+
+
+class TokenBucket:
+    """Continuous-refill bucket; ``capacity`` units per ``period`` seconds."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` units are available (0 when available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self):
+        """Empties the bucket, e.g. after the API reported quota exhaustion."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class CircuitBreaker:
+    """Opens after consecutive quota failures and fails fast until the cooldown passes."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trips = 0
+        # Token of the call holding the half-open probe, if one is in flight
+        self._probe: int | None = None
+        self._tokens = itertools.count(1)
+
+    def blocked(self) -> bool:
+        """Whether a call would be refused right now; unlike ``allow`` this claims nothing."""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at < self.cooldown
+        return self.state == "half_open" and self._probe is not None
+
+    def allow(self) -> int | None:
+        """Admits a call: None when refused, otherwise a token for ``release_probe``.
+
+        Ordinary calls get 0; the call admitted as the half-open probe gets its
+        own token, so only it can hand the probe back.
+        """
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return None
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe is not None:
+                return None
+            self._probe = next(self._tokens)
+            return self._probe
+        return 0
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+
+    def record_quota_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_probe(self, token: int):
+        """Ends the probe held by ``token``; a no-op for any other call."""
+        if token and token == self._probe:
+            self._probe = None
+
+
+class GeminiScheduler:
+    """Shared admission control for every Gemini call in the process.
+
+    Callers wait in a priority heap; the head is admitted once a concurrency
+    slot and enough request/token budget are free, so chat never queues behind
+    bulk clause analysis. Quota and transient errors are retried with jittered
+    exponential backoff, and repeated quota errors trip the circuit breaker.
+    """
+
+    def __init__(self, rpm: int = GEMINI_RPM, tpm: int = GEMINI_TPM, max_concurrency: int = GEMINI_MAX_CONCURRENCY):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.breaker = CircuitBreaker()
+        self._in_flight = 0
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self.counters = {"calls": 0, "retries": 0, "quota_errors": 0, "rejected": 0, "failures": 0}
+
+    def _kick(self):
+        self._timer = None
+        while self._waiters:
+            priority, _, cost, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self._in_flight >= self.max_concurrency:
+                return
+            wait = max(self.requests.delay(1), self.tokens.delay(cost))
+            if wait > 0:
+                loop = future.get_loop()
+                if self._timer:
+                    self._timer.cancel()
+                self._timer = loop.call_later(wait, self._kick)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(cost)
+            self._in_flight += 1
+            future.set_result(None)
+
+    async def _acquire(self, priority: int, cost: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), cost, future))
+        self._kick()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Admitted just before cancellation: hand the slot back
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        self._kick()
+
+    def _reject(self):
+        self.counters["rejected"] += 1
+        raise GeminiUnavailableError("Gemini quota exhausted; circuit breaker is open")
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, priority: int, cost: int):
+        """Holds a concurrency slot and breaker admission for one call attempt.
+
+        The breaker is consulted only once the slot is held, so a caller
+        cancelled while queued never claims the half-open probe. The probe is
+        handed back on every exit of the call that claimed it, including
+        cancellation; by then its success or failure has set the breaker state.
+        """
+        if self.breaker.blocked():
+            self._reject()
+        await self._acquire(priority, cost)
+        try:
+            token = self.breaker.allow()
+            if token is None:
+                self._reject()
+            try:
+                yield
+            finally:
+                self.breaker.release_probe(token)
+        finally:
+            self._release()
+
+    def _record_success(self, response, started: float, prompt_tokens: int, text: str | None = None):
+        self.breaker.record_success()
+        gemini_call_seconds.observe(time.monotonic() - started, outcome="ok")
+        input_tokens, output_tokens = _response_usage(response, prompt_tokens, text)
+        gemini_tokens.inc(input_tokens, direction="input")
+        gemini_tokens.inc(output_tokens, direction="output")
+
+    def _record_failure(self, e: Exception, started: float) -> bool:
+        """Accounts for a failed call; returns whether it was a quota error."""
+        quota = is_quota_error(e)
+        kind = "quota" if quota else "transient" if is_transient_error(e) else "other"
+        gemini_call_seconds.observe(time.monotonic() - started, outcome=kind)
+        gemini_errors.inc(kind=kind)
+        if quota:
+            self.counters["quota_errors"] += 1
+            self.breaker.record_quota_failure()
+            self.requests.drain()
+        return quota
+
+    async def _backoff(self, attempt: int, quota: bool):
+        self.counters["retries"] += 1
+        base = 2.0 if quota else 0.5
+        await asyncio.sleep(min(30.0, base * (2 ** attempt)) * random.uniform(0.5, 1.5))
+
+    async def generate(self, prompt, priority: int = PRIORITY_BULK, max_retries: int = GEMINI_MAX_RETRIES,
+                       target=None, **kwargs):
+        """Runs ``model.generate_content_async`` under the shared limits.
+
+        ``target`` is a model to call instead of the shared one, e.g. one bound
+        to a context cache.
+        """
+        prompt_tokens = estimate_tokens(prompt if isinstance(prompt, str) else str(prompt))
+        cost = prompt_tokens + OUTPUT_TOKEN_ALLOWANCE
+        for attempt in range(max_retries + 1):
+            async with self._slot(priority, cost):
+                started = time.monotonic()
+                try:
+                    self.counters["calls"] += 1
+                    # First call of a cold process imports the SDK off the event loop
+                    current = target or (model if model is not None else await run_blocking(get_model))
+                    response = await current.generate_content_async(prompt, **kwargs)
+                    self._record_success(response, started, prompt_tokens)
+                    return response
+                except Exception as e:
+                    quota = self._record_failure(e, started)
+                    if not (quota or is_transient_error(e)) or attempt == max_retries:
+                        self.counters["failures"] += 1
+                        raise
+
+            await self._backoff(attempt, quota)
+
+    async def call(self, func, *args, cost: int, priority: int = PRIORITY_INTERACTIVE,
+                   max_retries: int = GEMINI_MAX_RETRIES, **kwargs):
+        """Runs a blocking SDK call (embeddings, context caches) under the same limits as ``generate``."""
+        for attempt in range(max_retries + 1):
+            async with self._slot(priority, cost):
+                started = time.monotonic()
+                try:
+                    self.counters["calls"] += 1
+                    result = await run_blocking(func, *args, **kwargs)
+                    self._record_success(result, started, cost)
+                    return result
+                except Exception as e:
+                    quota = self._record_failure(e, started)
+                    if not (quota or is_transient_error(e)) or attempt == max_retries:
+                        self.counters["failures"] += 1
+                        raise
+
+            await self._backoff(attempt, quota)
+
+    async def generate_stream(self, prompt, priority: int = PRIORITY_CHAT, max_retries: int = GEMINI_MAX_RETRIES,
+                              target=None, **kwargs):
+        """Like ``generate`` with ``stream=True``, yielding text as it arrives.
+
+        Failures before the first chunk are retried as usual. After text has
+        been yielded a retry would repeat it, so later errors propagate. The
+        concurrency slot is held until the stream ends or is closed.
+        """
+        prompt_tokens = estimate_tokens(prompt if isinstance(prompt, str) else str(prompt))
+        cost = prompt_tokens + OUTPUT_TOKEN_ALLOWANCE
+        for attempt in range(max_retries + 1):
+            async with self._slot(priority, cost):
+                started = time.monotonic()
+                parts = []
+                try:
+                    self.counters["calls"] += 1
+                    current = target or (model if model is not None else await run_blocking(get_model))
+                    response = await current.generate_content_async(prompt, stream=True, **kwargs)
+                    async for chunk in response:
+                        text = _chunk_text(chunk)
+                        if text:
+                            parts.append(text)
+                            yield text
+                    self._record_success(response, started, prompt_tokens, "".join(parts))
+                    return
+                except Exception as e:
+                    quota = self._record_failure(e, started)
+                    if parts or not (quota or is_transient_error(e)) or attempt == max_retries:
+                        self.counters["failures"] += 1
+                        raise
+
+            await self._backoff(attempt, quota)
+
+    def stats(self) -> dict:
+        queued = {}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                queued[priority] = queued.get(priority, 0) + 1
+        return {
+            **self.counters,
+            "in_flight": self._in_flight,
+            "queued": {"chat": queued.get(PRIORITY_CHAT, 0),
+                       "interactive": queued.get(PRIORITY_INTERACTIVE, 0),
+                       "bulk": queued.get(PRIORITY_BULK, 0)},
+            "breaker": {"state": self.breaker.state, "trips": self.breaker.trips},
+        }
+
+
+scheduler = GeminiScheduler()
+
+
+async def generate(prompt, priority: int = PRIORITY_BULK, **kwargs):
+    """Entry point for all model calls; see GeminiScheduler.generate."""
+    return await scheduler.generate(prompt, priority=priority, **kwargs)
+
+
+def generate_stream(prompt, priority: int = PRIORITY_CHAT, **kwargs):
+    """Streaming entry point; see GeminiScheduler.generate_stream."""
+    return scheduler.generate_stream(prompt, priority=priority, **kwargs)
+
+
+def create_cached_model(system_instruction: str, contents: str, ttl_seconds: float):
+    """Stores a prompt prefix with Gemini context caching.
+
+    Returns (model that answers against it, cache resource name).
+    """
+    import datetime
+    import google.generativeai as genai
+    from google.generativeai import caching
+
+    get_model()  # configures the API key
+    cached = caching.CachedContent.create(
+        model=CACHE_MODEL_NAME,
+        system_instruction=system_instruction,
+        contents=[contents],
+        ttl=datetime.timedelta(seconds=ttl_seconds),
+    )
+    return genai.GenerativeModel.from_cached_content(cached_content=cached), cached.name
+
+
+def delete_cached_content(name: str):
+    """Deletes a context cache before its TTL, so it stops accruing storage."""
+    from google.generativeai import protos
+    from google.generativeai.client import get_default_cache_client
+
+    get_model()  # configures the API key
+    get_default_cache_client().delete_cached_content(protos.DeleteCachedContentRequest(name=name))
+
+
+async def cache_context(system_instruction: str, contents: str, ttl_seconds: float):
+    """``create_cached_model`` off the event loop, admitted like a call of the same size."""
+    cost = estimate_tokens(system_instruction) + estimate_tokens(contents)
+    return await scheduler.call(create_cached_model, system_instruction, contents, ttl_seconds,
+                                cost=cost, priority=PRIORITY_INTERACTIVE)
+
+
+async def uncache_context(name: str):
+    """``delete_cached_content`` off the event loop, as background work."""
+    await scheduler.call(delete_cached_content, name, cost=1, priority=PRIORITY_BULK, max_retries=1)
+
+async def analyze_clauses_batch(clauses: list[str]) -> list[dict]:
     """
     Analyzes a batch of legal clauses in a single API call.
     """
@@ -31,54 +471,30 @@ def analyze_clauses_batch(clauses: list[str]) -> list[dict]:
     **CRITICAL RULE:** You MUST return an analysis for every single clause. If you cannot determine the risk, return an object for it with a "risk_level" of "Gray" and an explanation.
 
     **IMPORTANT:** Return your response ONLY as a single valid JSON array (a list of objects) with exactly {len(clauses)} objects.
+    Each object must include "index" (the clause number above), "risk_level", "plain_english" and "emoji_summary".
     """
     try:
-        response = model.generate_content(prompt)
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        analysis_list = json.loads(cleaned_response)
-        
-        if isinstance(analysis_list, list) and len(analysis_list) == len(clauses):
-            return analysis_list
+        response = await generate(prompt, priority=PRIORITY_BULK, **structured_output.clause_generation_config())
+        salvaged = structured_output.salvage_analyses(response.text, len(clauses))
+
+        if len(salvaged) == len(clauses):
+            return [salvaged[i] for i in range(len(clauses))]
         else:
-            print(f"Warning: AI response length mismatch. AI returned {len(analysis_list)} items, expected {len(clauses)}.")
+            telemetry.log(f"⚠️ AI response length mismatch: {len(salvaged)} usable items, expected {len(clauses)}",
+                          level="warning")
             return [] # Return empty list to trigger error handling in main.py
             
     except Exception as e:
-        print(f"Error parsing Gemini batch response: {e}")
+        telemetry.log(f"❌ Error parsing Gemini batch response: {e}", level="error")
         return [] # Return empty list to trigger error handling
 
-def get_answer_from_gemini(context: str, question: str) -> str:
-    """
-    Answers a user's question based on the document's context.
-    """
-    prompt = f"""
-    You are a helpful AI assistant for LawLytic. Answer the user's question based *only* on the provided context from a legal document. Be friendly and clear.
-
-    If the answer is not in the text, state that the document does not seem to provide that information.
-
-    **Document Context:**
-    ---
-    {context}
-    ---
-
-    **User's Question:** "{question}"
-
-    **Answer:**
-    """
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        print(f"Error getting chat answer from Gemini: {e}")
-        return "Sorry, I encountered an error while trying to find an answer."
-
-
-def generate_timeline_from_text(full_text: str) -> list[dict]:
+async def extract_timeline_events(section_text: str) -> list[dict] | None:
     """
-    Uses the Gemini model as an AI agent to extract key events and generate a timeline.
+    Uses the Gemini model as an AI agent to extract key events from one section of a document.
+    Returns None when the model call or its response fails, so callers can tell failure from "no events".
     """
     prompt = f"""
-    You are an AI agent specializing in legal case analysis. Your task is to read the following document text and extract key events to build a case timeline.
+    You are an AI agent specializing in legal case analysis. Your task is to read the following section of a document and extract key events to build a case timeline.
 
     Identify significant events such as:
     - Filing dates
@@ -91,17 +507,19 @@ def generate_timeline_from_text(full_text: str) -> list[dict]:
     - Incidents or disputes
 
     For each event, extract the date, a concise description of the event, and the parties involved if mentioned.
+    Only include events stated in this section; other sections are processed separately.
 
-    **Document Text:**
+    **Document Section:**
     ---
-    {full_text[:15000]} 
+    {section_text}
     ---
 
     **Instructions:**
     Return your response ONLY as a single valid JSON array of objects. Each object must have the following keys: "date", "event", and "parties".
-    The "date" should be as specific as possible (e.g., "2024-08-15"). If a date is ambiguous, use your best judgment.
+    The "date" must be an ISO date ("2024-08-15"), or "2024-08" / "2024" when only the month or year is stated. If no date can be determined, skip the event.
     The "event" should be a brief, clear description.
     The "parties" should be a short string listing the key people or groups involved (e.g., "Plaintiff, Defendant").
+    If the section contains no dated events, return [].
 
     **Example Response Format:**
     [
@@ -118,16 +536,12 @@ def generate_timeline_from_text(full_text: str) -> list[dict]:
     ]
     """
     try:
-        # Using the regular model instance from your file
-        response = model.generate_content(prompt)
+        response = await generate(prompt, priority=PRIORITY_INTERACTIVE)
         cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
         timeline_data = json.loads(cleaned_response)
-        
-        # Sort the events by date for chronological order
         if isinstance(timeline_data, list):
-            timeline_data.sort(key=lambda x: x.get('date', ''))
-            return timeline_data
-        return []
+            return [event for event in timeline_data if isinstance(event, dict)]
+        return None
     except Exception as e:
-        print(f"Error generating timeline: {e}")
-        return []
\ No newline at end of file
+        telemetry.log(f"❌ Error extracting timeline events: {e}", level="error")
+        return None
@@ -0,0 +1,465 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import asyncio
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from backend.services import telemetry
+from backend.services.executor import run_blocking
+
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "auto")
+JOB_QUEUE_PATH = os.getenv(
+    "JOB_QUEUE_PATH",
+    os.path.join(tempfile.gettempdir(), "lawlytics_jobs.sqlite3"),
+)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Cap on jobs one user may have running at once, on top of round-robin dispatch
+JOB_MAX_RUNNING_PER_USER = int(os.getenv("JOB_MAX_RUNNING_PER_USER", "2"))
+JOB_COLLECTION = "jobs"
+# A running job's owner refreshes its lease this often; a lease not refreshed
+# for JOB_LEASE_SECONDS belongs to a dead worker and the job may be taken over
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+# How often workers look for jobs whose owner died (and jobs queued by other instances)
+JOB_SWEEP_SECONDS = float(os.getenv("JOB_SWEEP_SECONDS", "60"))
+
+# Firestore documents are capped at 1 MiB, so payloads are split across subdocuments,
+# and a write request at 10 MiB, so they are written a few chunks per batch
+_FIRESTORE_PAYLOAD_CHUNK = 900 * 1024
+_FIRESTORE_CHUNKS_PER_BATCH = 8
+
+TERMINAL_STATUSES = ("complete", "failed")
+_LEASE_FIELDS = ("owner", "heartbeatAt")
+
+
+def worker_owner() -> str:
+    """Identifies this process as the holder of job leases."""
+    return f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+
+
+def new_job(job_id: str, user_id: str, params: dict) -> dict:
+    """Builds the public job record."""
+    now = time.time()
+    return {
+        "id": job_id,
+        "userId": user_id,
+        "status": "queued",
+        "params": params,
+        "progress": {"stage": "queued", "completed": 0, "total": 0},
+        "result": None,
+        "error": None,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+
+class MemoryJobBackend:
+    """Process-local job store for local runs and tests."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._payloads: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: dict, payload: bytes):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+            self._payloads[job["id"]] = payload
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != "queued":
+                return False
+            job.update({"status": "running", "updatedAt": time.time()})
+            return True
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        return True  # nothing outlives the process that holds the jobs
+
+    def update(self, job_id: str, fields: dict):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updatedAt=time.time())
+                if fields.get("status") in TERMINAL_STATUSES:
+                    self._payloads.pop(job_id, None)
+
+    def load_payload(self, job_id: str) -> bytes | None:
+        with self._lock:
+            return self._payloads.get(job_id)
+
+    def list_pending(self) -> list[dict]:
+        return []
+
+
+class SQLiteJobBackend:
+    """Job store in a local SQLite file; survives restarts of a single process."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, user_id TEXT NOT NULL, status TEXT NOT NULL,"
+            " record TEXT NOT NULL, payload BLOB, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            # Stores created before running jobs carried a lease
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL NOT NULL DEFAULT 0")
+        self._conn.commit()
+
+    def create(self, job: dict, payload: bytes):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, user_id, status, record, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job["id"], job["userId"], job["status"], json.dumps(job), payload, job["createdAt"]),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """Takes a queued job, or a running one whose lease has expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record FROM jobs WHERE id = ?"
+                " AND (status = 'queued' OR (status = 'running' AND heartbeat < ?))",
+                (job_id, now - JOB_LEASE_SECONDS),
+            ).fetchone()
+            if not row:
+                return False
+            job = json.loads(row[0])
+            job.update({"status": "running", "updatedAt": now})
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', record = ?, owner = ?, heartbeat = ? WHERE id = ?",
+                (json.dumps(job), owner, now, job_id),
+            )
+            self._conn.commit()
+            return True
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Extends the lease; False once the job finished or another worker took it over."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (time.time(), job_id, owner),
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def update(self, job_id: str, fields: dict):
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row:
+                return
+            job = json.loads(row[0])
+            job.update(fields, updatedAt=time.time())
+            terminal = job["status"] in TERMINAL_STATUSES
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, record = ?, payload = CASE WHEN ? THEN NULL ELSE payload END WHERE id = ?",
+                (job["status"], json.dumps(job), terminal, job_id),
+            )
+            self._conn.commit()
+
+    def load_payload(self, job_id: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
+
+    def list_pending(self) -> list[dict]:
+        """Queued jobs plus running jobs whose lease expired, oldest first.
+
+        Jobs another live worker still heartbeats are left alone; ``claim``
+        takes over the expired ones.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT record FROM jobs WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?)"
+                " ORDER BY created_at",
+                (time.time() - JOB_LEASE_SECONDS,),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class FirestoreJobBackend:
+    """Durable job store shared by every serverless instance."""
+
+    name = "firestore"
+
+    def __init__(self, client, collection: str = JOB_COLLECTION):
+        self.client = client
+        self.collection = collection
+
+    def _ref(self, job_id: str):
+        return self.client.collection(self.collection).document(job_id)
+
+    def create(self, job: dict, payload: bytes):
+        ref = self._ref(job["id"])
+        starts = range(0, len(payload), _FIRESTORE_PAYLOAD_CHUNK)
+        for first in range(0, len(starts), _FIRESTORE_CHUNKS_PER_BATCH):
+            batch = self.client.batch()
+            for n in range(first, min(first + _FIRESTORE_CHUNKS_PER_BATCH, len(starts))):
+                batch.set(ref.collection("payload").document(f"{n:05d}"), {
+                    "data": payload[starts[n]:starts[n] + _FIRESTORE_PAYLOAD_CHUNK]
+                })
+            batch.commit()
+        # Written last, so no worker sees the job before its payload is complete
+        ref.set(job)
+
+    def get(self, job_id: str) -> dict | None:
+        snapshot = self._ref(job_id).get()
+        if not snapshot.exists:
+            return None
+        # Lease bookkeeping is internal to the workers
+        return {k: v for k, v in snapshot.to_dict().items() if k not in _LEASE_FIELDS}
+
+    @staticmethod
+    def _lease_expired(job: dict, now: float) -> bool:
+        # Jobs started before leases existed only have updatedAt
+        return job.get("heartbeatAt", job.get("updatedAt", 0)) < now - JOB_LEASE_SECONDS
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """Takes a queued job, or a running one whose lease has expired."""
+        from google.cloud import firestore as gcf
+
+        ref = self._ref(job_id)
+
+        @gcf.transactional
+        def claim_in_transaction(transaction) -> bool:
+            snapshot = ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return False
+            job, now = snapshot.to_dict(), time.time()
+            if not (job.get("status") == "queued"
+                    or (job.get("status") == "running" and self._lease_expired(job, now))):
+                return False
+            transaction.update(ref, {"status": "running", "owner": owner, "heartbeatAt": now, "updatedAt": now})
+            return True
+
+        return claim_in_transaction(self.client.transaction())
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Extends the lease; False once the job finished or another worker took it over."""
+        from google.cloud import firestore as gcf
+
+        ref = self._ref(job_id)
+
+        @gcf.transactional
+        def heartbeat_in_transaction(transaction) -> bool:
+            snapshot = ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.get("status") != "running" or snapshot.get("owner") != owner:
+                return False
+            transaction.update(ref, {"heartbeatAt": time.time()})
+            return True
+
+        return heartbeat_in_transaction(self.client.transaction())
+
+    def update(self, job_id: str, fields: dict):
+        ref = self._ref(job_id)
+        ref.update({**fields, "updatedAt": time.time()})
+        if fields.get("status") in TERMINAL_STATUSES:
+            for chunk in ref.collection("payload").stream():
+                chunk.reference.delete()
+
+    def load_payload(self, job_id: str) -> bytes | None:
+        chunks = list(self._ref(job_id).collection("payload").order_by("__name__").stream())
+        if not chunks:
+            return None
+        return b"".join(chunk.get("data") for chunk in chunks)
+
+    def list_pending(self) -> list[dict]:
+        """Queued jobs plus running jobs whose lease expired, oldest first."""
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        collection = self.client.collection(self.collection)
+        jobs = [snapshot.to_dict() for snapshot in
+                collection.where(filter=FieldFilter("status", "==", "queued")).stream()]
+        # Few jobs run at once, so expiry is checked here rather than with a composite index
+        now = time.time()
+        jobs.extend(
+            job for job in (snapshot.to_dict() for snapshot in
+                            collection.where(filter=FieldFilter("status", "==", "running")).stream())
+            if self._lease_expired(job, now)
+        )
+        jobs.sort(key=lambda job: job.get("createdAt", 0))
+        return jobs
+
+
+class JobQueue:
+    """Async worker pool with per-user round-robin dispatch over a pluggable job store.
+
+    ``handler(job, payload, report)`` does the actual work; ``report(fields)``
+    merges progress fields into the job record. Workers start lazily on the
+    first enqueue and keep running across warm invocations.
+    """
+
+    def __init__(self, backend, handler, workers: int = JOB_WORKERS,
+                 max_running_per_user: int = JOB_MAX_RUNNING_PER_USER):
+        self.backend = backend
+        self.handler = handler
+        self.workers = workers
+        self.max_running_per_user = max_running_per_user
+        self._user_queues: OrderedDict[str, deque] = OrderedDict()
+        self._running_per_user: dict[str, int] = {}
+        self._wakeup: asyncio.Condition | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        # Jobs queued or running on this instance, so sweeps don't queue them twice
+        self._local_jobs: set[str] = set()
+        self.owner = worker_owner()
+        # Held while recovering pending jobs, so concurrent enqueues start one pool
+        self._starting = asyncio.Lock()
+
+    async def _ensure_workers(self):
+        async with self._starting:
+            if self._worker_tasks and not all(task.done() for task in self._worker_tasks):
+                return
+            self._wakeup = asyncio.Condition()
+            await self._recover()
+            self._worker_tasks = [
+                asyncio.create_task(self._worker_loop(n)) for n in range(self.workers)
+            ] + [asyncio.create_task(self._sweep_loop())]
+        telemetry.log(f"👷 Started {self.workers} job workers ({self.backend.name} backend)")
+
+    async def _recover(self) -> int:
+        """Queues stored jobs that nobody is working on: queued ones and expired leases."""
+        # Store round trips (Firestore queries, SQLite writes) stay off the event loop
+        pending = await run_blocking(self.backend.list_pending)
+        recovered = 0
+        async with self._wakeup:
+            for job in pending:
+                if job["id"] in self._local_jobs:
+                    continue
+                self._local_jobs.add(job["id"])
+                self._user_queues.setdefault(job["userId"], deque()).append(job["id"])
+                recovered += 1
+            if recovered:
+                self._wakeup.notify_all()
+        return recovered
+
+    async def _sweep_loop(self):
+        """Periodically takes over jobs whose worker or instance died after startup."""
+        while True:
+            await asyncio.sleep(JOB_SWEEP_SECONDS)
+            try:
+                if recovered := await self._recover():
+                    telemetry.log(f"🔁 Recovered {recovered} abandoned jobs", level="warning")
+            except Exception as e:
+                telemetry.log(f"⚠️ Job sweep failed: {e}", level="warning")
+
+    async def enqueue(self, user_id: str, params: dict, payload: bytes) -> dict:
+        """Persists a new job and schedules it; returns the job record."""
+        await self._ensure_workers()
+        job = new_job("job_" + os.urandom(8).hex(), user_id, params)
+        await run_blocking(self.backend.create, job, payload)
+        async with self._wakeup:
+            self._local_jobs.add(job["id"])
+            self._user_queues.setdefault(user_id, deque()).append(job["id"])
+            self._wakeup.notify()
+        return job
+
+    async def get(self, job_id: str) -> dict | None:
+        return await run_blocking(self.backend.get, job_id)
+
+    def _next_job_locked(self) -> tuple[str, str] | None:
+        # Rotate through users so each gets one dispatch per round
+        for user_id in list(self._user_queues):
+            if self._running_per_user.get(user_id, 0) >= self.max_running_per_user:
+                continue
+            queue = self._user_queues.pop(user_id)
+            job_id = queue.popleft()
+            if queue:
+                self._user_queues[user_id] = queue  # back of the line
+            return user_id, job_id
+        return None
+
+    async def _worker_loop(self, worker_id: int):
+        while True:
+            async with self._wakeup:
+                while (picked := self._next_job_locked()) is None:
+                    await self._wakeup.wait()
+                user_id, job_id = picked
+                self._running_per_user[user_id] = self._running_per_user.get(user_id, 0) + 1
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                telemetry.log(f"💥 Job worker {worker_id} crashed on {job_id}: {e}", level="error")
+            finally:
+                async with self._wakeup:
+                    self._local_jobs.discard(job_id)
+                    self._running_per_user[user_id] -= 1
+                    if not self._running_per_user[user_id]:
+                        del self._running_per_user[user_id]
+                    self._wakeup.notify_all()
+
+    async def _heartbeat(self, job_id: str):
+        """Keeps this worker's lease on a running job alive."""
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                if not await run_blocking(self.backend.heartbeat, job_id, self.owner):
+                    return  # finished, or another worker took the job over
+            except Exception as e:
+                telemetry.log(f"⚠️ Lease heartbeat for job {job_id} failed: {e}", level="warning")
+
+    async def _run(self, job_id: str):
+        if not await run_blocking(self.backend.claim, job_id, self.owner):
+            return  # claimed by another worker or instance
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            job = await run_blocking(self.backend.get, job_id)
+            payload = await run_blocking(self.backend.load_payload, job_id)
+
+            async def report(fields: dict):
+                await run_blocking(self.backend.update, job_id, fields)
+
+            try:
+                await self.handler(job, payload or b"", report)
+            except Exception as e:
+                telemetry.log(f"💥 Job {job_id} failed: {e}", level="error")
+                await report({"status": "failed", "error": str(e) or "Job failed"})
+        finally:
+            heartbeat.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "workers": sum(1 for task in self._worker_tasks[:self.workers] if not task.done()),
+            "queued": sum(len(queue) for queue in self._user_queues.values()),
+            "running": sum(self._running_per_user.values()),
+            "users_waiting": len(self._user_queues),
+        }
+
+
+def create_job_backend(firestore_client):
+    """Picks the job store configured by JOB_QUEUE_BACKEND."""
+    backend = JOB_QUEUE_BACKEND
+    if backend == "auto":
+        backend = "firestore" if firestore_client is not None else "sqlite"
+    try:
+        if backend == "firestore" and firestore_client is not None:
+            return FirestoreJobBackend(firestore_client)
+        if backend == "sqlite":
+            return SQLiteJobBackend(JOB_QUEUE_PATH)
+    except Exception as e:
+        telemetry.log(f"⚠️ Job store '{backend}' unavailable, using memory: {e}", level="warning")
+    return MemoryJobBackend()
@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timezone, timedelta
+
+from backend.services import document_listing
+from backend.services.text_store import compress, decompress
+
+LOCAL_STORE_PATH = os.getenv(
+    "LOCAL_STORE_PATH",
+    os.path.join(tempfile.gettempdir(), "lawlytics_documents.sqlite3"),
+)
+# Compressed bytes kept on disk; least recently used documents go first
+LOCAL_STORE_MAX_BYTES = int(os.getenv("LOCAL_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+LOCAL_STORE_TTL_SECONDS = int(os.getenv("LOCAL_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Firestore auto-ids never contain "_", so local ids cannot collide with them
+LOCAL_ID_PREFIX = "doc_"
+
+_DATETIME_TAG = "$dt"
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {_DATETIME_TAG: value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_object(obj: dict):
+    if len(obj) == 1 and _DATETIME_TAG in obj:
+        return datetime.fromisoformat(obj[_DATETIME_TAG])
+    return obj
+
+
+def serialize(document: dict) -> tuple[bytes, str]:
+    """Compact JSON (datetimes tagged so they round-trip), then compressed."""
+    return compress(json.dumps(document, default=_encode_value, separators=(",", ":"), ensure_ascii=False))
+
+
+def deserialize(data: bytes, codec: str) -> dict:
+    return json.loads(decompress(data, codec), object_hook=_decode_object)
+
+
+def _listing_json(doc_id: str, document: dict) -> str:
+    # Stored uncompressed beside the document so history pages skip decompression
+    return json.dumps(document_listing.project(document, doc_id), default=_encode_value, separators=(",", ":"))
+
+
+_EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
+
+def _micros(created_at: datetime) -> int:
+    """Exact integer ordering key, so cursor comparisons never suffer float rounding."""
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (created_at - _EPOCH) // timedelta(microseconds=1)
+
+
+def _created_micros(document: dict) -> int:
+    created_at = document.get("createdAt")
+    return _micros(created_at) if isinstance(created_at, datetime) else 0
+
+
+class LocalDocumentStore:
+    """Embedded SQLite document store used while Firestore is unavailable.
+
+    Documents are stored compressed under a byte budget with LRU and TTL
+    eviction. Rows not yet written to Firestore stay marked as pending until
+    ``replay`` copies them over.
+    """
+
+    def __init__(self, path: str = LOCAL_STORE_PATH, max_bytes: int = LOCAL_STORE_MAX_BYTES,
+                 ttl_seconds: int = LOCAL_STORE_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id TEXT PRIMARY KEY, user_id TEXT, created_at INTEGER NOT NULL,"
+            " listing TEXT NOT NULL, data BLOB NOT NULL, codec TEXT NOT NULL, size INTEGER NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0, pending INTEGER NOT NULL DEFAULT 1,"
+            " updated_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS documents_user_created ON documents (user_id, created_at DESC, id DESC)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_accessed ON documents (accessed_at)")
+        self._conn.commit()
+        self.metrics = {"evictions": 0, "evicted_pending": 0, "replayed": 0}
+
+    @staticmethod
+    def owns(doc_id: str) -> bool:
+        return doc_id.startswith(LOCAL_ID_PREFIX)
+
+    @staticmethod
+    def new_id() -> str:
+        return LOCAL_ID_PREFIX + os.urandom(6).hex()
+
+    def put(self, doc_id: str, document: dict):
+        data, codec = serialize(document)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents (id, user_id, created_at, listing, data, codec, size, updated_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET user_id = excluded.user_id, created_at = excluded.created_at,"
+                " listing = excluded.listing, data = excluded.data, codec = excluded.codec, size = excluded.size,"
+                " version = version + 1, pending = 1, updated_at = excluded.updated_at,"
+                " accessed_at = excluded.accessed_at",
+                (doc_id, document.get("userId"), _created_micros(document), _listing_json(doc_id, document),
+                 data, codec, len(data), now, now),
+            )
+            self._evict_locked(now)
+            self._conn.commit()
+
+    def get(self, doc_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, codec, updated_at FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[2] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+                self._conn.commit()
+                self.metrics["evictions"] += 1
+                return None
+            self._conn.execute("UPDATE documents SET accessed_at = ? WHERE id = ?", (now, doc_id))
+            self._conn.commit()
+        return deserialize(row[0], row[1])
+
+    def update(self, doc_id: str, updates: dict) -> bool:
+        """Merges ``updates`` into a stored document; False if it is not stored here."""
+        with self._lock:
+            row = self._conn.execute("SELECT data, codec FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return False
+            document = deserialize(row[0], row[1])
+            document.update(updates)
+            data, codec = serialize(document)
+            now = time.time()
+            self._conn.execute(
+                "UPDATE documents SET listing = ?, data = ?, codec = ?, size = ?, version = version + 1,"
+                " pending = 1, updated_at = ?, accessed_at = ? WHERE id = ?",
+                (_listing_json(doc_id, document), data, codec, len(data), now, now, doc_id),
+            )
+            self._evict_locked(now)
+            self._conn.commit()
+        return True
+
+    def page(self, user_id: str, limit: int, cursor: str | None = None) -> tuple[list[dict], str | None]:
+        """Newest-first page of listing fields; its cursors are tagged as local ones."""
+        with self._lock:
+            if cursor:
+                created_at, last_id = document_listing.decode_cursor(cursor, document_listing.LOCAL)
+                created = _micros(created_at)
+                rows = self._conn.execute(
+                    "SELECT id, created_at, listing FROM documents WHERE user_id = ?"
+                    " AND (created_at < ? OR (created_at = ? AND id < ?))"
+                    " ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (user_id, created, created, last_id, limit + 1),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, created_at, listing FROM documents WHERE user_id = ?"
+                    " ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (user_id, limit + 1),
+                ).fetchall()
+        documents = [json.loads(listing, object_hook=_decode_object) for _, _, listing in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            doc_id, created, _ = rows[limit - 1]
+            next_cursor = document_listing.encode_cursor(
+                _EPOCH + timedelta(microseconds=created), doc_id, document_listing.LOCAL
+            )
+        return documents, next_cursor
+
+    def pending(self, limit: int = 50) -> list[tuple[str, int, float, dict]]:
+        """Oldest buffered writes as (doc_id, version, updated_at, document)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, version, updated_at, data, codec FROM documents WHERE pending = 1"
+                " ORDER BY updated_at LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            (doc_id, version, updated_at, deserialize(data, codec))
+            for doc_id, version, updated_at, data, codec in rows
+        ]
+
+    def mark_replayed(self, doc_id: str, version: int) -> bool:
+        """Drops a document copied to Firestore, unless it changed during the copy."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM documents WHERE id = ? AND version = ?", (doc_id, version)
+            ).rowcount
+            self._conn.commit()
+        self.metrics["replayed"] += deleted
+        return bool(deleted)
+
+    def _evict_locked(self, now: float):
+        expired = self._conn.execute(
+            "DELETE FROM documents WHERE updated_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.metrics["evictions"] += max(expired, 0)
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for doc_id, size, pending in self._conn.execute(
+            "SELECT id, size, pending FROM documents ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            total -= size
+            self.metrics["evictions"] += 1
+            self.metrics["evicted_pending"] += pending
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total, pending = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(pending), 0) FROM documents"
+            ).fetchone()
+        return {
+            **self.metrics,
+            "documents": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "pending": pending,
+        }
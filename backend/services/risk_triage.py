@@ -0,0 +1,269 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+
+import numpy as np
+
+from backend.services.executor import run_blocking
+from backend.services.analysis_cache import normalize_clause
+from backend.services.clause_index import classify_clause
+
+# "on" triages clauses locally once enough labelled history exists; "off" sends every clause to Gemini
+RISK_TRIAGE = os.getenv("RISK_TRIAGE", "on").lower()
+# Minimum predicted probability for a Green/Red label to skip the model
+RISK_TRIAGE_THRESHOLD = float(os.getenv("RISK_TRIAGE_THRESHOLD", "0.95"))
+# Model-labelled clauses needed before the classifier is trusted at all
+RISK_TRIAGE_MIN_EXAMPLES = int(os.getenv("RISK_TRIAGE_MIN_EXAMPLES", "500"))
+RISK_TRIAGE_MAX_EXAMPLES = int(os.getenv("RISK_TRIAGE_MAX_EXAMPLES", "50000"))
+RISK_TRIAGE_RETRAIN_SECONDS = float(os.getenv("RISK_TRIAGE_RETRAIN_SECONDS", "3600"))
+FEATURE_DIM = 1 << 16
+TRAIN_EPOCHS = 60
+LEARNING_RATE = 0.5
+L2_PENALTY = 1e-5
+
+LABELS = ("Green", "Orange", "Red")
+# Only these are assigned locally; Orange is always the model's call
+DIRECT_LABELS = ("Green", "Red")
+TRIAGE_SOURCE = "triage"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Bucket shared by every row, so no clause has an empty feature vector
+_BIAS_FEATURE = 0
+
+metrics = {
+    "trainings": 0,
+    "training_examples": 0,
+    "clauses": 0,
+    "assigned_green": 0,
+    "assigned_red": 0,
+    "sent_to_model": 0,
+}
+
+
+def _bucket(feature: str) -> int:
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=4).digest()
+    return 1 + int.from_bytes(digest, "little") % (FEATURE_DIM - 1)
+
+
+def tokenize(text: str) -> list[int]:
+    """Hashed unigram and bigram feature ids of a clause."""
+    tokens = _TOKEN_RE.findall(normalize_clause(text))
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return [_BIAS_FEATURE] + [_bucket(feature) for feature in features]
+
+
+class SparseRows:
+    """CSR rows of TF-IDF weights: ``values[indptr[i]:indptr[i+1]]`` at ``indices[...]``."""
+
+    def __init__(self, indices: np.ndarray, values: np.ndarray, indptr: np.ndarray):
+        self.indices = indices
+        self.values = values
+        self.indptr = indptr
+        # Row of every stored value, for scatter-adds
+        self.rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def dot(self, weights: np.ndarray) -> np.ndarray:
+        """(rows x FEATURE_DIM) @ weights, for a (FEATURE_DIM x k) dense matrix."""
+        return np.add.reduceat(self.values[:, None] * weights[self.indices], self.indptr[:-1], axis=0)
+
+    def transpose_dot(self, gradient: np.ndarray) -> np.ndarray:
+        """(FEATURE_DIM x rows) @ gradient."""
+        scattered = self.values[:, None] * gradient[self.rows]
+        return np.stack([
+            np.bincount(self.indices, weights=scattered[:, k], minlength=FEATURE_DIM)
+            for k in range(gradient.shape[1])
+        ], axis=1).astype(np.float32)
+
+
+def vectorize(texts: list[str], idf: np.ndarray | None = None) -> tuple[SparseRows, np.ndarray]:
+    """Log-scaled term counts times IDF, L2-normalized per clause; returns (rows, idf)."""
+    indices, counts, indptr = [], [], [0]
+    for text in texts:
+        features, feature_counts = np.unique(np.asarray(tokenize(text), dtype=np.int64), return_counts=True)
+        indices.append(features)
+        counts.append(feature_counts)
+        indptr.append(indptr[-1] + len(features))
+    indices = np.concatenate(indices).astype(np.int64)
+    tf = np.log1p(np.concatenate(counts).astype(np.float32))
+    indptr = np.asarray(indptr, dtype=np.int64)
+
+    if idf is None:
+        document_frequency = np.bincount(indices, minlength=FEATURE_DIM).astype(np.float32)
+        idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+    values = tf * idf[indices]
+    row_of = np.repeat(np.arange(len(texts)), np.diff(indptr))
+    norms = np.sqrt(np.bincount(row_of, weights=values * values, minlength=len(texts))).astype(np.float32)
+    values = values / norms[row_of]
+    return SparseRows(indices, values.astype(np.float32), indptr), idf
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+class RiskClassifier:
+    """Multinomial logistic regression over hashed TF-IDF features, trained with full-batch Adam."""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, idf: np.ndarray, examples: int):
+        self.weights = weights
+        self.bias = bias
+        self.idf = idf
+        self.examples = examples
+        self.trained_at = time.time()
+
+    @classmethod
+    def train(cls, texts: list[str], labels: list[str], epochs: int = TRAIN_EPOCHS) -> "RiskClassifier":
+        rows, idf = vectorize(texts)
+        targets = np.zeros((len(texts), len(LABELS)), dtype=np.float32)
+        targets[np.arange(len(texts)), [LABELS.index(label) for label in labels]] = 1.0
+        # Balance classes so boilerplate-heavy histories don't drown out Red
+        class_weights = len(texts) / (len(LABELS) * np.maximum(targets.sum(axis=0), 1.0))
+        sample_weights = (targets @ class_weights)[:, None] / len(texts)
+
+        weights = np.zeros((FEATURE_DIM, len(LABELS)), dtype=np.float32)
+        bias = np.zeros(len(LABELS), dtype=np.float32)
+        first, second = np.zeros_like(weights), np.zeros_like(weights)
+        beta1, beta2 = 0.9, 0.999
+        for step in range(1, epochs + 1):
+            error = (_softmax(rows.dot(weights) + bias) - targets) * sample_weights
+            gradient = rows.transpose_dot(error) + L2_PENALTY * weights
+            bias -= LEARNING_RATE * error.sum(axis=0)
+            first = beta1 * first + (1 - beta1) * gradient
+            second = beta2 * second + (1 - beta2) * gradient * gradient
+            weights -= (LEARNING_RATE * (first / (1 - beta1 ** step))
+                        / (np.sqrt(second / (1 - beta2 ** step)) + 1e-8)).astype(np.float32)
+        return cls(weights, bias, idf, len(texts))
+
+    def predict_proba(self, texts: list[str]) -> np.ndarray:
+        """(clauses x LABELS) probabilities."""
+        if not texts:
+            return np.zeros((0, len(LABELS)), dtype=np.float32)
+        rows, _ = vectorize(texts, self.idf)
+        return _softmax(rows.dot(self.weights) + self.bias)
+
+
+def decide(probabilities: np.ndarray, threshold: float = RISK_TRIAGE_THRESHOLD) -> list[str | None]:
+    """The locally assigned label of each clause, or None to send it to the model."""
+    best = probabilities.argmax(axis=1)
+    confident = probabilities[np.arange(len(best)), best] >= threshold
+    return [
+        LABELS[label] if is_confident and LABELS[label] in DIRECT_LABELS else None
+        for label, is_confident in zip(best.tolist(), confident.tolist())
+    ]
+
+
+def triage_analysis(text: str, risk_level: str, confidence: float) -> dict:
+    """Analysis stored for a clause the classifier labelled without the model."""
+    clause_type = classify_clause(text)
+    kind = "" if clause_type == "other" else clause_type.replace("_", " ") + " "
+    if risk_level == "Green":
+        plain_english = f"A standard {kind}clause; nothing unusual was flagged."
+        emoji_summary = "✅"
+    else:
+        plain_english = (f"This {kind}clause closely matches terms previously flagged as high risk. "
+                         f"Review it carefully.")
+        emoji_summary = "🚩"
+    return {
+        "risk_level": risk_level,
+        "plain_english": plain_english,
+        "emoji_summary": emoji_summary,
+        "source": TRIAGE_SOURCE,
+        "confidence": round(confidence, 3),
+    }
+
+
+def evaluate(classifier: RiskClassifier, texts: list[str], labels: list[str],
+             threshold: float = RISK_TRIAGE_THRESHOLD) -> dict:
+    """Agreement with model labels on the clauses triage would have answered itself."""
+    probabilities = classifier.predict_proba(texts)
+    decisions = decide(probabilities, threshold)
+    assigned = [(decision, label) for decision, label in zip(decisions, labels) if decision is not None]
+    agreed = sum(1 for decision, label in assigned if decision == label)
+    return {
+        "threshold": threshold,
+        "clauses": len(texts),
+        "assigned": len(assigned),
+        "calls_avoided": round(len(assigned) / len(texts), 4) if texts else 0.0,
+        "agreement": round(agreed / len(assigned), 4) if assigned else None,
+        # The costly mistakes: a model-flagged risk passed off as Green, or the reverse
+        "red_as_green": sum(1 for decision, label in assigned if decision == "Green" and label == "Red"),
+        "green_as_red": sum(1 for decision, label in assigned if decision == "Red" and label == "Green"),
+        "orange_assigned": sum(1 for _, label in assigned if label == "Orange"),
+    }
+
+
+class RiskTriage:
+    """Local risk pre-classifier in front of analyze_chunk.
+
+    ``load_examples`` is a blocking callable returning model-labelled
+    (text, risk_level) pairs. The classifier is retrained in the background
+    every RISK_TRIAGE_RETRAIN_SECONDS; until the first training finishes,
+    every clause goes to the model.
+    """
+
+    def __init__(self, load_examples, threshold: float = RISK_TRIAGE_THRESHOLD,
+                 min_examples: int = RISK_TRIAGE_MIN_EXAMPLES, enabled: bool = RISK_TRIAGE != "off"):
+        self.load_examples = load_examples
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.enabled = enabled
+        self.classifier: RiskClassifier | None = None
+        self._checked_at = 0.0
+        self._training: asyncio.Task | None = None
+
+    def _train_blocking(self) -> RiskClassifier | None:
+        examples = self.load_examples(RISK_TRIAGE_MAX_EXAMPLES)
+        if len(examples) < self.min_examples or len({label for _, label in examples}) < len(LABELS):
+            return None
+        texts, labels = zip(*examples)
+        return RiskClassifier.train(list(texts), list(labels))
+
+    async def _train(self):
+        classifier = await run_blocking(self._train_blocking)
+        if classifier is not None:
+            self.classifier = classifier
+            metrics["trainings"] += 1
+            metrics["training_examples"] = classifier.examples
+
+    def _refresh(self):
+        now = time.time()
+        if now - self._checked_at < RISK_TRIAGE_RETRAIN_SECONDS or (self._training and not self._training.done()):
+            return
+        self._checked_at = now
+        self._training = asyncio.create_task(self._train())
+
+    async def classify(self, texts: list[str]) -> dict[int, dict]:
+        """Analyses for the clauses confident enough to skip the model, by position."""
+        if not self.enabled or not texts:
+            return {}
+        self._refresh()
+        classifier = self.classifier
+        metrics["clauses"] += len(texts)
+        if classifier is None:
+            metrics["sent_to_model"] += len(texts)
+            return {}
+
+        probabilities = await run_blocking(classifier.predict_proba, texts)
+        assigned = {}
+        for i, decision in enumerate(decide(probabilities, self.threshold)):
+            if decision is not None:
+                assigned[i] = triage_analysis(texts[i], decision, float(probabilities[i].max()))
+                metrics[f"assigned_{decision.lower()}"] += 1
+        metrics["sent_to_model"] += len(texts) - len(assigned)
+        return assigned
+
+    def stats(self) -> dict:
+        return {
+            **metrics,
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "ready": self.classifier is not None,
+            "calls_avoided": round((metrics["assigned_green"] + metrics["assigned_red"]) / metrics["clauses"], 4)
+            if metrics["clauses"] else 0.0,
+        }
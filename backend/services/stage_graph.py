@@ -0,0 +1,152 @@
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from backend.services import telemetry
+
+_REQUIRED = object()
+
+
+class StageSkipped(Exception):
+    """A stage did not run because a stage it needs failed."""
+
+
+class StageCancelled(Exception):
+    """A stage was stopped because a critical stage failed."""
+
+
+@dataclass
+class Stage:
+    name: str
+    # Called with the values of finished stages, by name
+    run: Callable[[dict], Awaitable[Any]]
+    after: tuple[str, ...] = ()
+    # A failed critical stage cancels every stage still pending
+    critical: bool = False
+    # Value used in place of a failed result; dependents still run when set
+    default: Any = _REQUIRED
+
+
+@dataclass
+class StageOutcome:
+    status: str  # "ok", "failed", "skipped" or "cancelled"
+    value: Any = None
+    error: BaseException | None = None
+    # Seconds since the graph started
+    started: float = 0.0
+    finished: float = 0.0
+
+
+@dataclass
+class GraphRun:
+    outcomes: dict[str, StageOutcome] = field(default_factory=dict)
+    critical: set[str] = field(default_factory=set)
+    seconds: float = 0.0
+
+    def raise_for_critical(self):
+        """Re-raises the error of the first critical stage that failed."""
+        failures = [
+            (outcome.finished, name) for name, outcome in self.outcomes.items()
+            if outcome.status == "failed" and name in self.critical
+        ]
+        if failures:
+            raise self.outcomes[min(failures)[1]].error
+
+    def timings(self) -> dict:
+        """Per-stage status, start offset and duration in milliseconds."""
+        return {
+            "totalMs": round(self.seconds * 1000, 1),
+            "stages": {
+                name: {
+                    "status": outcome.status,
+                    "startMs": round(outcome.started * 1000, 1),
+                    "ms": round((outcome.finished - outcome.started) * 1000, 1),
+                }
+                for name, outcome in self.outcomes.items()
+            },
+        }
+
+
+class StageGraph:
+    """A small DAG of async stages; each starts as soon as the stages it needs finish.
+
+    Stages are added in dependency order, which keeps the graph acyclic. A
+    failed stage only affects the stages that need it (they are skipped),
+    unless it has a default or is critical.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: dict[str, Stage] = {}
+
+    def add(self, name: str, run: Callable[[dict], Awaitable[Any]], after: tuple[str, ...] = (),
+            critical: bool = False, default: Any = _REQUIRED) -> "StageGraph":
+        unknown = [dependency for dependency in after if dependency not in self.stages]
+        if unknown or name in self.stages:
+            raise ValueError(f"Stage {name!r}: unknown dependencies {unknown} or duplicate name")
+        self.stages[name] = Stage(name, run, tuple(after), critical, default)
+        return self
+
+    async def run(self) -> GraphRun:
+        result = GraphRun(critical={name for name, stage in self.stages.items() if stage.critical})
+        values: dict[str, Any] = {}
+        tasks: dict[str, asyncio.Task] = {}
+        started = time.perf_counter()
+
+        def cancel_pending(failed: str):
+            for name, task in tasks.items():
+                if name != failed and not task.done():
+                    task.cancel()
+
+        async def run_stage(stage: Stage):
+            if stage.after:
+                await asyncio.wait([tasks[dependency] for dependency in stage.after])
+            missing = [dependency for dependency in stage.after if dependency not in values]
+            offset = time.perf_counter() - started
+            if missing:
+                result.outcomes[stage.name] = StageOutcome(
+                    "skipped", error=StageSkipped(f"{stage.name} needs {', '.join(missing)}"),
+                    started=offset, finished=offset,
+                )
+                return
+            try:
+                with telemetry.span(f"{self.name}.{stage.name}"):
+                    value = await stage.run(values)
+            except asyncio.CancelledError:
+                now = time.perf_counter() - started
+                result.outcomes[stage.name] = StageOutcome(
+                    "cancelled", error=StageCancelled(stage.name), started=offset, finished=now
+                )
+                raise
+            except Exception as e:
+                now = time.perf_counter() - started
+                result.outcomes[stage.name] = StageOutcome("failed", error=e, started=offset, finished=now)
+                if stage.default is not _REQUIRED:
+                    values[stage.name] = stage.default
+                telemetry.log(f"⚠️ Stage {self.name}.{stage.name} failed: {e}", level="warning")
+                if stage.critical:
+                    cancel_pending(stage.name)
+                return
+            values[stage.name] = value
+            result.outcomes[stage.name] = StageOutcome(
+                "ok", value=value, started=offset, finished=time.perf_counter() - started
+            )
+
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.create_task(run_stage(stage))
+        try:
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        finally:
+            # The caller went away: stop everything still running
+            for task in tasks.values():
+                task.cancel()
+        now = time.perf_counter() - started
+        for name in self.stages:
+            # Cancelled before it got to start
+            result.outcomes.setdefault(name, StageOutcome("cancelled", error=StageCancelled(name),
+                                                          started=now, finished=now))
+        result.seconds = now
+        # Report in declaration order
+        result.outcomes = {name: result.outcomes[name] for name in self.stages}
+        return result
@@ -0,0 +1,112 @@
+import os
+import json
+
+# Ask Gemini for schema-constrained JSON; set to "false" for models without support
+STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "true").lower() != "false"
+
+RISK_LEVELS = ("Red", "Orange", "Green", "Gray")
+
+CLAUSE_ANALYSIS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "index": {"type": "integer"},
+            "risk_level": {"type": "string", "enum": list(RISK_LEVELS)},
+            "plain_english": {"type": "string"},
+            "emoji_summary": {"type": "string"},
+        },
+        "required": ["index", "risk_level", "plain_english", "emoji_summary"],
+    },
+}
+
+metrics = {
+    "responses": 0,
+    "objects_salvaged": 0,
+    "objects_rejected": 0,
+    "partial_responses": 0,
+}
+
+
+def clause_generation_config() -> dict:
+    """Extra generate() kwargs for clause analysis calls."""
+    if not STRUCTURED_OUTPUT:
+        return {}
+    return {"generation_config": {
+        "response_mime_type": "application/json",
+        "response_schema": CLAUSE_ANALYSIS_SCHEMA,
+    }}
+
+
+def iter_json_objects(text: str):
+    """Yields each complete top-level JSON object in ``text``, skipping malformed ones.
+
+    Works in a single pass over the characters. Markdown fences, surrounding
+    prose, a missing closing bracket or a truncated final object only cost the
+    objects they touch.
+    """
+    depth = 0
+    start = None
+    in_string = escaped = False
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            if depth:
+                in_string = True
+        elif char == "{":
+            if depth == 0:
+                start = position
+            depth += 1
+        elif char == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                try:
+                    value = json.loads(text[start:position + 1])
+                except ValueError:
+                    metrics["objects_rejected"] += 1
+                    continue
+                if isinstance(value, dict):
+                    yield value
+
+
+def _valid_analysis(value: dict) -> bool:
+    return value.get("risk_level") in RISK_LEVELS and isinstance(value.get("plain_english"), str)
+
+
+def salvage_analyses(text: str, expected: int) -> dict[int, dict]:
+    """Maps 0-based clause positions to every usable analysis object in a reply.
+
+    Objects are placed by their 1-based "index" field. Replies without indices
+    are placed by position only when the count matches exactly.
+    """
+    metrics["responses"] += 1
+    objects = list(iter_json_objects(text))
+    results: dict[int, dict] = {}
+    unindexed = []
+    for value in objects:
+        if not _valid_analysis(value):
+            metrics["objects_rejected"] += 1
+            continue
+        index = value.pop("index", None)
+        if isinstance(index, int) and 1 <= index <= expected:
+            results.setdefault(index - 1, value)
+        else:
+            unindexed.append(value)
+    if not results and len(unindexed) == expected:
+        results = dict(enumerate(unindexed))
+
+    metrics["objects_salvaged"] += len(results)
+    if len(results) < expected:
+        metrics["partial_responses"] += 1
+    return results
+
+
+def stats() -> dict:
+    return dict(metrics)
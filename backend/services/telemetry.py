@@ -0,0 +1,230 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import contextvars
+from typing import Callable
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+METRIC_PREFIX = "lawlytics"
+# Upper bounds (seconds) of latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# "json" writes one JSON object per log line; "text" keeps the plain console lines
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Request-scoped; tasks started during a request inherit them
+trace_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_id", default=None)
+_spans_var: contextvars.ContextVar[list | None] = contextvars.ContextVar("spans", default=None)
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+_TRACE_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            row = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[index] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(row) for key, row in self._values.items()}
+        for key, row in sorted(values.items()):
+            labels = dict(zip(self.labels, key))
+            for bound, count in zip(self.buckets, row):
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, row[-2]
+            yield f"{self.name}_sum", labels, row[-1]
+            yield f"{self.name}_count", labels, row[-2]
+
+
+class Registry:
+    """Metrics plus existing ``stats()`` providers, rendered in the Prometheus text format."""
+
+    def __init__(self, prefix: str = METRIC_PREFIX):
+        self.prefix = prefix
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._collectors: list[tuple[str, Callable[[], dict]]] = []
+
+    def counter(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(f"{self.prefix}_{name}", help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(f"{self.prefix}_{name}", help_text, labels, buckets))
+
+    def register_stats(self, name: str, provider: Callable[[], dict]):
+        """Exposes every numeric leaf of ``provider()`` as a gauge named after its path."""
+        self._collectors.append((name, provider))
+
+    def _flatten(self, path: str, value):
+        if isinstance(value, bool):
+            yield path, int(value)
+        elif isinstance(value, (int, float)):
+            yield path, value
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                yield from self._flatten(f"{path}_{_NAME_RE.sub('_', str(key))}", item)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for name, provider in self._collectors:
+            try:
+                stats = provider()
+            except Exception as e:
+                lines.append(f"# {name} stats unavailable: {_escape(e)}")
+                continue
+            for path, value in self._flatten(f"{self.prefix}_{name}", stats):
+                lines.append(f"# TYPE {path} gauge")
+                lines.append(f"{path} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+span_seconds = registry.histogram(
+    "span_seconds", "Duration of instrumented pipeline stages and storage calls.", ("span", "status")
+)
+
+
+@contextmanager
+def span(name: str):
+    """Times a block into span_seconds and the current request's span list."""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        span_seconds.observe(elapsed, span=name, status=status)
+        spans = _spans_var.get()
+        if spans is not None:
+            spans.append((name, elapsed, status))
+
+
+def trace_id_from_headers(headers) -> str:
+    """Continues an incoming W3C traceparent or request id, or starts a new trace."""
+    traceparent = _TRACEPARENT_RE.match(headers.get("traceparent", ""))
+    if traceparent:
+        return traceparent.group(1)
+    for header in ("x-trace-id", "x-request-id", "x-vercel-id"):
+        value = headers.get(header, "")
+        if _TRACE_ID_RE.match(value):
+            return value
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def trace(trace_id: str):
+    """Makes ``trace_id`` current and collects the spans recorded under it."""
+    spans: list[tuple[str, float, str]] = []
+    trace_token = trace_id_var.set(trace_id)
+    spans_token = _spans_var.set(spans)
+    try:
+        yield spans
+    finally:
+        _spans_var.reset(spans_token)
+        trace_id_var.reset(trace_token)
+
+
+def current_spans() -> list[tuple[str, float, str]]:
+    return _spans_var.get() or []
+
+
+def summarize_spans(spans: list[tuple[str, float, str]]) -> dict:
+    """Total milliseconds per span name."""
+    totals: dict[str, float] = {}
+    for name, elapsed, _ in spans:
+        totals[name] = totals.get(name, 0.0) + elapsed * 1000
+    return {name: round(ms, 1) for name, ms in totals.items()}
+
+
+def log(message: str, level: str = "info", **fields):
+    """Writes one log line carrying the current trace id."""
+    trace_id = trace_id_var.get()
+    if LOG_FORMAT == "json":
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "level": level,
+            "message": message,
+            "trace_id": trace_id,
+            **fields,
+        }
+        print(json.dumps(record, default=str, ensure_ascii=False), flush=True)
+    else:
+        extra = " ".join(f"{key}={value}" for key, value in fields.items())
+        suffix = f" [trace={trace_id}]" if trace_id else ""
+        print(f"{message}{' ' + extra if extra else ''}{suffix}", flush=True)
+
+
+def render() -> str:
+    return registry.render()
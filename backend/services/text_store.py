@@ -0,0 +1,111 @@
+import os
+import gzip
+import hashlib
+import tempfile
+import urllib.request
+
+from backend.services.executor import run_blocking
+
+# zstd is preferred when installed; gzip is always available
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+TEXT_STORE_BACKEND = os.getenv("TEXT_STORE_BACKEND", "auto")
+TEXT_STORE_DIR = os.getenv(
+    "TEXT_STORE_DIR",
+    os.path.join(tempfile.gettempdir(), "lawlytics_texts"),
+)
+BLOB_PREFIX = "texts"
+
+
+def compress(text: str) -> tuple[bytes, str]:
+    raw = text.encode("utf-8")
+    if ZSTD_AVAILABLE:
+        return zstandard.ZstdCompressor(level=10).compress(raw), "zstd"
+    return gzip.compress(raw, compresslevel=6), "gzip"
+
+
+def decompress(data: bytes, codec: str) -> str:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return gzip.decompress(data).decode("utf-8")
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LocalTextStore:
+    """Content-addressed compressed files on local disk."""
+
+    name = "local"
+
+    def __init__(self, directory: str = TEXT_STORE_DIR):
+        self.directory = directory
+
+    def _path(self, key: str, codec: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{codec}")
+
+    def put(self, key: str, data: bytes, codec: str) -> dict:
+        path = self._path(key, codec)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        return {"store": self.name, "key": key, "codec": codec}
+
+    def get(self, ref: dict) -> bytes | None:
+        path = self._path(ref["key"], ref["codec"])
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+
+class BlobTextStore:
+    """Content-addressed compressed objects in Vercel Blob."""
+
+    name = "blob"
+
+    def put(self, key: str, data: bytes, codec: str) -> dict:
+        from vercel_blob import put
+
+        # Same key means same content, so overwriting is harmless
+        result = put(f"{BLOB_PREFIX}/{key}.{codec}", data, {"allowOverwrite": "true"})
+        return {"store": self.name, "key": key, "codec": codec, "url": result["url"]}
+
+    def get(self, ref: dict) -> bytes | None:
+        with urllib.request.urlopen(ref["url"], timeout=20) as response:
+            return response.read()
+
+
+class TextStore:
+    """Keeps raw document text out of Firestore; callers persist only the returned reference."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def put(self, text: str) -> dict:
+        data, codec = compress(text)
+        ref = await run_blocking(self.backend.put, text_key(text), data, codec)
+        ref["size"] = len(text)
+        ref["compressedSize"] = len(data)
+        return ref
+
+    async def get(self, ref: dict) -> str | None:
+        backend = self.backend
+        if ref.get("store") != backend.name:
+            backend = BlobTextStore() if ref.get("store") == "blob" else LocalTextStore()
+        data = await run_blocking(backend.get, ref)
+        return decompress(data, ref["codec"]) if data is not None else None
+
+
+def create_text_store(blob_available: bool) -> TextStore:
+    backend = TEXT_STORE_BACKEND
+    if backend == "auto":
+        backend = "blob" if blob_available else "local"
+    return TextStore(BlobTextStore() if backend == "blob" else LocalTextStore())
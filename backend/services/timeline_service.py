@@ -0,0 +1,267 @@
+import os
+import re
+import asyncio
+import hashlib
+import calendar
+from datetime import date
+from dataclasses import dataclass, field
+
+from backend.services import gemini_service
+from backend.services.analysis_cache import ClauseAnalysisCache, exact_key
+from backend.services.vector_db_service import chunk_text
+
+# Bump when the extraction prompt changes so cached window results are not reused
+TIMELINE_PROMPT_VERSION = "timeline-window-v1"
+# Window results live in their own cache table/collection, sized apart from clause analyses
+TIMELINE_CACHE_MEMORY_ENTRIES = int(os.getenv("TIMELINE_CACHE_MEMORY_ENTRIES", "1000"))
+TIMELINE_CACHE_DURABLE_ENTRIES = int(os.getenv("TIMELINE_CACHE_DURABLE_ENTRIES", "50000"))
+TIMELINE_CACHE_TTL_SECONDS = int(os.getenv("TIMELINE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+WINDOW_CHARS = int(os.getenv("TIMELINE_WINDOW_CHARS", "12000"))
+WINDOW_OVERLAP_CHARS = int(os.getenv("TIMELINE_WINDOW_OVERLAP_CHARS", "1000"))
+# Past half a window, a paragraph whose hash hits 1-in-N ends the window. Boundaries
+# depend on content rather than offsets, so an edit only changes nearby windows.
+WINDOW_ANCHOR_EVERY = 8
+# Numeric dates such as 03/04/2024 are read day-first unless configured otherwise
+TIMELINE_DAY_FIRST = os.getenv("TIMELINE_DAY_FIRST", "true").lower() != "false"
+# Events on the same date whose descriptions share this much vocabulary are merged
+DUPLICATE_SIMILARITY = 0.5
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n|\f")
+_WORD_RE = re.compile(r"[a-z0-9]{3,}")
+
+_MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+_MONTHS["sept"] = 9
+_MONTH = r"(?P<month>" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+_DAY = r"(?P<day>\d{1,2})(?:st|nd|rd|th)?"
+_YEAR = r"(?P<year>\d{4})"
+_DATE_PATTERNS = [
+    re.compile(r"^" + _YEAR + r"(?:-(?P<month>\d{1,2})(?:-(?P<day>\d{1,2}))?)?(?!\d)"),
+    re.compile(_DAY + r"\s+(?:of\s+)?" + _MONTH + r",?\s+" + _YEAR),
+    re.compile(_MONTH + r"\s+" + _DAY + r",?\s+" + _YEAR),
+    re.compile(_MONTH + r",?\s+" + _YEAR),
+]
+_NUMERIC_DATE_RE = re.compile(r"^(\d{1,2})[./-](\d{1,2})[./-](\d{2}|\d{4})$")
+
+metrics = {
+    "documents": 0,
+    "windows": 0,
+    "cached_windows": 0,
+    "failed_windows": 0,
+    "events_extracted": 0,
+    "events_merged": 0,
+}
+
+
+class TimelineUnavailableError(Exception):
+    """Raised when every window's extraction failed, so there is no timeline at all."""
+
+
+@dataclass
+class Timeline:
+    events: list[dict] = field(default_factory=list)
+    windows: int = 0
+    # Windows whose extraction failed; their events are missing from ``events``
+    failed_windows: int = 0
+
+    @property
+    def partial(self) -> bool:
+        return self.failed_windows > 0
+
+
+class WindowCache(ClauseAnalysisCache):
+    """Clause cache tiers reused for per-window timeline results ({"events": [...]})."""
+
+    namespace = "timeline_window_cache"
+    memory_entries = TIMELINE_CACHE_MEMORY_ENTRIES
+    durable_entries = TIMELINE_CACHE_DURABLE_ENTRIES
+    ttl_seconds = TIMELINE_CACHE_TTL_SECONDS
+
+    @staticmethod
+    def is_cacheable(analysis: dict) -> bool:
+        return isinstance(analysis.get("events"), list)
+
+    def key_for(self, text: str) -> str:
+        # Case and spacing can change extracted descriptions, so windows match exactly
+        return exact_key(text, self.prompt_version, self.model_name)
+
+
+def _is_anchor(unit: str) -> bool:
+    return hashlib.blake2b(unit.encode("utf-8"), digest_size=2).digest()[0] % WINDOW_ANCHOR_EVERY == 0
+
+
+def _tail(units: list[str], overlap_chars: int) -> str:
+    """Trailing paragraphs of a window, up to roughly ``overlap_chars``."""
+    tail, size = [], 0
+    for unit in reversed(units):
+        if size + len(unit) > overlap_chars:
+            if not tail:
+                cut = unit.find(" ", len(unit) - overlap_chars)
+                tail.append(unit[cut + 1:] if cut != -1 else unit[-overlap_chars:])
+            break
+        tail.append(unit)
+        size += len(unit) + 2
+    return "\n\n".join(reversed(tail))
+
+
+def split_windows(text: str, window_chars: int = WINDOW_CHARS, overlap_chars: int = WINDOW_OVERLAP_CHARS) -> list[str]:
+    """Splits text into paragraph-aligned windows, each prefixed with the previous window's tail."""
+    units = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if len(paragraph) > window_chars:
+            units.extend(chunk for _, chunk in chunk_text(paragraph, window_chars, 0))
+        elif paragraph:
+            units.append(paragraph)
+
+    groups, current, size = [], [], 0
+    for unit in units:
+        if current and size + len(unit) > window_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(unit)
+        size += len(unit) + 2
+        if size >= window_chars // 2 and _is_anchor(unit):
+            groups.append(current)
+            current, size = [], 0
+    if current:
+        groups.append(current)
+
+    windows = []
+    for index, group in enumerate(groups):
+        body = "\n\n".join(group)
+        overlap = _tail(groups[index - 1], overlap_chars) if index and overlap_chars else ""
+        windows.append(f"{overlap}\n\n{body}" if overlap else body)
+    return windows
+
+
+def _iso(year: int, month: int | None = None, day: int | None = None) -> str | None:
+    try:
+        if day is not None:
+            return date(year, month, day).isoformat()
+        if month is not None:
+            return date(year, month, 1).isoformat()[:7]
+        return f"{year:04d}" if 1000 <= year <= 9999 else None
+    except ValueError:
+        return None
+
+
+def normalize_date(value) -> str | None:
+    """ISO date ("2024-08-15"), or "2024-08" / "2024" for partial dates; None if unrecognized."""
+    text = str(value or "").strip().lower()
+    if not text:
+        return None
+
+    numeric = _NUMERIC_DATE_RE.match(text)
+    if numeric:
+        first, second, year = (int(part) for part in numeric.groups())
+        if year < 100:
+            year += 2000 if year < 70 else 1900
+        day, month = (first, second) if TIMELINE_DAY_FIRST else (second, first)
+        if first > 12:
+            day, month = first, second
+        elif second > 12:
+            day, month = second, first
+        return _iso(year, month, day)
+
+    for pattern in _DATE_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        parts = match.groupdict()
+        month = parts.get("month")
+        if month is not None:
+            month = int(month) if month.isdigit() else _MONTHS[month]
+        day = int(parts["day"]) if parts.get("day") else None
+        return _iso(int(parts["year"]), month, day)
+    return None
+
+
+def _words(text: str) -> set[str]:
+    return set(_WORD_RE.findall(text.lower()))
+
+
+def _merge_parties(first: str, second: str) -> str:
+    parties, seen = [], set()
+    for party in f"{first},{second}".split(","):
+        party = party.strip()
+        if party and party.lower() not in seen:
+            seen.add(party.lower())
+            parties.append(party)
+    return ", ".join(parties)
+
+
+def merge_events(events: list[dict]) -> list[dict]:
+    """Normalizes dates, merges duplicates (e.g. from window overlaps) and sorts chronologically."""
+    by_date: dict[str, list[tuple[set[str], dict]]] = {}
+    for raw in events:
+        description = str(raw.get("event") or "").strip()
+        if not description:
+            continue
+        iso = normalize_date(raw.get("date"))
+        event = {
+            "date": iso or str(raw.get("date") or "").strip(),
+            "event": description,
+            "parties": str(raw.get("parties") or "").strip(),
+        }
+        if iso is None:
+            event["date_unparsed"] = True
+        words = _words(description)
+        same_day = by_date.setdefault(event["date"].lower(), [])
+        for existing_words, existing in same_day:
+            union = words | existing_words
+            if union and len(words & existing_words) / len(union) >= DUPLICATE_SIMILARITY:
+                if len(description) > len(existing["event"]):
+                    existing["event"] = description
+                existing["parties"] = _merge_parties(existing["parties"], event["parties"])
+                existing_words |= words
+                metrics["events_merged"] += 1
+                break
+        else:
+            same_day.append((words, event))
+
+    merged = [event for entries in by_date.values() for _, event in entries]
+    # ISO strings of mixed precision sort chronologically; unparsed dates go last
+    merged.sort(key=lambda event: (event.get("date_unparsed", False), event["date"]))
+    return merged
+
+
+async def build_timeline(full_text: str, cache: ClauseAnalysisCache | None = None) -> Timeline:
+    """Map-reduce timeline: extract events per window concurrently, then merge.
+
+    Failed windows are counted on the result so callers can tell a partial
+    timeline from a complete one; if every window failed this raises
+    TimelineUnavailableError instead of returning an empty timeline.
+    """
+    windows = split_windows(full_text)
+    if not windows:
+        return Timeline()
+    metrics["documents"] += 1
+    metrics["windows"] += len(windows)
+
+    results = await cache.get_many(windows) if cache is not None else {}
+    metrics["cached_windows"] += len(results)
+
+    missing = [index for index in range(len(windows)) if index not in results]
+    # The shared Gemini scheduler bounds how many of these actually run at once
+    extracted = await asyncio.gather(*[gemini_service.extract_timeline_events(windows[i]) for i in missing])
+    fresh, failed = [], 0
+    for index, events in zip(missing, extracted):
+        if events is None:
+            failed += 1
+            continue
+        results[index] = {"events": events}
+        fresh.append((windows[index], {"events": events}))
+    if cache is not None and fresh:
+        await cache.put_many(fresh)
+    metrics["failed_windows"] += failed
+    if failed == len(windows):
+        raise TimelineUnavailableError(f"Event extraction failed for all {failed} windows")
+
+    events = [event for index in sorted(results) for event in results[index]["events"]]
+    metrics["events_extracted"] += len(events)
+    return Timeline(merge_events(events), len(windows), failed)
+
+
+def stats() -> dict:
+    return dict(metrics)
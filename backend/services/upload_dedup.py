@@ -0,0 +1,107 @@
+import os
+import asyncio
+import hashlib
+
+from backend.services.analysis_cache import ClauseAnalysisCache, exact_key
+
+# "user": a user's repeat upload returns their existing document; "shared": any
+# user's identical upload is reused (copied into the uploader's history); "off"
+UPLOAD_DEDUP_SCOPE = os.getenv("UPLOAD_DEDUP_SCOPE", "user").lower()
+# Bump to invalidate every index entry at once
+INDEX_VERSION = "upload-v1"
+# The index has its own cache table/collection, sized apart from clause analyses
+UPLOAD_INDEX_MEMORY_ENTRIES = int(os.getenv("UPLOAD_INDEX_MEMORY_ENTRIES", "5000"))
+UPLOAD_INDEX_DURABLE_ENTRIES = int(os.getenv("UPLOAD_INDEX_DURABLE_ENTRIES", "100000"))
+UPLOAD_INDEX_TTL_SECONDS = int(os.getenv("UPLOAD_INDEX_TTL_SECONDS", str(30 * 24 * 3600)))
+HASH_CHUNK_BYTES = 1024 * 1024
+
+metrics = {
+    "lookups": 0,
+    "hits": 0,
+    "stale": 0,
+    "coalesced": 0,
+    "recorded": 0,
+}
+
+
+class UploadIndex(ClauseAnalysisCache):
+    """Clause cache tiers reused as a content-hash -> document index ({"documentId", "userId"})."""
+
+    namespace = "upload_index"
+    memory_entries = UPLOAD_INDEX_MEMORY_ENTRIES
+    durable_entries = UPLOAD_INDEX_DURABLE_ENTRIES
+    ttl_seconds = UPLOAD_INDEX_TTL_SECONDS
+
+    @staticmethod
+    def is_cacheable(analysis: dict) -> bool:
+        return isinstance(analysis.get("documentId"), str)
+
+    def key_for(self, text: str) -> str:
+        # Index keys are exact (user ids are case-sensitive), so skip clause normalization
+        return exact_key(text, self.prompt_version, self.model_name)
+
+
+async def read_and_hash(file) -> tuple[bytes, str]:
+    """Reads an UploadFile in chunks, hashing as it goes; returns (contents, sha256 hex)."""
+    digest = hashlib.sha256()
+    parts = []
+    while chunk := await file.read(HASH_CHUNK_BYTES):
+        digest.update(chunk)
+        parts.append(chunk)
+    return b"".join(parts), digest.hexdigest()
+
+
+def index_text(content_hash: str, analysis_type: str, prompt_version: str, user_id: str) -> str | None:
+    """What an upload is indexed under in the configured scope, or None when dedup is off."""
+    if UPLOAD_DEDUP_SCOPE == "user":
+        return f"{user_id}\x00{content_hash}\x00{analysis_type}\x00{prompt_version}"
+    if UPLOAD_DEDUP_SCOPE == "shared":
+        return f"*\x00{content_hash}\x00{analysis_type}\x00{prompt_version}"
+    return None
+
+
+class _Abandoned(Exception):
+    """The upload being waited on was cancelled; a waiter should run it itself."""
+
+
+class InFlightUploads:
+    """Coalesces concurrent uploads of the same content onto one computation."""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, compute):
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            metrics["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except _Abandoned:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.set_exception(_Abandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+def stats() -> dict:
+    return {"scope": UPLOAD_DEDUP_SCOPE, **metrics}
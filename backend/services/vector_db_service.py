@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+import tempfile
+import threading
+import contextlib
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.services import gemini_service
+from backend.services.batch_planner import estimate_tokens
+from backend.services.executor import run_blocking
+
+VECTOR_INDEX_DIR = os.getenv(
+    "VECTOR_INDEX_DIR",
+    os.path.join(tempfile.gettempdir(), "lawlytics_vectors"),
+)
+# "gemini" when an API key is configured, otherwise the local hashing embedder
+VECTOR_EMBEDDER = os.getenv("VECTOR_EMBEDDER", "gemini" if os.getenv("GOOGLE_API_KEY") else "hashing")
+CHUNK_CHARS = int(os.getenv("VECTOR_CHUNK_CHARS", "1200"))
+CHUNK_OVERLAP = int(os.getenv("VECTOR_CHUNK_OVERLAP", "200"))
+DEFAULT_TOP_K = int(os.getenv("VECTOR_TOP_K", "6"))
+# Loaded (memory-mapped) indices kept open between chat turns
+OPEN_INDEX_LIMIT = 64
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> list[tuple[int, str]]:
+    """Splits text into overlapping (start_offset, chunk) windows, breaking on whitespace."""
+    chunks = []
+    start, length = 0, len(text)
+    while start < length:
+        end = min(length, start + chunk_chars)
+        if end < length:
+            # Prefer a paragraph, then a sentence, then a word boundary
+            window = text[start:end]
+            for separator in ("\n\n", ". ", "\n", " "):
+                cut = window.rfind(separator)
+                if cut > chunk_chars // 2:
+                    end = start + cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append((start, chunk))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class HashingEmbedder:
+    """Deterministic local embedder (signed feature hashing of words and bigrams)."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = _TOKEN_RE.findall(text.lower())
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def embed(self, texts: list[str], is_query: bool = False) -> np.ndarray:
+        return np.vstack([self._embed_one(text) for text in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+
+class GeminiEmbedder:
+    """Gemini text embeddings, batched and admitted by the shared Gemini scheduler."""
+
+    def __init__(self, model: str = "models/text-embedding-004", batch_size: int = 100):
+        self.model = model
+        self.batch_size = batch_size
+        self.name = model
+
+    def _embed_batch(self, batch: list[str], task_type: str) -> dict:
+        import google.generativeai as genai
+
+        gemini_service.get_model()  # configures the API key
+        return genai.embed_content(model=self.model, content=batch, task_type=task_type)
+
+    async def embed(self, texts: list[str], is_query: bool = False) -> np.ndarray:
+        task_type = "retrieval_query" if is_query else "retrieval_document"
+        # A query embedding sits on the chat path; document indexing is background work
+        priority = gemini_service.PRIORITY_CHAT if is_query else gemini_service.PRIORITY_BULK
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            result = await gemini_service.scheduler.call(
+                self._embed_batch, batch, task_type,
+                cost=sum(estimate_tokens(text) for text in batch), priority=priority,
+            )
+            vectors.extend(result["embedding"])
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def get_embedder(name: str = VECTOR_EMBEDDER):
+    if name == "gemini":
+        return GeminiEmbedder()
+    return HashingEmbedder()
+
+
+class VectorIndex:
+    """Per-document chunk embeddings persisted as .npy files and opened memory-mapped."""
+
+    def __init__(self, directory: str = VECTOR_INDEX_DIR, embedder=None):
+        self.directory = directory
+        self.embedder = embedder or get_embedder()
+        self._open: OrderedDict[str, tuple[np.ndarray, list[dict]]] = OrderedDict()
+        self._open_lock = threading.Lock()
+        self._build_locks: dict[str, asyncio.Lock] = {}
+        # Builds and searches holding or waiting for each lock; the lock goes when this drops to 0
+        self._build_users: dict[str, int] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, doc_id: str) -> tuple[str, str]:
+        safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", doc_id)
+        base = os.path.join(self.directory, safe_id)
+        return base + ".npy", base + ".json"
+
+    def _write(self, doc_id: str, vectors: np.ndarray, chunks: list[dict]):
+        vectors_path, meta_path = self._paths(doc_id)
+        # Write-then-rename so readers never see a half-written index
+        np.save(vectors_path + ".tmp.npy", vectors)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"embedder": self.embedder.name, "chunks": chunks}, f)
+        os.replace(vectors_path + ".tmp.npy", vectors_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _load(self, doc_id: str) -> tuple[np.ndarray, list[dict]] | None:
+        with self._open_lock:
+            if doc_id in self._open:
+                self._open.move_to_end(doc_id)
+                return self._open[doc_id]
+        vectors_path, meta_path = self._paths(doc_id)
+        if not (os.path.exists(vectors_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("embedder") != self.embedder.name:
+            return None  # built with a different embedder; rebuild
+        loaded = (np.load(vectors_path, mmap_mode="r"), meta["chunks"])
+        with self._open_lock:
+            self._open[doc_id] = loaded
+            while len(self._open) > OPEN_INDEX_LIMIT:
+                self._open.popitem(last=False)
+        return loaded
+
+    @contextlib.asynccontextmanager
+    async def _build_lock(self, doc_id: str):
+        """Holds the document's build lock; it is dropped once nobody holds or waits for it."""
+        lock = self._build_locks.setdefault(doc_id, asyncio.Lock())
+        self._build_users[doc_id] = self._build_users.get(doc_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._build_users[doc_id] -= 1
+            if not self._build_users[doc_id]:
+                del self._build_users[doc_id]
+                del self._build_locks[doc_id]
+
+    async def index_document(self, doc_id: str, text: str) -> int:
+        """Chunks and embeds a document; returns the number of chunks indexed."""
+        async with self._build_lock(doc_id):
+            chunks = [{"start": start, "text": chunk} for start, chunk in chunk_text(text)]
+            vectors = await self.embedder.embed([c["text"] for c in chunks])
+            await run_blocking(self._write, doc_id, vectors.astype(np.float32), chunks)
+            with self._open_lock:
+                self._open.pop(doc_id, None)
+        return len(chunks)
+
+    async def search(self, doc_id: str, query: str, k: int = DEFAULT_TOP_K) -> list[dict] | None:
+        """Top-k chunks by cosine similarity, returned in document order; None if not indexed."""
+        if doc_id in self._build_locks:
+            async with self._build_lock(doc_id):
+                pass  # wait for an in-progress build
+        loaded = await run_blocking(self._load, doc_id)
+        if loaded is None:
+            return None
+        vectors, chunks = loaded
+        if len(chunks) <= k:
+            return [{**chunk, "score": 1.0} for chunk in chunks]
+
+        query_vector = (await self.embedder.embed([query], is_query=True))[0]
+        scores = vectors @ query_vector
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [{**chunks[i], "score": float(scores[i])} for i in sorted(top.tolist())]
+
+    async def search_or_build(self, doc_id: str, text: str, query: str, k: int = DEFAULT_TOP_K) -> list[dict]:
+        """Searches the index, building it first if this instance has not seen the document."""
+        results = await self.search(doc_id, query, k)
+        if results is None:
+            await self.index_document(doc_id, text)
+            results = await self.search(doc_id, query, k) or []
+        return results
+
+    def delete(self, doc_id: str):
+        with self._open_lock:
+            self._open.pop(doc_id, None)
+        for path in self._paths(doc_id):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def format_passages(passages: list[dict]) -> str:
+    """Joins retrieved chunks into a prompt context block."""
+    return "\n\n[...]\n\n".join(passage["text"] for passage in passages)
@@ -0,0 +1,112 @@
+import hashlib
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+
+from backend.services.analysis_cache import normalize_clause
+
+# Only real analyses are carried into a new version; fallbacks are retried
+CARRYABLE_RISK_LEVELS = ("Red", "Orange", "Green")
+# Per-clause fields that describe the clause rather than its analysis
+CLAUSE_IDENTITY_FIELDS = ("original_text", "clause_id", "page")
+
+metrics = {
+    "versioned_uploads": 0,
+    "clauses_carried": 0,
+    "clauses_reanalyzed": 0,
+}
+
+
+def clause_hash(text: str) -> str:
+    return hashlib.sha1(normalize_clause(text).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class VersionDiff:
+    """Alignment of a new version's clauses against its parent's analysis."""
+    # New clause index -> parent analysis reused as-is
+    carried: dict[int, dict] = field(default_factory=dict)
+    # New clause index -> parent index it replaces
+    modified: dict[int, int] = field(default_factory=dict)
+    added: list[int] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    unchanged: int = 0
+
+
+def diff_clauses(parent_analysis: list[dict], clauses: list[str]) -> VersionDiff:
+    """Aligns clauses by content hash (SequenceMatcher over the two hash sequences)."""
+    parent_hashes = [clause_hash(item.get("original_text", "")) for item in parent_analysis]
+    new_hashes = [clause_hash(text) for text in clauses]
+    diff = VersionDiff()
+
+    matcher = SequenceMatcher(None, parent_hashes, new_hashes, autojunk=False)
+    for tag, parent_start, parent_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(new_end - new_start):
+                previous = parent_analysis[parent_start + offset]
+                diff.unchanged += 1
+                if previous.get("risk_level") in CARRYABLE_RISK_LEVELS:
+                    diff.carried[new_start + offset] = {
+                        k: v for k, v in previous.items() if k not in CLAUSE_IDENTITY_FIELDS
+                    }
+        elif tag == "replace":
+            # Pair replaced clauses positionally; any surplus is a pure insert or delete
+            paired = min(parent_end - parent_start, new_end - new_start)
+            for offset in range(paired):
+                diff.modified[new_start + offset] = parent_start + offset
+            diff.added.extend(range(new_start + paired, new_end))
+            diff.removed.extend(range(parent_start + paired, parent_end))
+        elif tag == "insert":
+            diff.added.extend(range(new_start, new_end))
+        elif tag == "delete":
+            diff.removed.extend(range(parent_start, parent_end))
+
+    metrics["versioned_uploads"] += 1
+    metrics["clauses_carried"] += len(diff.carried)
+    metrics["clauses_reanalyzed"] += len(clauses) - len(diff.carried)
+    return diff
+
+
+def summarize_diff(diff: VersionDiff, parent_analysis: list[dict], analysis: list[dict]) -> dict:
+    """Clause-level changes with their risk levels, for the response and the stored document."""
+    changes = []
+    for index, parent_index in sorted(diff.modified.items()):
+        previous_risk = parent_analysis[parent_index].get("risk_level")
+        risk = analysis[index].get("risk_level")
+        changes.append({
+            "change": "modified",
+            "index": index,
+            "parent_index": parent_index,
+            "clause_id": analysis[index].get("clause_id"),
+            "previous_risk_level": previous_risk,
+            "risk_level": risk,
+            "risk_changed": previous_risk != risk,
+        })
+    for index in diff.added:
+        changes.append({
+            "change": "added",
+            "index": index,
+            "clause_id": analysis[index].get("clause_id"),
+            "risk_level": analysis[index].get("risk_level"),
+        })
+    for parent_index in diff.removed:
+        changes.append({
+            "change": "removed",
+            "parent_index": parent_index,
+            "clause_id": parent_analysis[parent_index].get("clause_id"),
+            "previous_risk_level": parent_analysis[parent_index].get("risk_level"),
+        })
+    changes.sort(key=lambda change: (change.get("index", change.get("parent_index")), change["change"]))
+
+    return {
+        "unchanged": diff.unchanged,
+        "modified": len(diff.modified),
+        "added": len(diff.added),
+        "removed": len(diff.removed),
+        "carried_over": len(diff.carried),
+        "risk_changes": sum(1 for change in changes if change.get("risk_changed")),
+        "changes": changes,
+    }
+
+
+def stats() -> dict:
+    return dict(metrics)
@@ -0,0 +1,52 @@
+import asyncio
+
+from backend.benchmarks.fakes import FakeFirestore
+from backend.services import analysis_cache
+from backend.services.analysis_cache import ClauseAnalysisCache, create_clause_cache
+from backend.services.timeline_service import WindowCache
+from backend.services.upload_dedup import UploadIndex
+
+CLAUSE = {"risk_level": "Red", "plain_english": "Risky.", "emoji_summary": "⚠️"}
+
+
+def build(firestore_client, cache_class):
+    return create_clause_cache(firestore_client, prompt_version="v1", model_name="model", cache_class=cache_class)
+
+
+def test_window_and_upload_traffic_does_not_evict_clause_analyses(monkeypatch, tmp_path):
+    monkeypatch.setattr(analysis_cache, "CACHE_BACKEND", "sqlite")
+    monkeypatch.setattr(analysis_cache, "CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    for cache_class in (ClauseAnalysisCache, WindowCache, UploadIndex):
+        monkeypatch.setattr(cache_class, "durable_entries", 5)
+
+    async def scenario():
+        clauses = build(None, ClauseAnalysisCache)
+        windows = build(None, WindowCache)
+        uploads = build(None, UploadIndex)
+        await clauses.put_many([("The tenant pays all repairs.", CLAUSE)])
+        await windows.put_many([(f"window {i}", {"events": []}) for i in range(20)])
+        await uploads.put_many([(f"upload {i}", {"documentId": f"doc_{i}"}) for i in range(20)])
+        # A fresh cache skips the memory tier, so the hit has to come from SQLite
+        return await build(None, ClauseAnalysisCache).get_many(["The tenant pays all repairs."]), windows
+
+    found, windows = asyncio.run(scenario())
+    assert found[0]["risk_level"] == "Red"
+    assert windows.durable.table == "timeline_window_cache"
+    assert windows.durable.evictions == 15
+
+
+def test_windows_differing_only_in_case_get_separate_entries(monkeypatch):
+    monkeypatch.setattr(analysis_cache, "CACHE_BACKEND", "firestore")
+    db = FakeFirestore(latency=0)
+
+    async def scenario():
+        windows = build(db, WindowCache)
+        await windows.put_many([("Rent is due on 1 MAY 2024.", {"events": [{"date": "2024-05-01"}]})])
+        await build(db, ClauseAnalysisCache).put_many([("Rent is due on 1 MAY 2024.", CLAUSE)])
+        return await build(db, WindowCache).get_many(["Rent is due on 1 MAY 2024.", "rent is due on 1 may 2024."])
+
+    found = asyncio.run(scenario())
+    assert list(found) == [0]
+    assert found[0]["events"] == [{"date": "2024-05-01"}]
+    collections = {path.split("/")[0] for path in db._docs}
+    assert collections == {"clause_cache", "timeline_window_cache"}
@@ -0,0 +1,48 @@
+from fastapi.testclient import TestClient
+
+import backend.main as main
+
+
+def test_one_failed_save_fails_only_its_own_file(monkeypatch):
+    saved = []
+
+    async def save_document(document_data):
+        if document_data["fileName"] == "broken.txt":
+            raise RuntimeError("disk full")
+        saved.append(document_data["fileName"])
+        return f"doc_{len(saved)}"
+
+    async def generate_timeline_data(full_text):
+        return {"timeline": [], "summary": "Generated a timeline with 0 key events.",
+                "riskCounts": {"red": 0, "orange": 0}, "timelineFailedWindows": 0}
+
+    async def find_duplicate_upload(*args):
+        return None
+
+    async def record_upload(*args):
+        raise RuntimeError("index unavailable")
+
+    async def nothing(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(main, "save_document", save_document)
+    monkeypatch.setattr(main, "generate_timeline_data", generate_timeline_data)
+    monkeypatch.setattr(main, "find_duplicate_upload", find_duplicate_upload)
+    monkeypatch.setattr(main, "record_upload", record_upload)
+    monkeypatch.setattr(main, "upload_to_blob", nothing)
+    monkeypatch.setattr(main, "index_for_chat", nothing)
+
+    files = [
+        ("files", (name, f"On 1 March 2024 the {name} lease begins.".encode(), "text/plain"))
+        for name in ("first.txt", "broken.txt", "third.txt")
+    ]
+    response = TestClient(main.app).post("/api/upload/batch?userId=user&analysisType=timeline", files=files)
+
+    assert response.status_code == 200
+    documents = {document["fileName"]: document for document in response.json()["documents"]}
+    assert documents["broken.txt"]["status"] == "failed"
+    assert documents["broken.txt"]["error"] == "Failed to save document."
+    # A failed upload-index write does not undo a stored document
+    assert [documents[name]["status"] for name in ("first.txt", "third.txt")] == ["complete", "complete"]
+    assert sorted(saved) == ["first.txt", "third.txt"]
+    assert response.json()["throughput"]["failed"] == 1
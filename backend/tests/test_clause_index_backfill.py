@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime, timezone
+
+import backend.main as main
+from backend.services import clause_index, local_store
+
+
+def risk_document(doc_id: str) -> dict:
+    return {
+        "userId": "user",
+        "fileName": f"{doc_id}.pdf",
+        "analysisType": "risk",
+        "status": "complete",
+        "createdAt": datetime(2026, 1, 1, tzinfo=timezone.utc),
+        "fullAnalysis": [{"clause_text": f"{doc_id} clause", "risk_level": "Red",
+                          "plain_english": "Risky.", "emoji_summary": "⚠️"}],
+    }
+
+
+def setup(monkeypatch, tmp_path, firestore_pages):
+    """Firestore lists ``firestore_pages`` (None: the listing fails); doc_local lives in the local store."""
+    monkeypatch.setattr(main, "clause_search", clause_index.ClauseIndex(str(tmp_path / "index.sqlite3")))
+    store = local_store.LocalDocumentStore(str(tmp_path / "local.sqlite3"))
+    store.put("doc_local", risk_document("doc_local"))
+    monkeypatch.setattr(main, "local_store", store)
+    monkeypatch.setattr(main, "backfill_locks", {})
+    loads = []
+
+    async def firestore_client():
+        return object()
+
+    async def get_documents_from_firestore(user_id, limit, cursor=None):
+        await asyncio.sleep(0.01)
+        if firestore_pages is None:
+            return None
+        position = int(cursor or 0)
+        next_cursor = str(position + 1) if position + 1 < len(firestore_pages) else None
+        return [{"id": doc_id, "analysisType": "risk"} for doc_id in firestore_pages[position]], next_cursor
+
+    async def load_document(doc_id):
+        loads.append(doc_id)
+        return risk_document(doc_id)
+
+    monkeypatch.setattr(main, "firestore_client", firestore_client)
+    monkeypatch.setattr(main, "get_documents_from_firestore", get_documents_from_firestore)
+    monkeypatch.setattr(main, "load_document", load_document)
+    return loads
+
+
+def test_concurrent_searches_backfill_each_document_once(monkeypatch, tmp_path):
+    loads = setup(monkeypatch, tmp_path, [["doc_a", "doc_b"], ["doc_c"]])
+
+    async def searches():
+        await asyncio.gather(*[main.backfill_clause_index("user") for _ in range(5)])
+
+    asyncio.run(searches())
+    # Firestore pages and the document only the local store holds, each once
+    assert sorted(loads) == ["doc_a", "doc_b", "doc_c", "doc_local"]
+    assert main.clause_search.is_user_indexed("user")
+
+
+def test_failed_listing_leaves_the_user_unindexed(monkeypatch, tmp_path):
+    loads = setup(monkeypatch, tmp_path, None)
+    asyncio.run(main.backfill_clause_index("user"))
+    assert loads == []
+    assert not main.clause_search.is_user_indexed("user")
@@ -0,0 +1,130 @@
+from backend.services.clause_segmenter import segment_document, segment_text
+from backend.services.document_ai_service import ExtractedDocument, Page, TextBlock
+
+
+def texts(clauses):
+    return [clause.text for clause in clauses]
+
+
+def test_wrapped_line_starting_with_a_number_stays_in_its_clause():
+    clauses = segment_text(
+        "4.2 Payment. The Customer shall pay each invoice within\n"
+        "30 days of receipt, without set-off or deduction.\n"
+        "4.3 Late payments accrue interest at 2% per month.\n"
+    )
+    assert texts(clauses) == [
+        "4.2 Payment. The Customer shall pay each invoice within 30 days of receipt, without set-off or deduction.",
+        "4.3 Late payments accrue interest at 2% per month.",
+    ]
+    assert [clause.number for clause in clauses] == ["4.2", "4.3"]
+
+
+def test_wrapped_line_starting_with_a_keyword_stays_in_its_clause():
+    clauses = segment_text(
+        "5.1 The Supplier shall deliver the Services described in\n"
+        "Schedule A in accordance with the agreed milestones.\n"
+    )
+    assert texts(clauses) == [
+        "5.1 The Supplier shall deliver the Services described in "
+        "Schedule A in accordance with the agreed milestones."
+    ]
+
+
+def test_numbering_after_terminal_punctuation_starts_a_clause():
+    clauses = segment_text(
+        "1. The Supplier shall provide the Services with care.\n"
+        "2. The Customer shall pay the fees set out in the order.\n"
+    )
+    assert len(clauses) == 2
+
+
+def test_multi_line_caps_paragraph_is_kept_whole():
+    clauses = segment_text(
+        "9. LIMITATION OF LIABILITY\n"
+        "\n"
+        "IN NO EVENT SHALL EITHER PARTY BE LIABLE FOR ANY INDIRECT\n"
+        "OR CONSEQUENTIAL DAMAGES, AND EACH PARTY'S TOTAL LIABILITY\n"
+        "SHALL NOT EXCEED THE FEES PAID IN THE PRIOR TWELVE MONTHS.\n"
+    )
+    assert texts(clauses) == [
+        "IN NO EVENT SHALL EITHER PARTY BE LIABLE FOR ANY INDIRECT OR CONSEQUENTIAL DAMAGES, "
+        "AND EACH PARTY'S TOTAL LIABILITY SHALL NOT EXCEED THE FEES PAID IN THE PRIOR TWELVE MONTHS."
+    ]
+    assert clauses[0].heading == "9. LIMITATION OF LIABILITY"
+
+
+def test_caps_disclaimer_without_final_period_is_not_dropped():
+    clauses = segment_text(
+        "THE SOFTWARE IS PROVIDED AS IS WITHOUT WARRANTY OF ANY KIND\n"
+        "EXPRESS OR IMPLIED INCLUDING FITNESS FOR A PARTICULAR PURPOSE\n"
+        "\n"
+        "10. The Customer accepts the Software on delivery.\n"
+    )
+    assert texts(clauses)[0] == (
+        "THE SOFTWARE IS PROVIDED AS IS WITHOUT WARRANTY OF ANY KIND "
+        "EXPRESS OR IMPLIED INCLUDING FITNESS FOR A PARTICULAR PURPOSE"
+    )
+    assert len(clauses) == 2
+
+
+def test_short_heading_before_numbered_clause_is_a_heading():
+    clauses = segment_text("PAYMENT\n1. The Customer shall pay all invoices on time.\n")
+    assert texts(clauses) == ["1. The Customer shall pay all invoices on time."]
+    assert clauses[0].heading == "PAYMENT"
+
+
+def test_pdf_layout_wrapped_numeric_line_stays_in_its_clause():
+    text = ("4.2 Payment. The Customer shall pay each invoice within\n"
+            "30 days of receipt, without set-off or deduction.\n")
+    page = Page(number=0, text=text, blocks=[TextBlock(10, 10, 500, 40, text)], height=800)
+    clauses = segment_document(ExtractedDocument([page]))
+    assert len(clauses) == 1
+    assert clauses[0].number == "4.2"
+
+
+def test_boilerplate_repeated_on_every_page_still_ends_its_paragraph():
+    # The same clause wording on every page looks like a running footer at the page's edge
+    paragraph = ("{n}.1 The Supplier shall indemnify the Customer against all losses\n"
+                 "arising out of any breach of this Agreement by the Supplier or its\n"
+                 "personnel.\n")
+    pages = []
+    for n in range(4):
+        first, second = paragraph.format(n=2 * n + 1), paragraph.format(n=2 * n + 2)
+        pages.append(Page(number=n, text=first + second, height=800, blocks=[
+            TextBlock(10, 10, 500, 40, first), TextBlock(10, 50, 500, 80, second),
+        ]))
+    clauses = segment_document(ExtractedDocument(pages))
+    assert texts(clauses) == [
+        f"{n}.1 The Supplier shall indemnify the Customer against all losses arising out of any "
+        f"breach of this Agreement by the Supplier or its personnel."
+        for n in range(1, 9)
+    ]
+
+
+def test_running_header_and_footer_blocks_are_dropped_mid_paragraph():
+    pages = []
+    for n in range(4):
+        first = f"{n + 1}.1 The Customer shall pay the fees within thirty\n" if n == 0 else ""
+        body = first + "days of the invoice date, as set out in the order form\n"
+        pages.append(Page(number=n, text=f"ACME MASTER AGREEMENT\n{body}Confidential - Page {n + 1}\n",
+                          height=800, blocks=[
+                              TextBlock(10, 5, 500, 15, "ACME MASTER AGREEMENT\n"),
+                              TextBlock(10, 20, 500, 700, body),
+                              TextBlock(10, 780, 500, 790, f"Confidential - Page {n + 1}\n"),
+                          ]))
+    clauses = segment_document(ExtractedDocument(pages))
+    assert texts(clauses) == [
+        "1.1 The Customer shall pay the fees within thirty "
+        + " ".join(["days of the invoice date, as set out in the order form"] * 4)
+    ]
+
+
+def test_plain_text_header_is_dropped_only_when_set_apart():
+    page = "Master Services Agreement\n\n{body}\nPage {n}\n"
+    bodies = [
+        "1. The Supplier shall deliver the Services on time.",
+        "2. The Customer shall pay the fees set out in the order.",
+        "3. Either party may terminate on thirty days notice.",
+    ]
+    text = "\f".join(page.format(body=body, n=n) for n, body in enumerate(bodies, 1))
+    assert texts(segment_text(text)) == bodies
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from backend.services.gemini_service import CircuitBreaker, GeminiScheduler, GeminiUnavailableError
+
+
+class Model:
+    """Stands in for a Gemini model; each call waits on its own gate, then returns or raises."""
+
+    def __init__(self):
+        self.gates: list[tuple[asyncio.Event, list]] = []
+
+    async def generate_content_async(self, prompt, **kwargs):
+        gate, outcome = asyncio.Event(), []
+        self.gates.append((gate, outcome))
+        await gate.wait()
+        if outcome and isinstance(outcome[0], Exception):
+            raise outcome[0]
+        return type("Response", (), {"text": prompt, "usage_metadata": None})()
+
+    async def finish(self, index: int, outcome=None):
+        gate, result = self.gates[index]
+        if outcome is not None:
+            result.append(outcome)
+        gate.set()
+        await asyncio.sleep(0)
+
+
+def open_breaker(scheduler: GeminiScheduler):
+    scheduler.breaker = CircuitBreaker(threshold=1, cooldown=0)
+    scheduler.breaker.record_quota_failure()
+
+
+def test_only_the_probe_token_releases_the_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    assert breaker.allow() == 0
+    breaker.record_quota_failure()
+    probe = breaker.allow()
+    assert probe
+    breaker.release_probe(0)  # an ordinary call finishing
+    assert breaker.blocked() and breaker.allow() is None
+    breaker.release_probe(probe)
+    assert not breaker.blocked()
+
+
+def test_ordinary_failure_while_half_open_keeps_the_probe():
+    async def main():
+        scheduler, model = GeminiScheduler(rpm=1000, tpm=10 ** 7, max_concurrency=4), Model()
+        ordinary = asyncio.create_task(scheduler.generate("a", target=model, max_retries=0))
+        await asyncio.sleep(0)
+        open_breaker(scheduler)
+        probe = asyncio.create_task(scheduler.generate("b", target=model, max_retries=0))
+        await asyncio.sleep(0)
+        assert scheduler.breaker.state == "half_open"
+
+        # The ordinary call, admitted while closed, fails for a non-quota reason
+        await model.finish(0, ValueError("bad request"))
+        with pytest.raises(ValueError):
+            await ordinary
+        with pytest.raises(GeminiUnavailableError):
+            # Admitted in error it would wait on its gate, so bound it
+            await asyncio.wait_for(scheduler.generate("c", target=model, max_retries=0), 1)
+
+        await model.finish(1)
+        await probe
+        assert scheduler.breaker.state == "closed"
+        third = asyncio.create_task(scheduler.generate("d", target=model, max_retries=0))
+        await asyncio.sleep(0)
+        await model.finish(2)
+        assert (await third).text == "d"
+
+    asyncio.run(main())
+
+
+def test_cancelled_probe_hands_the_probe_back():
+    async def main():
+        scheduler, model = GeminiScheduler(rpm=1000, tpm=10 ** 7, max_concurrency=4), Model()
+        open_breaker(scheduler)
+        probe = asyncio.create_task(scheduler.generate("a", target=model, max_retries=0))
+        await asyncio.sleep(0)
+        assert scheduler.breaker.blocked()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert not scheduler.breaker.blocked()
+
+    asyncio.run(main())
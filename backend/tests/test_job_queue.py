@@ -0,0 +1,65 @@
+import asyncio
+
+from backend.benchmarks.fakes import FakeFirestore
+from backend.services import job_queue
+from backend.services.job_queue import FirestoreJobBackend, JobQueue, SQLiteJobBackend, new_job
+
+
+def test_expired_lease_is_listed_and_taken_over(tmp_path, monkeypatch):
+    backend = SQLiteJobBackend(str(tmp_path / "jobs.sqlite3"))
+    backend.create(new_job("job_1", "user", {}), b"pdf")
+    assert backend.claim("job_1", "dead-worker")
+    assert backend.list_pending() == []
+    assert not backend.claim("job_1", "other-worker")
+
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", -1)
+    assert [job["id"] for job in backend.list_pending()] == ["job_1"]
+    assert backend.claim("job_1", "other-worker")
+    # The old owner finds out at its next heartbeat
+    assert not backend.heartbeat("job_1", "dead-worker")
+    assert backend.heartbeat("job_1", "other-worker")
+
+
+def test_sweep_recovers_a_job_abandoned_after_startup(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_SWEEP_SECONDS", 0.01)
+    backend = SQLiteJobBackend(str(tmp_path / "jobs.sqlite3"))
+    handled = []
+
+    async def handler(job, payload, report):
+        handled.append((job["id"], payload))
+        await report({"status": "complete"})
+
+    async def main():
+        queue = JobQueue(backend, handler, workers=2)
+        first = await queue.enqueue("user", {}, b"first")
+        # Another instance claims a job, then dies without finishing it
+        backend.create(new_job("job_orphan", "user", {}), b"orphan")
+        assert backend.claim("job_orphan", "dead-instance")
+        await asyncio.sleep(0.05)
+        assert "job_orphan" not in [job_id for job_id, _ in handled]
+
+        monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", -1)
+        for _ in range(100):
+            if len(handled) == 2:
+                break
+            await asyncio.sleep(0.01)
+        for task in queue._worker_tasks:
+            task.cancel()
+        return first
+
+    first = asyncio.run(main())
+    assert sorted(handled) == sorted([(first["id"], b"first"), ("job_orphan", b"orphan")])
+    assert backend.get("job_orphan")["status"] == "complete"
+
+
+def test_firestore_payload_is_written_in_batches_under_the_request_limit(monkeypatch):
+    monkeypatch.setattr(job_queue, "_FIRESTORE_PAYLOAD_CHUNK", 10)
+    db = FakeFirestore(latency=0)
+    backend = FirestoreJobBackend(db)
+    payload = bytes(range(200))  # 20 chunks
+
+    backend.create(new_job("job_1", "user", {}), payload)
+
+    assert db.counters["commits"] == 3  # 8 + 8 + 4 chunks
+    assert backend.load_payload("job_1") == payload
+    assert backend.get("job_1")["status"] == "queued"
@@ -45,6 +45,8 @@ export default function Dashboard() {
     const [errorMessage, setErrorMessage] = useState('');
     const [documents, setDocuments] = useState([]);
     const [isLoadingDocs, setIsLoadingDocs] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
     
     const { currentUser } = useAuth();
     const navigate = useNavigate();
@@ -56,6 +58,7 @@ export default function Dashboard() {
             try {
                 const response = await axios.get(`/api/documents?userId=${currentUser.uid}`);
                 setDocuments(Array.isArray(response.data) ? response.data : []);
+                setNextCursor(response.headers['x-next-cursor'] || null);
             } catch (error) {
                 console.error("Failed to fetch documents:", error);
                 setErrorMessage("Could not load your document history.");
@@ -67,6 +70,22 @@ export default function Dashboard() {
         fetchDocuments();
     }, [currentUser]);
 
+    const loadMoreDocuments = async () => {
+        if (!nextCursor || isLoadingMore) return;
+        setIsLoadingMore(true);
+        try {
+            const response = await axios.get(`/api/documents?userId=${currentUser.uid}&cursor=${encodeURIComponent(nextCursor)}`);
+            const page = Array.isArray(response.data) ? response.data : [];
+            setDocuments(prevDocs => [...prevDocs, ...page.filter(doc => !prevDocs.some(prev => prev.id === doc.id))]);
+            setNextCursor(response.headers['x-next-cursor'] || null);
+        } catch (error) {
+            console.error("Failed to fetch more documents:", error);
+            setErrorMessage("Could not load more of your document history.");
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
     const handleFileChange = (e) => {
         setFile(e.target.files[0]);
         setErrorMessage('');
@@ -176,9 +195,22 @@ export default function Dashboard() {
                             </div>
                         </div>
                     ) : documents.length > 0 ? (
-                        <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-                            {documents.map(doc => <DocumentCard key={doc.id} doc={doc} />)}
-                        </div>
+                        <>
+                            <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
+                                {documents.map(doc => <DocumentCard key={doc.id} doc={doc} />)}
+                            </div>
+                            {nextCursor && (
+                                <div className="text-center mt-8">
+                                    <button
+                                        onClick={loadMoreDocuments}
+                                        disabled={isLoadingMore}
+                                        className="px-6 py-2 rounded-lg border border-[#2a4a53] text-gray-300 hover:border-[#c5a35a] hover:text-[#c5a35a] transition-colors disabled:opacity-50"
+                                    >
+                                        {isLoadingMore ? 'Loading...' : 'Load more'}
+                                    </button>
+                                </div>
+                            )}
+                        </>
                     ) : (
                         <div className="text-center py-16 bg-[#1a2c32]/50 backdrop-blur-md rounded-2xl border border-[#2a4a53]">
                             <div className="flex flex-col items-center gap-4">
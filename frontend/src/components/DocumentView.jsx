@@ -151,11 +151,17 @@ export default function DocumentView() {
     const [isTimelineLoading, setIsTimelineLoading] = useState(false);
 
     const chatEndRef = useRef(null);
+    // Server-side chat history is keyed by this id; the server issues it on the first turn
+    const conversationIdRef = useRef(null);
 
     useEffect(() => {
         chatEndRef.current?.scrollIntoView({ behavior: 'smooth' });
     }, [messages]);
 
+    useEffect(() => {
+        conversationIdRef.current = null;
+    }, [documentId]);
+
     useEffect(() => {
         if (analysis) {
             console.log("Analysis data already present:", analysis);
@@ -219,11 +225,44 @@ export default function DocumentView() {
         setIsLoading(true);
 
         try {
-            const response = await axios.post('/api/chat', { 
-                document_id: documentId, 
-                question: userInput 
+            // Stream the answer (NDJSON events) so text appears as soon as the model produces it
+            const response = await fetch('/api/chat/stream', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    document_id: documentId,
+                    question: userInput,
+                    conversation_id: conversationIdRef.current,
+                    format: 'ndjson'
+                })
             });
-            setMessages([...newMessages, { sender: 'ai', text: response.data.answer }]);
+            if (!response.ok || !response.body) {
+                throw new Error(`Chat request failed with status ${response.status}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            let answer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    const event = JSON.parse(line);
+                    if (event.event === 'start') {
+                        conversationIdRef.current = event.conversation_id;
+                    } else if (event.event === 'token') {
+                        answer += event.text;
+                        setMessages([...newMessages, { sender: 'ai', text: answer }]);
+                    } else if (event.event === 'error') {
+                        throw new Error(event.detail);
+                    }
+                }
+            }
         } catch (error) {
             console.error('Chat API error:', error);
             setMessages([...newMessages, { sender: 'ai', text: "I apologize, but I encountered an error. Please try again." }]);